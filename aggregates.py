@@ -0,0 +1,207 @@
+# aggregates.py
+
+import os
+import time
+import sqlite3
+import threading
+
+import numpy as np
+
+from paths import cache_path
+
+DB_PATH = os.getenv("AGGREGATES_DB_PATH") or cache_path("aggregates.sqlite")
+# Utilisation histogram bin width (percentage points)
+BIN_PERCENT = 5
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pair_stats (
+    truck TEXT NOT NULL,
+    family TEXT NOT NULL,
+    lane TEXT NOT NULL,
+    pairs INTEGER NOT NULL,
+    utilisation_sum REAL NOT NULL,
+    utilisation_sq REAL NOT NULL,
+    trucks_needed REAL NOT NULL,
+    payload_bound INTEGER NOT NULL,
+    volume_bound INTEGER NOT NULL,
+    no_fit INTEGER NOT NULL,
+    PRIMARY KEY (truck, family, lane)
+);
+CREATE TABLE IF NOT EXISTS utilisation_hist (
+    truck TEXT NOT NULL,
+    bin INTEGER NOT NULL,
+    pairs INTEGER NOT NULL,
+    PRIMARY KEY (truck, bin)
+);
+CREATE TABLE IF NOT EXISTS ingested (
+    source TEXT PRIMARY KEY,
+    pairs INTEGER NOT NULL,
+    at REAL NOT NULL
+);
+"""
+
+_ADD_STATS = """
+INSERT INTO pair_stats VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (truck, family, lane) DO UPDATE SET
+    pairs = pairs + excluded.pairs,
+    utilisation_sum = utilisation_sum + excluded.utilisation_sum,
+    utilisation_sq = utilisation_sq + excluded.utilisation_sq,
+    trucks_needed = trucks_needed + excluded.trucks_needed,
+    payload_bound = payload_bound + excluded.payload_bound,
+    volume_bound = volume_bound + excluded.volume_bound,
+    no_fit = no_fit + excluded.no_fit
+"""
+
+_ADD_HIST = """
+INSERT INTO utilisation_hist VALUES (?, ?, ?)
+ON CONFLICT (truck, bin) DO UPDATE SET pairs = pairs + excluded.pairs
+"""
+
+
+def box_family(name):
+    """Library family of a box id ("PLC-1200x1000x600" -> "PLC"); other boxes keep their name."""
+    name = str(name or "Unknown")
+    return name.split("-", 1)[0] if "-" in name else name
+
+
+# -----------------------------
+# Incremental aggregates
+# -----------------------------
+class Aggregates:
+    """Running sums over evaluated (part, truck) pairs, so dashboards never rescan raw results.
+
+    Each batch of pairs is folded in once under a source id; folding the same
+    source again is a no-op.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or DB_PATH
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _db(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+        return self._conn
+
+    def record(self, source, truck, family, lane, utilisation, boxes_by_space, boxes_by_weight,
+               trucks_needed=None):
+        """Folds arrays of pair results (one element per pair) into the aggregates.
+
+        Returns the number of pairs added, or 0 if `source` was already recorded.
+        """
+        truck = np.asarray(truck, dtype=str)
+        family = np.asarray(family, dtype=str)
+        lane = np.asarray(lane, dtype=str)
+        utilisation = np.nan_to_num(np.asarray(utilisation, dtype=float))
+        by_space = np.asarray(boxes_by_space, dtype=float)
+        by_weight = np.asarray(boxes_by_weight, dtype=float)
+        needed = np.zeros(len(truck)) if trucks_needed is None else np.nan_to_num(np.asarray(trucks_needed, float))
+
+        # Integer codes per column, one combined code per group; sums per group with bincount
+        (trucks, t), (families, f), (lanes, l) = (np.unique(c, return_inverse=True) for c in (truck, family, lane))
+        keys, group = np.unique((t * len(families) + f) * len(lanes) + l, return_inverse=True)
+        n = len(keys)
+        no_fit = by_space <= 0
+        payload = ~no_fit & (by_weight < by_space)
+        sums = {
+            "pairs": np.bincount(group, minlength=n),
+            "utilisation_sum": np.bincount(group, utilisation, n),
+            "utilisation_sq": np.bincount(group, utilisation ** 2, n),
+            "trucks_needed": np.bincount(group, needed, n),
+            "payload_bound": np.bincount(group, payload, n),
+            "volume_bound": np.bincount(group, ~no_fit & ~payload, n),
+            "no_fit": np.bincount(group, no_fit, n),
+        }
+        stats = [
+            (str(trucks[k // (len(families) * len(lanes))]), str(families[k // len(lanes) % len(families)]),
+             str(lanes[k % len(lanes)]), int(sums["pairs"][i]), float(sums["utilisation_sum"][i]),
+             float(sums["utilisation_sq"][i]), float(sums["trucks_needed"][i]), int(sums["payload_bound"][i]),
+             int(sums["volume_bound"][i]), int(sums["no_fit"][i]))
+            for i, k in enumerate(keys.tolist())
+        ]
+        bins = np.clip(utilisation // BIN_PERCENT, 0, 100 // BIN_PERCENT - 1).astype(np.int64)
+        counts = np.bincount(t * (100 // BIN_PERCENT) + bins, minlength=len(trucks) * (100 // BIN_PERCENT))
+        hist = [(str(trucks[k // (100 // BIN_PERCENT)]), k % (100 // BIN_PERCENT), int(c))
+                for k, c in enumerate(counts.tolist()) if c]
+
+        with self._lock:
+            db = self._db()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                if db.execute("SELECT 1 FROM ingested WHERE source = ?", (source,)).fetchone():
+                    db.execute("ROLLBACK")
+                    return 0
+                db.executemany(_ADD_STATS, stats)
+                db.executemany(_ADD_HIST, hist)
+                db.execute("INSERT INTO ingested VALUES (?, ?, ?)", (source, len(truck), time.time()))
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+        return len(truck)
+
+    def record_loads(self, source, loads, family, lane, parts_per_box=None, quantity=None):
+        """Folds per-truck results of one part (BoxLibrary.truck_loads or truck plan rows)."""
+        if not loads:
+            return 0
+        needed = None
+        if quantity and parts_per_box:
+            boxes = -(-int(quantity) // max(1, int(parts_per_box)))
+            needed = [-(-boxes // l["boxes_per_truck"]) if l["boxes_per_truck"] else 0 for l in loads]
+        return self.record(
+            source,
+            [l["truck"] for l in loads],
+            [family] * len(loads),
+            [lane] * len(loads),
+            [l["utilisation_percent"] for l in loads],
+            [l["boxes_by_space"] for l in loads],
+            [l["boxes_by_weight"] for l in loads],
+            needed,
+        )
+
+    def snapshot(self):
+        """Every aggregate table as lists of dicts; small however many pairs were recorded."""
+        with self._lock:
+            db = self._db()
+            db.row_factory = sqlite3.Row
+            try:
+                stats = [dict(r) for r in db.execute("SELECT * FROM pair_stats")]
+                hist = [dict(r) for r in db.execute("SELECT * FROM utilisation_hist ORDER BY truck, bin")]
+                sources = db.execute("SELECT COUNT(*), COALESCE(SUM(pairs), 0), MAX(at) FROM ingested").fetchone()
+            finally:
+                db.row_factory = None
+        for s in stats:
+            fitted = s["pairs"] - s["no_fit"]
+            s["mean_utilisation"] = s["utilisation_sum"] / s["pairs"] if s["pairs"] else 0.0
+            variance = s["utilisation_sq"] / s["pairs"] - s["mean_utilisation"] ** 2 if s["pairs"] else 0.0
+            s["std_utilisation"] = max(0.0, variance) ** 0.5
+            s["payload_share"] = s["payload_bound"] / fitted if fitted else 0.0
+        for h in hist:
+            h["from_percent"] = h["bin"] * BIN_PERCENT
+        return {
+            "stats": stats,
+            "histogram": hist,
+            "sources": sources[0],
+            "pairs": sources[1],
+            "updated": sources[2],
+        }
+
+    def reset(self):
+        with self._lock:
+            self._db().executescript("DELETE FROM pair_stats; DELETE FROM utilisation_hist; DELETE FROM ingested;")
+
+
+_shared_aggregates = None
+_shared_lock = threading.Lock()
+
+
+def get_aggregates():
+    """Process-wide aggregates."""
+    global _shared_aggregates
+    with _shared_lock:
+        if _shared_aggregates is None:
+            _shared_aggregates = Aggregates()
+        return _shared_aggregates
@@ -0,0 +1,429 @@
+# batch.py
+
+import os
+import sys
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import argparse
+import statistics
+import subprocess
+import traceback
+from contextlib import closing
+
+from paths import cache_path
+
+# Run directories (queue, shard inputs and outputs); must be on a filesystem every node mounts
+BATCH_ROOT = os.getenv("BATCH_ROOT") or cache_path("batch")
+SHARD_ROWS = int(os.getenv("BATCH_SHARD_ROWS", 2000))
+# A lease not renewed for this long is handed to another worker
+LEASE_S = float(os.getenv("BATCH_LEASE_S", 120))
+# Rows between lease renewals
+RENEW_EVERY = 50
+# Shards still running after this many median shard times get a second worker
+SLOW_FACTOR = float(os.getenv("BATCH_SLOW_FACTOR", 3))
+MAX_ATTEMPTS = int(os.getenv("BATCH_MAX_ATTEMPTS", 3))
+POLL_INTERVAL_S = 1.0
+
+PART_COLUMNS = ("part", "L", "W", "H", "weight")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS shards (
+    id INTEGER PRIMARY KEY,
+    rows INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    lease TEXT,
+    worker TEXT,
+    leased REAL,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    seconds REAL,
+    output TEXT,
+    error TEXT,
+    updated REAL
+);
+CREATE INDEX IF NOT EXISTS shards_status ON shards (status, lease_until);
+"""
+
+
+def _connect(run_dir):
+    conn = sqlite3.connect(os.path.join(run_dir, "queue.sqlite"), timeout=60, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    # WAL needs shared memory, which network filesystems do not provide
+    conn.execute("PRAGMA journal_mode=DELETE")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def _shard_path(run_dir, kind, shard_id):
+    return os.path.join(run_dir, "shards", f"{kind}-{shard_id:05d}.parquet")
+
+
+class LeaseLost(Exception):
+    """Another worker took the shard over; this worker drops its copy."""
+
+
+def _meta(conn):
+    return {r["key"]: json.loads(r["value"]) for r in conn.execute("SELECT key, value FROM meta")}
+
+
+# ----------------------------------------------------
+# Per-part evaluation
+# ----------------------------------------------------
+def process_rows(rows, library, progress=None, pairs=None):
+    """Best library box and truck for each part row; bad rows report an error instead.
+
+    With a `pairs` list, the load of that box on every truck is appended too
+    (one dict per part and truck). `progress` is called every RENEW_EVERY
+    rows; returning False aborts with LeaseLost.
+    """
+    memo, out = {}, []
+    for i, row in enumerate(rows):
+        loads = []
+        try:
+            key = tuple(float(row[c]) for c in ("L", "W", "H", "weight"))
+            # NaN fails both comparisons
+            if not (min(key[:3]) > 0 and key[3] >= 0):
+                raise ValueError(f"dimensions and weight must be positive, got {key}")
+            if key not in memo:
+                ranked = library.top_k(*key, k=1)
+                best = ranked[0] if ranked else None
+                memo[key] = (best, library.truck_loads(best["box"], best["gross_weight"]) if best else [])
+            (best, loads), error = memo[key], None if memo[key][0] else "No library box fits"
+        except (KeyError, TypeError, ValueError) as e:
+            best, error = None, f"{type(e).__name__}: {e}"
+        lane = row.get("lane")
+        lane = "" if lane is None or lane != lane else str(lane)
+        if pairs is not None:
+            quantity = row.get("quantity")
+            boxes = -(-int(quantity) // best["parts_per_box"]) if best and quantity and quantity == quantity else None
+            pairs.extend(dict(load, part=str(row.get("part")), lane=lane, family=best["box"]["type"],
+                              trucks_needed=(-(-boxes // load["boxes_per_truck"]) if boxes and load["boxes_per_truck"]
+                                             else None))
+                         for load in loads)
+        out.append({
+            "part": str(row.get("part")),
+            "lane": lane,
+            "L": row.get("L"), "W": row.get("W"), "H": row.get("H"), "weight": row.get("weight"),
+            "box": best["box"]["id"] if best else None,
+            "parts_per_box": best["parts_per_box"] if best else None,
+            "gross_weight": best["gross_weight"] if best else None,
+            "truck": best["truck"] if best else None,
+            "boxes_per_truck": best["boxes_per_truck"] if best else None,
+            "parts_per_truck": best["parts_per_truck"] if best else None,
+            "error": error,
+        })
+        if progress and (i + 1) % RENEW_EVERY == 0 and progress() is False:
+            raise LeaseLost()
+    return out
+
+
+# ----------------------------------------------------
+# Run setup
+# ----------------------------------------------------
+def create_run(parts, trucks=None, shard_rows=SHARD_ROWS, run_dir=None):
+    """Splits a parts table (DataFrame, CSV or Parquet path) into shard files and queues them.
+
+    Columns: part, L, W, H (mm), weight (kg), optional lane and quantity
+    (annual parts, for trucks needed on the dashboard). `trucks` is the
+    what-if fleet ({"name", "dimensions", "payload"}); the standard trucks by
+    default. Returns the run directory.
+    """
+    import pandas as pd
+    from packing import TRUCKS
+
+    if isinstance(parts, str):
+        parts = pd.read_parquet(parts) if parts.endswith(".parquet") else pd.read_csv(parts)
+    missing = set(PART_COLUMNS) - set(parts.columns)
+    if missing:
+        raise ValueError(f"❌ Missing columns: {', '.join(sorted(missing))}")
+    if shard_rows < 1:
+        raise ValueError("❌ Shards need at least one row")
+
+    run_dir = run_dir or os.path.join(BATCH_ROOT, time.strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:6])
+    os.makedirs(os.path.join(run_dir, "shards"), exist_ok=True)
+    shards = []
+    for shard_id, start in enumerate(range(0, len(parts), shard_rows)):
+        chunk = parts.iloc[start:start + shard_rows]
+        chunk.to_parquet(_shard_path(run_dir, "in", shard_id), index=False)
+        shards.append((shard_id, len(chunk)))
+
+    trucks = [dict(t, dimensions=[int(d) for d in t["dimensions"]]) for t in (trucks or TRUCKS)]
+    now = time.time()
+    with closing(_connect(run_dir)) as conn:
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('trucks', ?)", (json.dumps(trucks),))
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('created', ?)", (json.dumps(now),))
+        conn.executemany("INSERT OR IGNORE INTO shards (id, rows, updated) VALUES (?, ?, ?)",
+                         [(i, n, now) for i, n in shards])
+    return run_dir
+
+
+# ----------------------------------------------------
+# Leases
+# ----------------------------------------------------
+def _slow_after(conn):
+    """Seconds after which a running shard counts as a straggler (None until shards finish)."""
+    times = [r[0] for r in conn.execute("SELECT seconds FROM shards WHERE status = 'done' AND seconds IS NOT NULL")]
+    if not times:
+        return None
+    return max(LEASE_S / 4, SLOW_FACTOR * statistics.median(times))
+
+
+def claim(conn, worker):
+    """Leases the next shard: pending first, then expired leases, then stragglers.
+
+    Returns (shard id, lease token) or None. Shards that used up their
+    attempts are marked failed instead.
+    """
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(
+            "UPDATE shards SET status = 'failed', updated = ? "
+            "WHERE status IN ('pending', 'leased') AND attempts >= ? AND (status = 'pending' OR lease_until < ?)",
+            (now, MAX_ATTEMPTS, now),
+        )
+        row = conn.execute(
+            "SELECT id FROM shards WHERE status = 'pending' OR (status = 'leased' AND lease_until < ?) "
+            "ORDER BY status = 'leased', id LIMIT 1",
+            (now,),
+        ).fetchone()
+        if row is None:
+            slow_after = _slow_after(conn)
+            if slow_after is not None:
+                # Speculative second run: the new lease wins, the straggler stops at its next renewal
+                row = conn.execute(
+                    "SELECT id FROM shards WHERE status = 'leased' AND leased < ? AND worker != ? "
+                    "AND attempts < ? ORDER BY leased LIMIT 1",
+                    (now - slow_after, worker, MAX_ATTEMPTS),
+                ).fetchone()
+        if row is None:
+            conn.execute("COMMIT")
+            return None
+        lease = uuid.uuid4().hex
+        conn.execute(
+            "UPDATE shards SET status = 'leased', lease = ?, worker = ?, leased = ?, lease_until = ?, "
+            "attempts = attempts + 1, updated = ? WHERE id = ?",
+            (lease, worker, now, now + LEASE_S, now, row["id"]),
+        )
+        conn.execute("COMMIT")
+        return row["id"], lease
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def renew(conn, shard_id, lease):
+    """Extends a lease; False once another worker has taken the shard over."""
+    now = time.time()
+    cur = conn.execute(
+        "UPDATE shards SET lease_until = ?, updated = ? WHERE id = ? AND lease = ? AND status = 'leased'",
+        (now + LEASE_S, now, shard_id, lease),
+    )
+    return cur.rowcount == 1
+
+
+def complete(conn, shard_id, lease, output, seconds):
+    """Records a finished shard; False if this worker no longer holds its lease."""
+    cur = conn.execute(
+        "UPDATE shards SET status = 'done', output = ?, seconds = ?, error = NULL, updated = ? "
+        "WHERE id = ? AND lease = ? AND status = 'leased'",
+        (output, seconds, time.time(), shard_id, lease),
+    )
+    return cur.rowcount == 1
+
+
+def release(conn, shard_id, lease, error):
+    """Hands a failed shard back to the queue (attempts are counted at claim time)."""
+    conn.execute(
+        "UPDATE shards SET status = 'pending', lease = NULL, error = ?, updated = ? "
+        "WHERE id = ? AND lease = ? AND status = 'leased'",
+        (error, time.time(), shard_id, lease),
+    )
+
+
+# ----------------------------------------------------
+# Worker side
+# ----------------------------------------------------
+def process_shard(run_dir, shard_id, library, progress=None):
+    """Evaluates one shard into its own Parquet file (written atomically); returns the path."""
+    import pandas as pd
+
+    rows = pd.read_parquet(_shard_path(run_dir, "in", shard_id)).to_dict("records")
+    pairs = []
+    out = pd.DataFrame(process_rows(rows, library, progress, pairs))
+    # Last check before writing: a worker that lost the lease never touches the outputs
+    if progress and progress() is False:
+        raise LeaseLost()
+    # Pairs first: a shard counts as written once its main output exists
+    for kind, frame in (("pairs", pd.DataFrame(pairs)), ("out", out)):
+        path = _shard_path(run_dir, kind, shard_id)
+        tmp = f"{path}.{os.getpid()}.{uuid.uuid4().hex[:6]}.tmp"
+        frame.to_parquet(tmp, index=False)
+        os.replace(tmp, path)
+    return path
+
+
+def run_worker(run_dir, worker=None):
+    """Claims and processes shards until every shard is done or failed."""
+    from box_library import BoxLibrary
+
+    worker = worker or f"{socket.gethostname()}:{os.getpid()}"
+    conn = _connect(run_dir)
+    library = BoxLibrary(trucks=_meta(conn)["trucks"])
+    processed = 0
+    while True:
+        claimed = claim(conn, worker)
+        if claimed is None:
+            if status(run_dir, conn)["open"] == 0:
+                break
+            time.sleep(POLL_INTERVAL_S)
+            continue
+
+        shard_id, lease = claimed
+        start = time.monotonic()
+        try:
+            path = process_shard(run_dir, shard_id, library, progress=lambda: renew(conn, shard_id, lease))
+        except LeaseLost:
+            continue
+        except Exception:
+            release(conn, shard_id, lease, traceback.format_exc(limit=5))
+            continue
+        if complete(conn, shard_id, lease, os.path.relpath(path, run_dir), time.monotonic() - start):
+            processed += 1
+    conn.close()
+    return processed
+
+
+def start_workers(run_dir, count):
+    """Starts `count` local worker processes for a run; returns the Popen handles."""
+    return [
+        subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "worker", run_dir],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        for _ in range(count)
+    ]
+
+
+# ----------------------------------------------------
+# Status and merge
+# ----------------------------------------------------
+def status(run_dir, conn=None):
+    """Shard and row counts by status, plus the errors of failed shards."""
+    own = conn is None
+    conn = conn or _connect(run_dir)
+    try:
+        counts = {s: {"shards": 0, "rows": 0} for s in ("pending", "leased", "done", "failed")}
+        for r in conn.execute("SELECT status, COUNT(*) AS n, SUM(rows) AS rows FROM shards GROUP BY status"):
+            counts[r["status"]] = {"shards": r["n"], "rows": r["rows"] or 0}
+        failed = [dict(r) for r in conn.execute("SELECT id, attempts, error FROM shards WHERE status = 'failed'")]
+    finally:
+        if own:
+            conn.close()
+    return {
+        "shards": counts,
+        "open": counts["pending"]["shards"] + counts["leased"]["shards"],
+        "failed": failed,
+    }
+
+
+def merge(run_dir, output=None):
+    """Combines the shard outputs, in input order, into one Parquet file; returns its path.
+
+    Raises while shards are still open; failed shards are left out and listed
+    by `status`.
+    """
+    import pandas as pd
+
+    with closing(_connect(run_dir)) as conn:
+        if status(run_dir, conn)["open"]:
+            raise ValueError("❌ Shards are still pending or running; merge once the workers finish")
+        outputs = [r[0] for r in conn.execute("SELECT output FROM shards WHERE status = 'done' ORDER BY id")]
+    output = output or os.path.join(run_dir, "result.parquet")
+    frames = [pd.read_parquet(os.path.join(run_dir, p)) for p in outputs]
+    merged = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    tmp = f"{output}.tmp"
+    merged.to_parquet(tmp, index=False)
+    os.replace(tmp, output)
+    aggregate(run_dir)
+    return output
+
+
+def aggregate(run_dir):
+    """Folds the part × truck pairs of every finished shard into the dashboard aggregates, once each."""
+    import pandas as pd
+    from aggregates import get_aggregates
+
+    with closing(_connect(run_dir)) as conn:
+        done = [r[0] for r in conn.execute("SELECT id FROM shards WHERE status = 'done' ORDER BY id")]
+    added = 0
+    for shard_id in done:
+        path = _shard_path(run_dir, "pairs", shard_id)
+        if not os.path.exists(path):
+            continue
+        pairs = pd.read_parquet(path)
+        if pairs.empty:
+            continue
+        added += get_aggregates().record(
+            f"batch:{os.path.abspath(run_dir)}:{shard_id}",
+            pairs["truck"], pairs["family"], pairs["lane"], pairs["utilisation_percent"],
+            pairs["boxes_by_space"], pairs["boxes_by_weight"], pairs["trucks_needed"],
+        )
+    return added
+
+
+def run(parts, trucks=None, workers=None, shard_rows=SHARD_ROWS, run_dir=None):
+    """Whole batch on this machine: shard, process with local workers, merge."""
+    run_dir = create_run(parts, trucks, shard_rows, run_dir)
+    procs = start_workers(run_dir, workers or os.cpu_count() or 1)
+    for proc in procs:
+        proc.wait()
+    # Workers that died leave leases behind; finish those shards here
+    if status(run_dir)["open"]:
+        run_worker(run_dir)
+    return merge(run_dir)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sharded box and truck evaluation for large part lists")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("create", help="split a parts CSV/Parquet into queued shards")
+    p.add_argument("parts")
+    p.add_argument("--trucks", help="JSON file with the what-if truck list")
+    p.add_argument("--shard-rows", type=int, default=SHARD_ROWS)
+    p.add_argument("--run-dir")
+    p = sub.add_parser("worker", help="process shards of a run until none are left")
+    p.add_argument("run_dir")
+    p = sub.add_parser("status")
+    p.add_argument("run_dir")
+    p = sub.add_parser("merge")
+    p.add_argument("run_dir")
+    p.add_argument("--output")
+    p = sub.add_parser("run", help="create, process with local workers and merge")
+    p.add_argument("parts")
+    p.add_argument("--trucks")
+    p.add_argument("--workers", type=int)
+    p.add_argument("--shard-rows", type=int, default=SHARD_ROWS)
+    args = parser.parse_args()
+
+    trucks = None
+    if getattr(args, "trucks", None):
+        with open(args.trucks) as f:
+            trucks = json.load(f)
+    if args.command == "create":
+        print(create_run(args.parts, trucks, args.shard_rows, args.run_dir))
+    elif args.command == "worker":
+        run_worker(args.run_dir)
+    elif args.command == "status":
+        print(json.dumps(status(args.run_dir), indent=2))
+    elif args.command == "merge":
+        print(merge(args.run_dir, args.output))
+    else:
+        print(run(args.parts, trucks, args.workers, args.shard_rows))
@@ -0,0 +1,123 @@
+# bounds.py
+
+from functools import lru_cache
+
+# Scores within this share of their bound count as optimal
+BOUND_TOLERANCE = 1e-9
+
+
+# -----------------------------
+# Barnes-style reduced dimensions
+# -----------------------------
+@lru_cache(maxsize=8192)
+def reduced_length(length, sides):
+    """Longest combination of `sides` (any multiples) that fits in `length`.
+
+    Any packing can be pushed back to the origin until every box edge sits on
+    such a combination, so no packing reaches further along that axis.
+    """
+    length = int(length)
+    limit = (1 << (length + 1)) - 1
+    reach = 1
+    for side in sorted({int(s) for s in sides if 0 < s <= length}):
+        # Doubling shifts add 0..2^k - 1 copies of the side
+        shift = side
+        while shift <= length:
+            reach = (reach | (reach << shift)) & limit
+            shift *= 2
+    return reach.bit_length() - 1
+
+
+def _axis_sides(items):
+    """Box side lengths that can lie along each container axis."""
+    sides = (set(), set(), set())
+    for item in items:
+        l, w, h = (int(d) for d in item["dimensions"])
+        if item.get("upright"):
+            # Height stays vertical; length and width may turn on the floor
+            sides[0].update((l, w))
+            sides[1].update((l, w))
+            sides[2].add(h)
+        else:
+            for axis in range(3):
+                sides[axis].update((l, w, h))
+    return tuple(tuple(sorted(s)) for s in sides)
+
+
+def reduced_dims(container_dims, items):
+    """Container (L', W', H') after the 1D bound on each axis."""
+    return tuple(reduced_length(int(c), s) for c, s in zip(container_dims, _axis_sides(items)))
+
+
+# -----------------------------
+# Truck bounds (volume shares)
+# -----------------------------
+def _volume(dims):
+    return dims[0] * dims[1] * dims[2]
+
+
+def volume_bound(container_dims, items):
+    """Everything on the list, or a full container, whichever is less."""
+    total = sum(_volume(it["dimensions"]) * int(it.get("quantity", 1)) for it in items)
+    return min(1.0, total / _volume(container_dims))
+
+
+def payload_bound(container_dims, payload, items):
+    """Most volume within the payload: a fractional load taken lightest per m³ (least dense) first."""
+    remaining, volume = float(payload), 0.0
+    items = sorted(items, key=lambda it: _volume(it["dimensions"]) / it["weight"] if it["weight"] > 0 else float("inf"),
+                   reverse=True)
+    for it in items:
+        quantity = int(it.get("quantity", 1))
+        if it["weight"] <= 0:
+            volume += _volume(it["dimensions"]) * quantity
+            continue
+        taken = min(quantity, remaining / it["weight"])
+        volume += _volume(it["dimensions"]) * taken
+        remaining -= taken * it["weight"]
+        if remaining <= 0:
+            break
+    return min(1.0, volume / _volume(container_dims))
+
+
+def barnes_bound(container_dims, items):
+    """Volume share of the container after reducing every axis (1D bounds)."""
+    return _volume(reduced_dims(container_dims, items)) / _volume(container_dims)
+
+
+def utilisation_bound(truck, items, apply_payload=True):
+    """Upper bounds on the volume share any plan can load, plus the tightest."""
+    items = [dict(it, weight=float(it.get("weight", 0) or 0)) for it in items]
+    bounds = {
+        "volume": volume_bound(truck["dimensions"], items),
+        "barnes": barnes_bound(truck["dimensions"], items),
+    }
+    if apply_payload:
+        bounds["payload"] = payload_bound(truck["dimensions"], truck["payload"], items)
+    bounds["bound"] = min(bounds.values())
+    return bounds
+
+
+def box_count_bound(container_dims, box_dims, weight=0, payload=None, upright=False):
+    """Most boxes of one type any arrangement could load."""
+    item = {"dimensions": tuple(box_dims), "upright": upright}
+    count = _volume(reduced_dims(container_dims, [item])) // _volume(box_dims)
+    if payload is not None and weight > 0:
+        count = min(count, int(payload // weight))
+    return int(count)
+
+
+# -----------------------------
+# Insert layer bound (2D)
+# -----------------------------
+def layer_bound(length, width, a, b):
+    """Most a×b cells any tray pattern could hold, from reduced tray sides."""
+    sides = (int(a), int(b))
+    return (reduced_length(length, sides) * reduced_length(width, sides)) // (int(a) * int(b))
+
+
+def gap_percent(value, bound):
+    """Relative optimality gap of `value` against an upper `bound`."""
+    if bound <= 0:
+        return 0.0
+    return round(max(0.0, bound - value) / bound * 100, 1)
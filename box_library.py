@@ -0,0 +1,229 @@
+# box_library.py
+
+import os
+import json
+import threading
+
+from kdtree import KDTree
+from layers import plan_layers
+from packing import TRUCKS, uniform_fit
+
+# -----------------------------
+# Standard returnable box families
+# -----------------------------
+# walls: external minus internal (L, W, H) in mm
+# tare_density: kg per m² of box surface, used to estimate empty weight
+FAMILIES = {
+    "PLC": {
+        "footprints": [(1200, 1000), (1200, 800), (1100, 900), (1000, 800), (800, 600)],
+        "heights": range(300, 1001, 50),
+        "walls": (60, 60, 100),
+        "tare_density": 12.0,
+        "max_load": 500,
+        "stack_load": 1500,
+        "material": "HDPE",
+    },
+    "FLC": {
+        "footprints": [(1200, 1000), (1200, 800), (1000, 800)],
+        "heights": range(600, 1201, 100),
+        "walls": (70, 70, 150),
+        "tare_density": 20.0,
+        "max_load": 1000,
+        "stack_load": 2500,
+        "material": "PP with steel frame",
+    },
+    "CRATE": {
+        "footprints": [(600, 400), (600, 500), (500, 300), (400, 300), (300, 200)],
+        "heights": range(120, 421, 30),
+        "walls": (30, 30, 15),
+        "tare_density": 8.0,
+        "max_load": 30,
+        "stack_load": 200,
+        "material": "PP (injection moulded)",
+    },
+    "PP": {
+        "footprints": [(l, w) for l in range(300, 1101, 100) for w in range(200, min(l, 900) + 1, 100)],
+        "heights": range(100, 601, 100),
+        "walls": (10, 10, 10),
+        "tare_density": 2.5,
+        "max_load": 25,
+        "stack_load": 100,
+        "material": "PP corrugated",
+    },
+}
+
+
+def _standard_boxes():
+    boxes = []
+    for box_type, fam in FAMILIES.items():
+        for (ext_l, ext_w) in fam["footprints"]:
+            for ext_h in fam["heights"]:
+                wl, ww, wh = fam["walls"]
+                area_m2 = 2 * (ext_l * ext_w + ext_l * ext_h + ext_w * ext_h) / 1e6
+                boxes.append({
+                    "id": f"{box_type}-{ext_l}x{ext_w}x{ext_h}",
+                    "type": box_type,
+                    "external": (ext_l, ext_w, ext_h),
+                    "internal": (ext_l - wl, ext_w - ww, ext_h - wh),
+                    "tare_weight": round(area_m2 * fam["tare_density"], 1),
+                    "max_load": fam["max_load"],
+                    "stack_load": fam["stack_load"],
+                    "material": fam["material"],
+                })
+    return boxes
+
+
+def load_boxes(path=None):
+    """Library entries from a JSON file (BOX_LIBRARY_PATH) or the built-in families."""
+    path = path or os.getenv("BOX_LIBRARY_PATH")
+    if not path:
+        return _standard_boxes()
+    with open(path, encoding="utf-8") as f:
+        raw = json.load(f)
+    boxes = []
+    for b in raw:
+        fam = FAMILIES.get(b["type"].upper(), FAMILIES["PP"])
+        boxes.append({
+            "id": b.get("id") or f"{b['type']}-{'x'.join(str(d) for d in b['external'])}",
+            "type": b["type"],
+            "external": tuple(b["external"]),
+            "internal": tuple(b["internal"]),
+            "tare_weight": float(b.get("tare_weight", 0)),
+            "max_load": float(b.get("max_load", fam["max_load"])),
+            "stack_load": float(b.get("stack_load", fam["stack_load"])),
+            "material": b.get("material", fam["material"]),
+        })
+    return boxes
+
+
+class BoxLibrary:
+    """Fixed returnable box library with a KD-tree over sorted internal dimensions."""
+
+    def __init__(self, boxes=None, trucks=None):
+        self.boxes = boxes if boxes is not None else load_boxes()
+        self.trucks = trucks or TRUCKS
+        self._tree = KDTree([sorted(b["internal"]) for b in self.boxes])
+
+    def candidates(self, length, width, height, clearance=0):
+        """Boxes whose internals can hold at least one part in some orientation."""
+        lo = sorted((length + clearance, width + clearance, height + clearance))
+        return [self.boxes[i] for i in self._tree.query_range(lo, [float("inf")] * 3)]
+
+    def evaluate(self, box, length, width, height, weight, orientation=None, clearance=0):
+        """Parts per box and best truck loading for a single library box."""
+        # Insert trays, separators and mixed-orientation layers included
+        layer_plan = plan_layers((length, width, height), box["internal"], orientation, clearance=clearance)
+        by_space = layer_plan["parts_per_box"]
+        if by_space == 0:
+            return None
+
+        by_weight = int(box["max_load"] // weight) if weight else by_space
+        parts_per_box = min(by_space, by_weight)
+        if parts_per_box == 0:
+            return None
+        gross_weight = box["tare_weight"] + parts_per_box * float(weight or 0)
+
+        best_truck = None
+        for load in self.truck_loads(box, gross_weight):
+            if best_truck is None or load["boxes_per_truck"] > best_truck[1]:
+                best_truck = (load["truck"], load["boxes_per_truck"])
+
+        return {
+            "box": box,
+            "parts_per_box": parts_per_box,
+            "parts_by_space": by_space,
+            "parts_by_weight": by_weight,
+            "part_dims_used": layer_plan["layers"][0]["cell"],
+            "layers": len(layer_plan["layers"]),
+            "layer_plan": layer_plan,
+            "gross_weight": round(gross_weight, 1),
+            "truck": best_truck[0],
+            "boxes_per_truck": best_truck[1],
+            "parts_per_truck": parts_per_box * best_truck[1],
+        }
+
+    def truck_loads(self, box, gross_weight):
+        """Boxes per truck for every truck, with the space and payload limits behind them."""
+        loads = []
+        box_volume = box["external"][0] * box["external"][1] * box["external"][2]
+        for truck in self.trucks:
+            # Returnable boxes travel upright, so only rotations about the vertical axis
+            boxes_by_space, _, _ = uniform_fit(truck["dimensions"], box["external"], ["height-standing"])
+            boxes_by_weight = int(truck["payload"] // gross_weight) if gross_weight > 0 else boxes_by_space
+            boxes_per_truck = min(boxes_by_space, boxes_by_weight)
+            l, w, h = truck["dimensions"]
+            loads.append({
+                "truck": truck["name"],
+                "boxes_by_space": boxes_by_space,
+                "boxes_by_weight": boxes_by_weight,
+                "boxes_per_truck": boxes_per_truck,
+                "utilisation_percent": round(boxes_per_truck * box_volume / (l * w * h) * 100, 2),
+            })
+        return loads
+
+    def top_k(self, length, width, height, weight, orientation=None, k=5, clearance=0, rank_by="truck"):
+        """Top-k library boxes, ranked by parts per truck (or parts per box)."""
+        results = []
+        for box in self.candidates(length, width, height, clearance):
+            r = self.evaluate(box, length, width, height, weight, orientation, clearance)
+            if r:
+                results.append(r)
+
+        def volume(r):
+            e = r["box"]["external"]
+            return e[0] * e[1] * e[2]
+
+        if rank_by == "box":
+            key = lambda r: (-r["parts_per_box"], -r["parts_per_truck"], volume(r), r["box"]["id"])
+        else:
+            key = lambda r: (-r["parts_per_truck"], -r["parts_per_box"], volume(r), r["box"]["id"])
+        results.sort(key=key)
+        return results[:k]
+
+
+def ties(ranked):
+    """Leading candidates that score identically to the first one."""
+    if not ranked:
+        return []
+    head = (ranked[0]["parts_per_truck"], ranked[0]["parts_per_box"])
+    return [r for r in ranked if (r["parts_per_truck"], r["parts_per_box"]) == head]
+
+
+def to_recommendation(candidate, reason=None):
+    """Library candidate in the same shape as LLMRecommender.recommend() output."""
+    box = candidate["box"]
+    il, iw, ih = box["internal"]
+    el, ew, eh = box["external"]
+    return {
+        "box": {
+            "type": box["type"],
+            "library_id": box["id"],
+            "internal": f"{il}×{iw}×{ih}",
+            "external": f"{el}×{ew}×{eh}",
+            "internal_dims": box["internal"],
+            "external_dims": box["external"],
+            "material": box["material"],
+            "capacity": box["max_load"],
+        },
+        "parts_per_box": candidate["parts_per_box"],
+        "parts_per_truck": candidate["parts_per_truck"],
+        "reason": reason or (
+            f"Standard {box['type']} box {box['id']} holds {candidate['parts_per_box']} parts "
+            f"in {candidate['layers']} insert layers at {candidate['gross_weight']} kg gross, and "
+            f"{candidate['boxes_per_truck']} boxes fit a {candidate['truck']} "
+            f"({candidate['parts_per_truck']} parts per truck)."
+        ),
+    }
+
+
+_shared_library = None
+_shared_lock = threading.Lock()
+
+
+def get_box_library():
+    """Process-wide library instance; the index is built once."""
+    global _shared_library
+    with _shared_lock:
+        if _shared_library is None:
+            _shared_library = BoxLibrary()
+        return _shared_library
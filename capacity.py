@@ -0,0 +1,146 @@
+# capacity.py
+
+import os
+import sys
+import itertools
+import threading
+import numpy as np
+
+from paths import cache_path
+
+# Box sizes are tabulated on this grid (mm) up to CAPACITY_MAX_MM on every side
+GRID_MM = int(os.getenv("CAPACITY_GRID_MM", 5))
+MAX_MM = int(os.getenv("CAPACITY_MAX_MM", 1500))
+
+# Orientations of the descending-sorted box dims; a cell stores count * 8 + orientation index
+PERMUTATIONS = list(itertools.permutations(range(3)))
+_ORIENT_BITS = 3
+
+
+# -----------------------------
+# Cell indexing
+# -----------------------------
+# Only sorted sizes a >= b >= c are stored: grid indices i >= j >= k map onto a
+# tetrahedral layout, so one table covers every rotation of a box in n³/6 cells.
+def _tetra(i):
+    return i * (i + 1) * (i + 2) // 6
+
+
+def _tri(j):
+    return j * (j + 1) // 2
+
+
+def _cells(n):
+    return _tetra(n)
+
+
+def _cell_index(dims, grid=GRID_MM):
+    """Table cell of a box, or None when it is off the grid or outside the table."""
+    a, b, c = sorted(dims, reverse=True)
+    if min(a, b, c) <= 0 or any(d % grid for d in (a, b, c)):
+        return None
+    i, j, k = int(a // grid) - 1, int(b // grid) - 1, int(c // grid) - 1
+    return _tetra(i) + _tri(j) + k, (a, b, c)
+
+
+# -----------------------------
+# Offline builder
+# -----------------------------
+def _cell_dtype(truck_dims, grid=GRID_MM):
+    """uint32 while the largest count (smallest box) fits beside the orientation bits, else uint64."""
+    most = 1
+    for d in truck_dims:
+        most *= int(d) // grid
+    return np.uint32 if most < 1 << (32 - _ORIENT_BITS) else np.uint64
+
+
+def table_path(truck_dims, grid=GRID_MM, max_mm=MAX_MM):
+    t_len, t_wid, t_hei = truck_dims
+    # Wide tables get their own name so an older uint32 file that wrapped is never reused
+    wide = "_u64" if _cell_dtype(truck_dims, grid) is np.uint64 else ""
+    return cache_path("capacity", f"{t_len}x{t_wid}x{t_hei}_g{grid}_m{max_mm}{wide}.npy")
+
+
+def build_table(truck_dims, grid=GRID_MM, max_mm=MAX_MM):
+    """Tabulates boxes-by-space and best orientation for every sorted box size."""
+    n = max_mm // grid
+    path = table_path(truck_dims, grid, max_mm)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    table = np.lib.format.open_memmap(tmp, mode="w+", dtype=_cell_dtype(truck_dims, grid),
+                                      shape=(_cells(n),))
+    truck = np.asarray(truck_dims, dtype=np.int64)
+
+    # Every (j, k) with k <= j < n, in cell order; slices of it serve each i
+    jj, kk = np.tril_indices(n)
+    sizes_j = (jj + 1) * grid
+    sizes_k = (kk + 1) * grid
+
+    for i in range(n):
+        m = _tri(i + 1)
+        dims = np.stack([np.full(m, (i + 1) * grid), sizes_j[:m], sizes_k[:m]])
+        best = np.zeros(m, dtype=np.int64)
+        best_orient = np.zeros(m, dtype=np.int64)
+        for o, perm in enumerate(PERMUTATIONS):
+            count = ((truck[0] // dims[perm[0]]) * (truck[1] // dims[perm[1]])
+                     * (truck[2] // dims[perm[2]]))
+            better = count > best
+            best = np.where(better, count, best)
+            best_orient = np.where(better, o, best_orient)
+        start = _tetra(i)
+        table[start:start + m] = (best << _ORIENT_BITS) | best_orient
+
+    table.flush()
+    del table
+    os.replace(tmp, path)
+    return path
+
+
+def build_all(trucks=None, grid=GRID_MM, max_mm=MAX_MM):
+    """One table per distinct truck geometry in the catalog."""
+    from packing import TRUCKS
+
+    paths = []
+    for dims in sorted({tuple(t["dimensions"]) for t in (trucks or TRUCKS)}):
+        print(f"Building capacity table for {dims[0]} × {dims[1]} × {dims[2]} mm ...")
+        paths.append(build_table(dims, grid, max_mm))
+    return paths
+
+
+# -----------------------------
+# Lookup
+# -----------------------------
+_tables = {}
+_tables_lock = threading.Lock()
+
+
+def _table(truck_dims):
+    """Read-only memory map; the OS page cache shares it across worker processes."""
+    key = tuple(truck_dims)
+    with _tables_lock:
+        if key not in _tables:
+            path = table_path(key)
+            if not os.path.exists(path):
+                return None
+            _tables[key] = np.load(path, mmap_mode="r")
+        return _tables[key]
+
+
+def lookup(truck_dims, box_dims):
+    """(boxes_by_space, (l, w, h) used) from the table, or None if not tabulated."""
+    cell = _cell_index(box_dims)
+    if cell is None:
+        return None
+    index, sorted_dims = cell
+    table = _table(truck_dims)
+    if table is None or index >= table.shape[0]:
+        return None
+    value = int(table[index])
+    perm = PERMUTATIONS[value & ((1 << _ORIENT_BITS) - 1)]
+    return value >> _ORIENT_BITS, tuple(sorted_dims[p] for p in perm)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "build":
+        build_all()
+    else:
+        print("usage: python capacity.py build")
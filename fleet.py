@@ -0,0 +1,247 @@
+# fleet.py
+
+import os
+import time
+import pickle
+import hashlib
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from bounds import gap_percent
+from packing import TRUCKS, calculate_optimisation
+from packer import pack
+from paths import cache_path
+import results_cache
+
+# Below this many trucks the pool round-trip costs more than it saves
+MIN_PARALLEL_TRUCKS = int(os.getenv("FLEET_MIN_PARALLEL", 2))
+# Shared inputs larger than this are written once to disk instead of pickled per task
+INLINE_SHARED_BYTES = 64 * 1024
+# Per-truck time budget in seconds
+DEFAULT_TIME_BUDGET_S = float(os.getenv("FLEET_TRUCK_BUDGET_S", 2.0))
+# Worker processes in the pool
+POOL_WORKERS = max(1, int(os.getenv("FLEET_WORKERS", os.cpu_count() or 2)))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Persistent worker pool, created on first use and reused across reruns."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=POOL_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+# ----------------------------------------------------
+# Evaluators (run inside the workers)
+# ----------------------------------------------------
+def _evaluate_uniform(truck, shared, deadline):
+    return calculate_optimisation(truck, shared["box"], shared.get("apply_payload", True))
+
+
+def _evaluate_constrained(truck, shared, deadline):
+    """Uniform result with counts from the constraint-aware packer."""
+    apply_payload = shared.get("apply_payload", True)
+    result = calculate_optimisation(truck, shared["box"], apply_payload)
+    if result is None:
+        return None
+
+    item = dict(shared["box"], **shared.get("constraints", {}))
+    t_len, t_wid, t_hei = truck["dimensions"]
+    b_len, b_wid, b_hei = item["dimensions"]
+    # Ask for as many boxes as could fill the truck by volume
+    item["quantity"] = int((t_len * t_wid * t_hei) // (b_len * b_wid * b_hei))
+    summary = pack(truck, [item], apply_payload, deadline).summary()
+
+    result["unconstrained_boxes"] = result["boxes_per_truck"]
+    result["boxes_per_truck"] = summary["boxes_per_truck"]
+    result["utilisation_percent"] = summary["utilisation_percent"]
+    result["utilisation_bound_percent"] = min(result["utilisation_bound_percent"], summary["utilisation_bound_percent"])
+    result["gap_percent"] = gap_percent(result["utilisation_percent"], result["utilisation_bound_percent"])
+    result["stack_height"] = summary["max_stack"]
+    result["constrained"] = True
+    result["complete"] = deadline is None or time.monotonic() <= deadline
+    return result
+
+
+def _evaluate_mixed(truck, shared, deadline):
+    """Constraint-aware plan for a mixed list of box types."""
+    return pack(truck, shared["items"], shared.get("apply_payload", True), deadline).summary()
+
+
+def _evaluate_mixed_plan(truck, shared, deadline):
+    """Full PlacementPlan, kept by the caller to warm-start later re-plans."""
+    return pack(truck, shared["items"], shared.get("apply_payload", True), deadline)
+
+
+EVALUATORS = {
+    "uniform": _evaluate_uniform,
+    "constrained": _evaluate_constrained,
+    "mixed": _evaluate_mixed,
+    "mixed_plan": _evaluate_mixed_plan,
+}
+# Single-box-type results, keyed by canonical geometry in the result cache
+CACHED_EVALUATORS = ("uniform", "constrained")
+
+# Worker-side memo of shared inputs loaded from disk, keyed by content hash
+_shared_memo = {}
+
+
+def _load_shared(ref):
+    kind, value = ref
+    if kind == "inline":
+        return value
+    if value not in _shared_memo:
+        if len(_shared_memo) > 8:
+            _shared_memo.clear()
+        with open(cache_path("fleet", f"{value}.pkl"), "rb") as f:
+            _shared_memo[value] = pickle.load(f)
+    return _shared_memo[value]
+
+
+def _publish(shared):
+    """Reference to the read-only inputs every truck task needs."""
+    blob = pickle.dumps(shared, protocol=pickle.HIGHEST_PROTOCOL)
+    if len(blob) <= INLINE_SHARED_BYTES:
+        return ("inline", shared)
+    key = hashlib.sha1(blob).hexdigest()
+    path = cache_path("fleet", f"{key}.pkl")
+    if not os.path.exists(path):
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(blob)
+        os.replace(tmp, path)
+    return ("file", key)
+
+
+def _run_task(evaluator, truck, shared_ref, time_budget_s):
+    deadline = time.monotonic() + time_budget_s if time_budget_s else None
+    return EVALUATORS[evaluator](truck, _load_shared(shared_ref), deadline)
+
+
+# ----------------------------------------------------
+# Public API
+# ----------------------------------------------------
+def _cacheable(evaluator):
+    return evaluator in CACHED_EVALUATORS
+
+
+def evaluate(evaluator, truck, shared, deadline=None):
+    """One truck's result in this process, from the result cache when solved before."""
+    if not _cacheable(evaluator):
+        return EVALUATORS[evaluator](truck, shared, deadline)
+    args = (evaluator, truck, shared["box"], shared.get("apply_payload", True), shared.get("constraints"))
+    result = results_cache.lookup(*args)
+    if result is None:
+        result = EVALUATORS[evaluator](truck, shared, deadline)
+        _remember(args, result)
+    return result
+
+
+def _remember(args, result):
+    # Runs cut short by their time budget are not worth keeping
+    if result is not None and result.get("complete", True):
+        results_cache.store(*args, result)
+
+
+def iter_fleet(shared, trucks=None, evaluator="uniform", time_budget_s=DEFAULT_TIME_BUDGET_S):
+    """Yields (index, result, elapsed_s) for each truck as soon as it is scored.
+
+    Anytime counterpart of score_fleet: callers can show the first results while
+    the rest are still running and stop consuming whenever they are good enough.
+    Cached trucks come first, straight from the result cache. Every truck gets
+    `time_budget_s`, inline as well as in the pool; pool trucks that run out of
+    time are never yielded. Only trucks that have not started are cancelled:
+    one already running keeps its worker busy until its own deadline stops it.
+    """
+    start = time.monotonic()
+    trucks = list(trucks or TRUCKS)
+
+    def cache_args(t):
+        return (evaluator, t, shared["box"], shared.get("apply_payload", True), shared.get("constraints"))
+
+    todo = []
+    for i, t in enumerate(trucks):
+        result = results_cache.lookup(*cache_args(t)) if _cacheable(evaluator) else None
+        if result is None:
+            todo.append(i)
+        else:
+            yield i, result, time.monotonic() - start
+
+    def solve_inline(i):
+        deadline = time.monotonic() + time_budget_s if time_budget_s else None
+        result = EVALUATORS[evaluator](trucks[i], shared, deadline)
+        if _cacheable(evaluator):
+            _remember(cache_args(trucks[i]), result)
+        return result
+
+    if len(todo) < MIN_PARALLEL_TRUCKS:
+        for i in todo:
+            yield i, solve_inline(i), time.monotonic() - start
+        return
+
+    shared_ref = _publish(shared)
+    try:
+        pool = get_pool()
+        futures = {pool.submit(_run_task, evaluator, trucks[i], shared_ref, time_budget_s): i
+                   for i in todo}
+    except (BrokenProcessPool, RuntimeError):
+        reset_pool()
+        for i in todo:
+            yield i, solve_inline(i), time.monotonic() - start
+        return
+
+    timeout = None
+    if time_budget_s:
+        # Every worker handles ceil(n / workers) trucks back to back
+        waves = -(-len(todo) // POOL_WORKERS)
+        timeout = time_budget_s * waves + 1.0
+    try:
+        for future in as_completed(futures, timeout=timeout):
+            i = futures[future]
+            try:
+                result = future.result()
+                if _cacheable(evaluator):
+                    _remember(cache_args(trucks[i]), result)
+            except BrokenProcessPool:
+                reset_pool()
+                result = solve_inline(i)
+            yield i, result, time.monotonic() - start
+    except TimeoutError:
+        pass
+    finally:
+        # Stopped early or out of time: drop whatever has not started yet
+        for future in futures:
+            future.cancel()
+
+
+def score_fleet(shared, trucks=None, evaluator="uniform", time_budget_s=DEFAULT_TIME_BUDGET_S):
+    """Evaluates every truck, in parallel when worthwhile.
+
+    `shared` holds the read-only inputs (e.g. {"box": ..., "apply_payload": ...}).
+    Returns (results, timed_out): results is aligned with `trucks` (None where no
+    arrangement was found or the truck ran out of time), timed_out lists truck names.
+    """
+    trucks = list(trucks or TRUCKS)
+    results, finished = [None] * len(trucks), set()
+    for i, result, _ in iter_fleet(shared, trucks, evaluator, time_budget_s):
+        results[i] = result
+        finished.add(i)
+    timed_out = [t["name"] for i, t in enumerate(trucks) if i not in finished]
+    return results, timed_out
@@ -0,0 +1,335 @@
+# footprint.py
+
+import os
+import math
+
+import numpy as np
+
+from layers import SEPARATOR_MM, TRAY_BASE_MM, layer_2d
+from mesh import CHUNK_VERTICES, convex_hull, mesh_bounds, read_mesh
+from packing import STANDING_AXIS
+
+# Raster cell size for footprints and trays (mm); smaller is tighter but slower
+RASTER_MM = float(os.getenv("FOOTPRINT_RASTER_MM", 2))
+# Quarter turns tried by the nesting; 0/180 lets neighbours interlock
+INTERLOCK_ROTATIONS = (0, 180)
+FREE_ROTATIONS = (0, 90, 180, 270)
+HULLS = ("concave", "convex")
+
+
+# -----------------------------
+# Rasterised footprints
+# -----------------------------
+def _sample_edges(start, end, step):
+    """Points every `step` (or closer) along each segment start→end, excluding the end points."""
+    length = np.hypot(*(end - start).T)
+    n = np.maximum(1, np.ceil(length / step)).astype(np.int64)
+    edge = np.repeat(np.arange(len(n)), n)
+    k = np.arange(len(edge)) - np.repeat(np.cumsum(n) - n, n)
+    t = (k / n[edge])[:, None]
+    return start[edge] + t * (end - start)[edge]
+
+
+def _cells(points, resolution, origin, extent):
+    """Occupied cells; points on the far edge stay in the last cell."""
+    top = np.maximum(np.ceil(extent / resolution) - 1, 0)
+    cells = np.minimum(np.floor((points - origin) / resolution), top).astype(np.int64)
+    return np.unique(cells, axis=0)
+
+
+def _grid(cells):
+    """Boolean mask (x rows, y columns) of occupied cells."""
+    mask = np.zeros(cells.max(axis=0) + 1, dtype=bool)
+    mask[cells[:, 0], cells[:, 1]] = True
+    return mask
+
+
+def _fill(outline):
+    """Cells inside a closed outline: everything the outside cannot reach (4-connected)."""
+    empty = ~np.pad(outline, 1)
+    outside = np.zeros_like(empty)
+    outside[0, :] = outside[-1, :] = outside[:, 0] = outside[:, -1] = True
+    outside &= empty
+    while True:
+        grown = outside.copy()
+        grown[1:] |= outside[:-1]
+        grown[:-1] |= outside[1:]
+        grown[:, 1:] |= outside[:, :-1]
+        grown[:, :-1] |= outside[:, 1:]
+        grown &= empty
+        if np.array_equal(grown, outside):
+            return ~outside[1:-1, 1:-1]
+        outside = grown
+
+
+def _convex_mask(mask):
+    """Cells whose centres lie in the convex hull of the occupied cell centres."""
+    rows = np.flatnonzero(mask.any(axis=1))
+    low = mask[rows].argmax(axis=1)
+    high = mask.shape[1] - 1 - mask[rows, ::-1].argmax(axis=1)
+    # Column extremes per row are the only hull candidates
+    hull = convex_hull(np.concatenate([np.c_[rows, low], np.c_[rows, high]]))
+    x, y = np.indices(mask.shape)
+    inside = np.ones(mask.shape, dtype=bool)
+    for (x0, y0), (x1, y1) in zip(hull, np.roll(hull, -1, axis=0)):
+        inside &= (x1 - x0) * (y - y0) - (y1 - y0) * (x - x0) >= -1e-9
+    return inside | mask
+
+
+def _footprint(cells, resolution, hull, name, height):
+    if hull not in HULLS:
+        raise ValueError(f"❌ Unknown hull {hull!r}; use one of {', '.join(HULLS)}")
+    mask = _grid(cells)
+    mask = _fill(mask) if hull == "concave" else _convex_mask(mask)
+    return {
+        "name": name,
+        "mask": mask,
+        "resolution": resolution,
+        "length": mask.shape[0] * resolution,
+        "width": mask.shape[1] * resolution,
+        "height": height,
+        "area_mm2": float(mask.sum() * resolution ** 2),
+        "hull": hull,
+    }
+
+
+def footprint_from_outline(outline, height, name="Outline", hull="concave", resolution=RASTER_MM):
+    """Footprint of a closed outline [(x, y), ...] in mm, for a part `height` mm tall."""
+    points = np.asarray(outline, dtype=float).reshape(-1, 2)
+    if len(points) < 3:
+        raise ValueError("❌ An outline needs at least three points")
+    samples = _sample_edges(points, np.roll(points, -1, axis=0), resolution / 2)
+    origin = points.min(axis=0)
+    cells = _cells(samples, resolution, origin, points.max(axis=0) - origin)
+    return _footprint(cells, resolution, hull, name, int(height))
+
+
+def footprint_from_mesh(path_or_bytes, name=None, orientation="height-standing", unit_mm=1.0,
+                        hull="concave", resolution=RASTER_MM):
+    """Footprint of a mesh standing on one face of its oriented box.
+
+    Part length, width and height follow the oriented box (as imported on the
+    Inputs page), so `orientation` uses the same standing labels. Every
+    triangle edge is projected and sampled at half a cell: the outline of the
+    projection is made of such edges, and the inside is filled in. Point
+    clouds only have a convex footprint.
+    """
+    bounds = mesh_bounds(path_or_bytes, name, unit_mm)
+    up = STANDING_AXIS[orientation]
+    plane = np.array([a for i, a in enumerate(bounds["obb_axes"]) if i != up], dtype=np.float32).T
+    vertices, triangles = read_mesh(path_or_bytes, bounds["name"])
+    step = CHUNK_VERTICES - CHUNK_VERTICES % 3
+
+    def projected():
+        for start in range(0, len(vertices), step):
+            yield np.asarray(vertices[start:start + step], dtype=np.float32) @ plane * unit_mm
+
+    lo, hi = np.full(2, np.inf), np.full(2, -np.inf)
+    for flat in projected():
+        lo, hi = np.minimum(lo, flat.min(axis=0)), np.maximum(hi, flat.max(axis=0))
+    cells = []
+    for flat in projected():
+        if triangles:
+            corners = flat.reshape(-1, 3, 2)
+            flat = _sample_edges(corners.reshape(-1, 2).astype(np.float64),
+                                 np.roll(corners, -1, axis=1).reshape(-1, 2).astype(np.float64), resolution / 2)
+        cells.append(_cells(flat, resolution, lo, hi - lo))
+    return _footprint(np.unique(np.concatenate(cells), axis=0), resolution,
+                      hull if triangles else "convex", bounds["name"], bounds["obb"][up])
+
+
+# -----------------------------
+# Raster nesting (one tray)
+# -----------------------------
+def _dilate(mask, cells):
+    for _ in range(cells):
+        grown = np.pad(mask, 1)
+        mask = (grown[:-2, :-2] | grown[:-2, 1:-1] | grown[:-2, 2:] | grown[1:-1, :-2] | grown[1:-1, 1:-1]
+                | grown[1:-1, 2:] | grown[2:, :-2] | grown[2:, 1:-1] | grown[2:, 2:])
+    return mask
+
+
+def _fft_size(n):
+    """Smallest 2^a·3^b·5^c >= n; FFTs of such lengths are several times faster."""
+    best = 1 << max(0, (n - 1).bit_length())
+    p5 = 1
+    while p5 < best:
+        p35 = p5
+        while p35 < best:
+            size = p35 << max(0, (-(-n // p35) - 1).bit_length())
+            best = min(best, size)
+            p35 *= 3
+        p5 *= 5
+    return best
+
+
+def _correlate(fixed, moving):
+    """Overlap (cells) of `moving` against `fixed` at every offset, shifted by the size of `moving` - 1."""
+    shape = (fixed.shape[0] + moving.shape[0] - 1, fixed.shape[1] + moving.shape[1] - 1)
+    padded = tuple(_fft_size(n) for n in shape)
+    overlap = np.fft.irfft2(np.fft.rfft2(fixed, padded) * np.fft.rfft2(moving[::-1, ::-1], padded), padded)
+    return overlap[:shape[0], :shape[1]]
+
+
+def _no_fit(placed, moving, clearance):
+    """Offsets of `moving` that collide with `placed` at the origin, shifted by its size - 1 + clearance."""
+    return _dilate(np.pad(_correlate(placed, moving) > 0.5, clearance), clearance)
+
+
+def _free(occupied, mask, gap):
+    """Offsets where `mask` stays `gap` cells clear of every occupied tray cell."""
+    h, w = mask.shape
+    return _correlate(_dilate(occupied, gap), mask)[h - 1:occupied.shape[0], w - 1:occupied.shape[1]] < 0.5
+
+
+def _greedy(masks, tray, no_fit, gap, keys, by_width, occupied=None):
+    """Bottom-left fill; ties go to the next rotation in turn, so neighbours alternate."""
+    feasible = {}
+    for r in keys:
+        size = (tray[0] - masks[r].shape[0] + 1, tray[1] - masks[r].shape[1] + 1)
+        if size[0] > 0 and size[1] > 0:
+            feasible[r] = np.ones(size, dtype=bool) if occupied is None else _free(occupied, masks[r], gap)
+    placements, last = [], len(keys) - 1
+    while True:
+        best = None
+        for k, r in enumerate(keys):
+            if r not in feasible:
+                continue
+            free = feasible[r].T if by_width else feasible[r]
+            i = int(free.argmax())
+            if not free.flat[i]:
+                continue
+            pos = divmod(i, free.shape[1])
+            key = (pos[::-1] if by_width else pos, (k - last - 1) % len(keys))
+            if best is None or key < best[0]:
+                best = (key, k, r)
+        if best is None:
+            return placements
+        (x, y), _ = best[0]
+        last, placed = best[1], best[2]
+        placements.append((x, y, placed))
+        for r, free in feasible.items():
+            shadow = no_fit[placed, r]
+            h, w = masks[r].shape
+            x0, y0 = x - h + 1 - gap, y - w + 1 - gap
+            sx, sy = max(0, -x0), max(0, -y0)
+            ex, ey = min(free.shape[0] - x0, shadow.shape[0]), min(free.shape[1] - y0, shadow.shape[1])
+            if ex > sx and ey > sy:
+                free[x0 + sx:x0 + ex, y0 + sy:y0 + ey] &= ~shadow[sx:ex, sy:ey]
+
+
+def _pair(masks, no_fit, gap, a, b):
+    """`b` nested against `a` in the smallest bounding rectangle: (mask, member offsets)."""
+    (ha, wa), (hb, wb) = masks[a].shape, masks[b].shape
+    dx, dy = np.nonzero(~no_fit[a, b])
+    # Side by side is always free, just outside the no-fit window
+    dx = np.concatenate([dx - (hb - 1 + gap), [ha + gap, 0]])
+    dy = np.concatenate([dy - (wb - 1 + gap), [0, wa + gap]])
+    lx, ly = np.minimum(0, dx), np.minimum(0, dy)
+    area = (np.maximum(ha, dx + hb) - lx) * (np.maximum(wa, dy + wb) - ly)
+    i = int(area.argmin())
+    dx, dy, lx, ly = int(dx[i]), int(dy[i]), int(lx[i]), int(ly[i])
+    mask = np.zeros((max(ha, dx + hb) - lx, max(wa, dy + wb) - ly), dtype=bool)
+    mask[-lx:ha - lx, -ly:wa - ly] |= masks[a]
+    mask[dx - lx:dx - lx + hb, dy - ly:dy - ly + wb] |= masks[b]
+    return mask, ((-lx, -ly, a), (dx - lx, dy - ly, b))
+
+
+def _stamp(masks, tray, placements):
+    occupied = np.zeros(tray, dtype=bool)
+    for x, y, r in placements:
+        h, w = masks[r].shape
+        occupied[x:x + h, y:y + w] |= masks[r]
+    return occupied
+
+
+def nest_layer(footprint, length, width, rotations=INTERLOCK_ROTATIONS, clearance=0):
+    """Most copies of a footprint in a length×width tray, with collisions checked on the raster.
+
+    No-fit masks between every pair of rotations are built once (FFT
+    correlation), so placing a part only clears a window of the feasible
+    offsets. Bottom-left fills of single parts are compared with a tiling of
+    interlocked pairs (a part and its half turn, in their smallest bounding
+    rectangle) whose leftovers are filled with single parts. Returns
+    {"count", "placements": [(x, y, rotation)] in mm, "area_utilisation_percent"}.
+    """
+    res = footprint["resolution"]
+    tray = (int((length - clearance) // res), int((width - clearance) // res))
+    gap = math.ceil(clearance / res) if clearance else 0
+    rotations = tuple(rotations) or (0,)
+    masks = {r: np.rot90(footprint["mask"], r // 90) for r in rotations}
+    no_fit = {(p, r): _no_fit(masks[p], masks[r], gap) for p in rotations for r in rotations}
+
+    best = []
+    for keys in {(rotations[0],), rotations}:
+        for by_width in (False, True):
+            placements = _greedy(masks, tray, no_fit, gap, keys, by_width)
+            if len(placements) > len(best):
+                best = placements
+
+    pairs = {(a, (a + 180) % 360) for a in rotations if a < 180 and (a + 180) % 360 in rotations}
+    if pairs:
+        pair_masks, members = {}, {}
+        for key in sorted(pairs):
+            pair_masks[key], members[key] = _pair(masks, no_fit, gap, *key)
+        pair_no_fit = {(p, q): _no_fit(pair_masks[p], pair_masks[q], gap) for p in pair_masks for q in pair_masks}
+        for keys in {tuple(pair_masks)[:1], tuple(pair_masks)}:
+            for by_width in (False, True):
+                tiled = [(x + ox, y + oy, r)
+                         for x, y, key in _greedy(pair_masks, tray, pair_no_fit, gap, keys, by_width)
+                         for ox, oy, r in members[key]]
+                if not tiled:
+                    continue
+                placements = tiled + _greedy(masks, tray, no_fit, gap, rotations, by_width,
+                                             _stamp(masks, tray, tiled))
+                if len(placements) > len(best):
+                    best = placements
+
+    area = length * width
+    return {
+        "count": len(best),
+        "placements": [(x * res, y * res, r) for x, y, r in best],
+        "area_utilisation_percent": round(len(best) * footprint["area_mm2"] / area * 100, 1) if area else 0.0,
+    }
+
+
+# -----------------------------
+# Nested insert stack
+# -----------------------------
+def plan_nested_layers(footprint, box_internal, rotations=INTERLOCK_ROTATIONS, clearance=0,
+                       separator=SEPARATOR_MM, tray=TRAY_BASE_MM):
+    """Identical nested trays stacked to the box height, against the cuboid-cell trays."""
+    length, width, height = (int(d) for d in box_internal)
+    layer = nest_layer(footprint, length, width, rotations, clearance)
+    part_h = int(footprint["height"]) + clearance
+    layers = (height + separator) // (part_h + tray + separator) if layer["count"] else 0
+
+    # Same part as a bounding rectangle in a plain insert grid
+    cell = sorted((math.ceil(footprint["length"]) + clearance, math.ceil(footprint["width"]) + clearance),
+                  reverse=True)
+    cuboid, _ = layer_2d(length, width, *cell)
+    return {
+        "parts_per_box": layer["count"] * layers,
+        "per_layer": layer["count"],
+        "layers": layers,
+        "placements": layer["placements"],
+        "area_utilisation_percent": layer["area_utilisation_percent"],
+        "cuboid_per_layer": cuboid,
+        "gain_percent": round((layer["count"] - cuboid) / cuboid * 100, 1) if cuboid else 0.0,
+        "footprint": footprint["name"],
+        "hull": footprint["hull"],
+        "resolution": footprint["resolution"],
+        "rotations": list(rotations),
+    }
+
+
+def layout_image(footprint, nested, length, width):
+    """RGB preview of a nested tray (one colour per rotation), x along the image width."""
+    res = footprint["resolution"]
+    image = np.full((int(width // res), int(length // res), 3), 255, dtype=np.uint8)
+    colours = {0: (31, 119, 180), 90: (44, 160, 44), 180: (255, 127, 14), 270: (214, 39, 40)}
+    for x, y, r in nested["placements"]:
+        mask = np.rot90(footprint["mask"], r // 90).T
+        i, j = int(round(y / res)), int(round(x / res))
+        image[i:i + mask.shape[0], j:j + mask.shape[1]][mask] = colours[r]
+    return image
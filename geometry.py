@@ -0,0 +1,144 @@
+# geometry.py
+
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import NamedTuple
+
+# Millimetres per unit; bare numbers are millimetres
+_UNITS = {"mm": 1, "cm": 10, "m": 1000, "in": 25.4, '"': 25.4}
+_NUMBER = re.compile(r'(\d+(?:[.,]\d+)*)\s*(?:(mm|cm|m|in|")(?![a-z]))?', re.IGNORECASE)
+
+
+def to_mm(value, unit="mm"):
+    """Rounds a length to whole millimetres (half up)."""
+    return int(float(value) * _UNITS[unit.lower()] + 0.5)
+
+
+def _number(text):
+    # "1,100" is a thousands separator, "12,5" a decimal comma
+    if re.fullmatch(r"\d{1,3}(,\d{3})+", text):
+        return float(text.replace(",", ""))
+    return float(text.replace(",", "."))
+
+
+# -----------------------------
+# Dimensions
+# -----------------------------
+class Dims(NamedTuple):
+    """Length × width × height in integer millimetres; unpacks and hashes like a tuple."""
+    length: int
+    width: int
+    height: int
+
+    @classmethod
+    def of(cls, value):
+        """Dims from Dims, a 3-sequence of numbers (mm) or an LLM dimension string."""
+        if isinstance(value, Dims):
+            return value
+        if isinstance(value, str):
+            return parse_dims(value)
+        l, w, h = value
+        return cls(to_mm(l), to_mm(w), to_mm(h))
+
+    @property
+    def volume(self):
+        return self.length * self.width * self.height
+
+    def sorted(self):
+        """Largest side first; rotation-invariant key."""
+        return Dims(*sorted(self, reverse=True))
+
+    def __str__(self):
+        return f"{self.length}×{self.width}×{self.height}"
+
+
+@lru_cache(maxsize=4096)
+def parse_dims(text):
+    """Parses "1100x900x580 mm", "110 × 90 × 58 cm", "L1100.5 x W900 x H580" ... into Dims.
+
+    A unit after any number applies to the numbers before it that have none;
+    numbers without any unit are millimetres. Raises ValueError unless exactly
+    three lengths are found.
+    """
+    values, units = [], []
+    for number, unit in _NUMBER.findall(text):
+        values.append(_number(number))
+        units.append(unit.lower() if unit else None)
+    if len(values) != 3:
+        raise ValueError(f"❌ Expected three dimensions in {text!r}")
+
+    trailing = next((u for u in reversed(units) if u), "mm")
+    resolved, pending = [], trailing
+    for unit in reversed(units):
+        pending = unit or pending
+        resolved.append(pending)
+    resolved.reverse()
+    return Dims(*(to_mm(v, u) for v, u in zip(values, resolved)))
+
+
+# -----------------------------
+# Parts, boxes and trucks
+# -----------------------------
+@dataclass(frozen=True, slots=True)
+class Part:
+    dims: Dims
+    weight: float
+    fragile: bool = False
+    stacking: bool = True
+    orientation: tuple = ()
+
+    @classmethod
+    def from_product(cls, product):
+        """Part from the Step 1 product dict (L/W/H/weight/...)."""
+        return cls(
+            dims=Dims.of((product["L"], product["W"], product["H"])),
+            weight=float(product["weight"]),
+            fragile=bool(product.get("fragile", False)),
+            stacking=bool(product.get("stacking", True)),
+            orientation=tuple(product.get("orientation") or ()),
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class Box:
+    name: str
+    internal: Dims
+    external: Dims
+    weight: float = 0.0          # gross weight when packed, kg
+    library_id: str = ""
+
+    @classmethod
+    def from_recommendation(cls, recommendation, weight):
+        """Box from an LLM or library recommendation; the only place dimension strings are parsed."""
+        box = recommendation["box"]
+        internal = Dims.of(box.get("internal_dims") or box["internal"])
+        external = Dims.of(box.get("external_dims") or box.get("external") or internal)
+        return cls(
+            name=box.get("library_id") or box.get("type", "Outer Box"),
+            internal=internal,
+            external=external,
+            weight=float(weight),
+            library_id=box.get("library_id", ""),
+        )
+
+    def as_item(self):
+        """Dict in the shape calculate_optimisation and the packer expect."""
+        return {"name": self.name, "dimensions": self.external, "weight": self.weight}
+
+
+@dataclass(frozen=True, slots=True)
+class Truck:
+    name: str
+    dims: Dims
+    payload: float
+
+    @classmethod
+    def from_dict(cls, truck):
+        return cls(truck["name"], Dims.of(truck["dimensions"]), float(truck["payload"]))
+
+    def as_dict(self):
+        return {"name": self.name, "dimensions": self.dims, "payload": self.payload}
+
+
+DEFAULT_BOX = Box("Outer Box", Dims(1100, 900, 580), Dims(1100, 900, 580), 18.0)
@@ -0,0 +1,163 @@
+# improver.py
+
+import os
+import math
+import time
+import random
+from concurrent.futures import wait
+from concurrent.futures.process import BrokenProcessPool
+
+from bounds import BOUND_TOLERANCE, gap_percent, utilisation_bound
+from fleet import get_pool, reset_pool
+from packer import pack, normalise_item, item_orientations, load_order
+
+# Moves each start tries between two incumbent exchanges
+ITERATIONS_PER_EPOCH = int(os.getenv("IMPROVER_EPOCH_ITERATIONS", 25))
+DEFAULT_STARTS = int(os.getenv("IMPROVER_STARTS", os.cpu_count() or 2))
+# Annealing temperature in units of truck volume share (0.01 = 1 % utilisation)
+START_TEMPERATURE = 0.01
+COOLING = 0.97
+
+
+# ----------------------------------------------------
+# Genome: box sequence plus a preferred orientation per box type
+# ----------------------------------------------------
+def _score(truck, items, apply_payload, genome, deadline=None):
+    order, prefer = genome
+    plan = pack(truck, items, apply_payload, deadline, order=order, prefer=prefer)
+    t_len, t_wid, t_hei = truck["dimensions"]
+    volume = sum(p["dims"][0] * p["dims"][1] * p["dims"][2] for p in plan.placements)
+    return volume / (t_len * t_wid * t_hei), plan
+
+
+def _neighbour(genome, items, rng):
+    order, prefer = list(genome[0]), dict(genome[1])
+    move = rng.random()
+    if move < 0.4 and len(order) > 1:
+        # Swap two boxes
+        i, j = rng.randrange(len(order)), rng.randrange(len(order))
+        order[i], order[j] = order[j], order[i]
+    elif move < 0.7 and len(order) > 2:
+        # Move a run of boxes elsewhere in the sequence
+        i = rng.randrange(len(order))
+        j = min(len(order), i + rng.randint(1, max(1, len(order) // 10)))
+        block = order[i:j]
+        del order[i:j]
+        k = rng.randrange(len(order) + 1)
+        order[k:k] = block
+    else:
+        # Prefer another orientation for one box type (None = density ranking)
+        idx = rng.choice(sorted(set(order))) if order else 0
+        options = item_orientations(items[idx]) + [None]
+        prefer[idx] = rng.choice(options)
+        if prefer[idx] is None:
+            del prefer[idx]
+    return order, prefer
+
+
+def _anneal(truck, items, apply_payload, genome, score, iterations, temperature, seed, deadline, target=1.0):
+    """One start's epoch of simulated annealing from the shared incumbent; stops at `target`."""
+    rng = random.Random(seed)
+    current, current_score = genome, score
+    best, best_score = genome, score
+    for _ in range(iterations):
+        if deadline and time.monotonic() > deadline:
+            break
+        candidate = _neighbour(current, items, rng)
+        cand_score, _ = _score(truck, items, apply_payload, candidate, deadline)
+        delta = cand_score - current_score
+        if delta >= 0 or (temperature > 0 and rng.random() < math.exp(delta / temperature)):
+            current, current_score = candidate, cand_score
+            if cand_score > best_score:
+                best, best_score = candidate, cand_score
+                if best_score >= target - BOUND_TOLERANCE:
+                    break
+        temperature *= COOLING
+    return best_score, best
+
+
+# ----------------------------------------------------
+# Public API
+# ----------------------------------------------------
+def iter_improve(truck, items, apply_payload=True, time_budget_s=10.0, starts=None, seed=0,
+                 max_epochs=None):
+    """Improves a mixed load plan with parallel multi-start annealing.
+
+    Every epoch each start anneals from the shared incumbent in the process pool
+    and the best result (lowest start index on ties) becomes the next incumbent.
+    Each start's moves come from (seed, start, epoch), so a run is reproducible
+    whenever `max_epochs`, not the time budget, ends it.
+
+    Yields (plan, stats) for the constructive baseline and again for every
+    improved incumbent, so callers can show a plan at once and stop consuming
+    whenever it is good enough. The search ends early once the incumbent meets
+    the volume / payload / Barnes upper bound, since nothing can beat it.
+    """
+    start_time = time.monotonic()
+    items = [normalise_item(it) for it in items]
+    starts = starts or DEFAULT_STARTS
+    deadline = start_time + time_budget_s
+
+    bound = utilisation_bound(truck, items, apply_payload)["bound"]
+    genome = (load_order(items), {})
+    baseline, plan = _score(truck, items, apply_payload, genome)
+    incumbent, incumbent_score = genome, baseline
+
+    def stats(epochs):
+        return {
+            "baseline_utilisation": round(baseline * 100, 2),
+            "utilisation": round(incumbent_score * 100, 2),
+            "gain_points": round((incumbent_score - baseline) * 100, 2),
+            "utilisation_bound": round(bound * 100, 2),
+            "gap_percent": gap_percent(incumbent_score, bound),
+            "optimal": incumbent_score >= bound - BOUND_TOLERANCE,
+            "epochs": epochs,
+            "starts": starts,
+            "seed": seed,
+            "elapsed_s": round(time.monotonic() - start_time, 3),
+        }
+
+    yield plan, stats(0)
+
+    epochs = last_yield = 0
+    temperature = START_TEMPERATURE
+    while (time.monotonic() < deadline and (max_epochs is None or epochs < max_epochs)
+           and incumbent_score < bound - BOUND_TOLERANCE):
+        args = [
+            (truck, items, apply_payload, incumbent, incumbent_score, ITERATIONS_PER_EPOCH,
+             temperature, seed * 1_000_003 + start * 1_009 + epochs, deadline, bound)
+            for start in range(starts)
+        ]
+        try:
+            pool = get_pool()
+            futures = [pool.submit(_anneal, *a) for a in args]
+            wait(futures)
+            results = [f.result() for f in futures]
+        except (BrokenProcessPool, RuntimeError):
+            reset_pool()
+            results = [_anneal(*a) for a in args]
+
+        improved = False
+        for score, candidate in results:
+            if score > incumbent_score:
+                incumbent, incumbent_score, improved = candidate, score, True
+        temperature *= COOLING ** ITERATIONS_PER_EPOCH
+        epochs += 1
+
+        if improved:
+            _, plan = _score(truck, items, apply_payload, incumbent)
+            plan.solve_mode = "improved"
+            yield plan, stats(epochs)
+            last_yield = epochs
+
+    if epochs > last_yield:
+        # Final report with the total search effort
+        yield plan, stats(epochs)
+
+
+def improve(truck, items, apply_payload=True, time_budget_s=10.0, starts=None, seed=0,
+            max_epochs=None):
+    """Runs iter_improve to the end; returns the final (plan, stats)."""
+    for plan, stats in iter_improve(truck, items, apply_payload, time_budget_s, starts, seed, max_epochs):
+        pass
+    return plan, stats
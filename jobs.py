@@ -0,0 +1,325 @@
+# jobs.py
+
+import os
+import sys
+import json
+import time
+import uuid
+import sqlite3
+import threading
+import subprocess
+import traceback
+from contextlib import closing
+
+from paths import cache_path
+
+DB_PATH = os.getenv("JOBS_DB_PATH") or cache_path("jobs.sqlite")
+
+# A running job whose worker has not heartbeated for this long is re-queued
+STALE_AFTER_S = float(os.getenv("JOBS_STALE_AFTER_S", 30))
+POLL_INTERVAL_S = 0.5
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    label TEXT,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL,
+    progress REAL DEFAULT 0,
+    message TEXT DEFAULT '',
+    partial TEXT,
+    result TEXT,
+    error TEXT,
+    checkpoint TEXT,
+    cancel_requested INTEGER DEFAULT 0,
+    worker_pid INTEGER,
+    heartbeat REAL,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created);
+CREATE TABLE IF NOT EXISTS workers (
+    pid INTEGER PRIMARY KEY,
+    heartbeat REAL NOT NULL
+);
+"""
+
+FINISHED = ("done", "failed", "cancelled")
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobLost(Exception):
+    """The job was re-queued or claimed by another worker while this one ran it."""
+
+
+def _connect():
+    conn = sqlite3.connect(DB_PATH, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def _row_to_job(row):
+    job = dict(row)
+    for key in ("params", "partial", "result", "checkpoint"):
+        job[key] = json.loads(job[key]) if job[key] else None
+    return job
+
+
+# ----------------------------------------------------
+# Client API (used by the pages)
+# ----------------------------------------------------
+def submit(kind, params, label=None):
+    """Queues a job and makes sure a worker is running; returns the job id."""
+    if kind not in JOB_TYPES:
+        raise ValueError(f"❌ Unknown job type: {kind}")
+    job_id = uuid.uuid4().hex[:12]
+    now = time.time()
+    with closing(_connect()) as conn:
+        conn.execute(
+            "INSERT INTO jobs (id, kind, label, params, status, created, updated) VALUES (?, ?, ?, ?, 'queued', ?, ?)",
+            (job_id, kind, label or kind, json.dumps(params), now, now),
+        )
+    ensure_workers()
+    return job_id
+
+
+def get(job_id):
+    with closing(_connect()) as conn:
+        row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    return _row_to_job(row) if row else None
+
+
+def list_jobs(limit=20, kind=None):
+    """Most recent jobs first, across all sessions."""
+    query = "SELECT * FROM jobs"
+    args = []
+    if kind:
+        query += " WHERE kind = ?"
+        args.append(kind)
+    query += " ORDER BY created DESC LIMIT ?"
+    args.append(limit)
+    with closing(_connect()) as conn:
+        return [_row_to_job(r) for r in conn.execute(query, args).fetchall()]
+
+
+def cancel(job_id):
+    """Queued jobs are cancelled at once; running ones stop at their next progress report."""
+    now = time.time()
+    with closing(_connect()) as conn:
+        conn.execute(
+            "UPDATE jobs SET status = 'cancelled', updated = ? WHERE id = ? AND status = 'queued'",
+            (now, job_id),
+        )
+        conn.execute(
+            "UPDATE jobs SET cancel_requested = 1, updated = ? WHERE id = ? AND status = 'running'",
+            (now, job_id),
+        )
+
+
+def resume(job_id):
+    """Re-queues a cancelled or failed job; it restarts from its last checkpoint."""
+    with closing(_connect()) as conn:
+        conn.execute(
+            "UPDATE jobs SET status = 'queued', cancel_requested = 0, error = NULL, updated = ? "
+            "WHERE id = ? AND status IN ('cancelled', 'failed')",
+            (time.time(), job_id),
+        )
+    ensure_workers()
+
+
+def purge(older_than_days=30):
+    """Drops finished jobs older than the retention window."""
+    cutoff = time.time() - older_than_days * 86400
+    with closing(_connect()) as conn:
+        conn.execute(
+            f"DELETE FROM jobs WHERE status IN ({', '.join('?' * len(FINISHED))}) AND updated < ?",
+            (*FINISHED, cutoff),
+        )
+
+
+def ensure_workers(count=None):
+    """Starts detached worker processes until `count` are alive."""
+    count = count or int(os.getenv("JOBS_WORKERS", 2))
+    now = time.time()
+    with closing(_connect()) as conn:
+        conn.execute("DELETE FROM workers WHERE heartbeat < ?", (now - STALE_AFTER_S,))
+        alive = conn.execute("SELECT COUNT(*) FROM workers").fetchone()[0]
+    for _ in range(max(0, count - alive)):
+        # New session so workers outlive Streamlit reruns, reconnects and restarts
+        proc = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "worker"],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+        with closing(_connect()) as conn:
+            conn.execute("INSERT OR REPLACE INTO workers (pid, heartbeat) VALUES (?, ?)", (proc.pid, now))
+
+
+# ----------------------------------------------------
+# Worker side
+# ----------------------------------------------------
+class JobContext:
+    """Handed to job functions for progress, partial results and checkpoints."""
+
+    def __init__(self, conn, job):
+        self._conn = conn
+        self.job_id = job["id"]
+        self.params = job["params"]
+        self.checkpoint_state = job["checkpoint"]  # None on a fresh start
+
+    def progress(self, fraction, message="", partial=None, checkpoint=None):
+        """Reports progress; raises JobCancelled if the user cancelled the job."""
+        now = time.time()
+        sets = ["progress = ?", "message = ?", "heartbeat = ?", "updated = ?"]
+        args = [max(0.0, min(1.0, fraction)), message, now, now]
+        if partial is not None:
+            sets.append("partial = ?")
+            args.append(json.dumps(partial))
+        if checkpoint is not None:
+            sets.append("checkpoint = ?")
+            args.append(json.dumps(checkpoint))
+            self.checkpoint_state = checkpoint
+        args += [self.job_id, os.getpid()]
+        updated = self._conn.execute(
+            f"UPDATE jobs SET {', '.join(sets)} WHERE id = ? AND status = 'running' AND worker_pid = ?", args
+        ).rowcount
+        if not updated:
+            raise JobLost()
+
+        row = self._conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (self.job_id,)).fetchone()
+        if row and row[0]:
+            raise JobCancelled()
+
+
+def _heartbeat(job_id, stop):
+    """Keeps the job and worker heartbeats fresh while a stage runs without reporting progress."""
+    pid = os.getpid()
+    with closing(_connect()) as conn:
+        while not stop.wait(STALE_AFTER_S / 3):
+            now = time.time()
+            conn.execute("UPDATE jobs SET heartbeat = ? WHERE id = ? AND status = 'running' AND worker_pid = ?",
+                         (now, job_id, pid))
+            conn.execute("UPDATE workers SET heartbeat = ? WHERE pid = ?", (now, pid))
+
+
+def _finish(conn, job_id, sets, args):
+    """Records the outcome only while this worker still holds the job."""
+    conn.execute(
+        f"UPDATE jobs SET {sets}, updated = ? WHERE id = ? AND status = 'running' AND worker_pid = ?",
+        (*args, time.time(), job_id, os.getpid()),
+    )
+
+
+def _requeue_stale(conn):
+    """Running jobs whose worker died go back to the queue, keeping their checkpoint."""
+    conn.execute(
+        "UPDATE jobs SET status = 'queued', worker_pid = NULL WHERE status = 'running' AND heartbeat < ?",
+        (time.time() - STALE_AFTER_S,),
+    )
+
+
+def _claim(conn):
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        _requeue_stale(conn)
+        row = conn.execute(
+            "SELECT * FROM jobs WHERE status = 'queued' ORDER BY created LIMIT 1"
+        ).fetchone()
+        if row is None:
+            conn.execute("COMMIT")
+            return None
+        now = time.time()
+        conn.execute(
+            "UPDATE jobs SET status = 'running', worker_pid = ?, heartbeat = ?, updated = ? WHERE id = ?",
+            (os.getpid(), now, now, row["id"]),
+        )
+        conn.execute("COMMIT")
+        return _row_to_job(row)
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def run_worker(idle_exit_s=300):
+    """Worker loop: claims queued jobs until idle for `idle_exit_s` seconds."""
+    conn = _connect()
+    pid = os.getpid()
+    idle_since = time.time()
+    while True:
+        now = time.time()
+        conn.execute("INSERT OR REPLACE INTO workers (pid, heartbeat) VALUES (?, ?)", (pid, now))
+        job = _claim(conn)
+        if job is None:
+            if now - idle_since > idle_exit_s:
+                break
+            time.sleep(POLL_INTERVAL_S)
+            continue
+
+        ctx = JobContext(conn, job)
+        stop = threading.Event()
+        beat = threading.Thread(target=_heartbeat, args=(job["id"], stop), daemon=True)
+        beat.start()
+        try:
+            result = JOB_TYPES[job["kind"]](ctx)
+            _finish(conn, job["id"], "status = 'done', progress = 1, result = ?", (json.dumps(result),))
+        except JobLost:
+            pass
+        except JobCancelled:
+            _finish(conn, job["id"], "status = 'cancelled', cancel_requested = 0", ())
+        except Exception:
+            _finish(conn, job["id"], "status = 'failed', error = ?", (traceback.format_exc(limit=5),))
+        finally:
+            stop.set()
+            beat.join()
+        idle_since = time.time()
+
+    conn.execute("DELETE FROM workers WHERE pid = ?", (pid,))
+    conn.close()
+
+
+# ----------------------------------------------------
+# Job types
+# ----------------------------------------------------
+def fleet_sweep(ctx):
+    """Scores every box against every truck, resuming after the last finished box."""
+    from fleet import evaluate
+    from packing import TRUCKS
+
+    boxes = ctx.params["boxes"]
+    trucks = ctx.params.get("trucks") or TRUCKS
+    apply_payload = ctx.params.get("apply_payload", True)
+
+    state = ctx.checkpoint_state or {"next_box": 0, "results": []}
+    results = state["results"]
+    for i in range(state["next_box"], len(boxes)):
+        box = dict(boxes[i], dimensions=tuple(boxes[i]["dimensions"]))
+        row = {"box_index": i, "box": box.get("name", box.get("type")), "trucks": []}
+        for truck in trucks:
+            truck = dict(truck, dimensions=tuple(truck["dimensions"]))
+            row["trucks"].append(evaluate("uniform", truck, {"box": box, "apply_payload": apply_payload}))
+        results.append(row)
+        ctx.progress(
+            (i + 1) / len(boxes),
+            f"Scored box {i + 1} of {len(boxes)}",
+            partial=results,
+            checkpoint={"next_box": i + 1, "results": results},
+        )
+    return results
+
+
+JOB_TYPES = {
+    "fleet_sweep": fleet_sweep,
+}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "worker":
+        run_worker()
+    else:
+        print("usage: python jobs.py worker")
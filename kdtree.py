@@ -0,0 +1,86 @@
+# kdtree.py
+
+import numpy as np
+
+
+class KDTree:
+    """Static KD-tree over fixed-length numeric points (L-infinity metric)."""
+
+    def __init__(self, points):
+        self.points = np.asarray(points, dtype=float).reshape(len(points), -1) if len(points) else np.empty((0, 0))
+        self.size = len(self.points)
+        self.dim = self.points.shape[1] if self.size else 0
+        # Flat node arrays: point index, split axis, left child, right child
+        self._idx = np.empty(self.size, dtype=np.int64)
+        self._axis = np.empty(self.size, dtype=np.int64)
+        self._left = np.full(self.size, -1, dtype=np.int64)
+        self._right = np.full(self.size, -1, dtype=np.int64)
+        self._next = 0
+        self._root = self._build(np.arange(self.size), 0) if self.size else -1
+
+    def _build(self, indices, depth):
+        if len(indices) == 0:
+            return -1
+        pts = self.points[indices]
+        # Split on the widest axis so skewed data (e.g. flags) stays balanced
+        axis = int(np.argmax(pts.max(axis=0) - pts.min(axis=0))) if len(indices) > 1 else depth % self.dim
+        order = indices[np.argsort(pts[:, axis], kind="stable")]
+        mid = len(order) // 2
+
+        node = self._next
+        self._next += 1
+        self._idx[node] = order[mid]
+        self._axis[node] = axis
+        self._left[node] = self._build(order[:mid], depth + 1)
+        self._right[node] = self._build(order[mid + 1:], depth + 1)
+        return node
+
+    # ----------------------------------------------------
+    # Queries
+    # ----------------------------------------------------
+    def nearest(self, point):
+        """Returns (index, distance) of the closest point, or (None, inf) when empty."""
+        if self.size == 0:
+            return None, float("inf")
+        q = np.asarray(point, dtype=float)
+        best = [None, float("inf")]
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            if node < 0:
+                continue
+            i = self._idx[node]
+            d = float(np.max(np.abs(self.points[i] - q)))
+            if d < best[1]:
+                best[0], best[1] = int(i), d
+            axis = self._axis[node]
+            diff = q[axis] - self.points[i, axis]
+            near, far = (self._left[node], self._right[node]) if diff < 0 else (self._right[node], self._left[node])
+            # Far side is pushed first so the near side is explored first
+            if abs(diff) <= best[1]:
+                stack.append(far)
+            stack.append(near)
+        return best[0], best[1]
+
+    def query_range(self, lo, hi):
+        """Returns indices of all points p with lo <= p <= hi (component-wise)."""
+        if self.size == 0:
+            return []
+        lo = np.asarray(lo, dtype=float)
+        hi = np.asarray(hi, dtype=float)
+        found = []
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            if node < 0:
+                continue
+            i = self._idx[node]
+            p = self.points[i]
+            if np.all(p >= lo) and np.all(p <= hi):
+                found.append(int(i))
+            axis = self._axis[node]
+            if lo[axis] <= p[axis]:
+                stack.append(self._left[node])
+            if hi[axis] >= p[axis]:
+                stack.append(self._right[node])
+        return sorted(found)
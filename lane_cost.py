@@ -0,0 +1,194 @@
+# lane_cost.py
+
+import os
+import csv
+import functools
+
+import numpy as np
+
+ROUTE_TYPES = ("Highway", "Semi-Urban", "Village")
+# Default route mix (%) when the truck load page has not been filled in
+DEFAULT_ROUTE_MIX = {"Highway": 50, "Semi-Urban": 30, "Village": 20}
+
+DIESEL_PRICE = float(os.getenv("DIESEL_PRICE_PER_L", 90))          # ₹ per litre
+DIESEL_CO2 = float(os.getenv("DIESEL_KG_CO2_PER_L", 2.68))         # kg CO₂ per litre burnt
+# Optional CSV (source, destination, km) overriding or extending the built-in lanes
+LANES_PATH = os.getenv("LANES_PATH")
+
+# Per road type: fuel multiplier on the highway figure, average speed (km/h), tolled share
+ROAD = {
+    "Highway": {"fuel": 1.0, "speed": 50.0, "tolled": 1.0},
+    "Semi-Urban": {"fuel": 1.2, "speed": 30.0, "tolled": 0.0},
+    "Village": {"fuel": 1.35, "speed": 20.0, "tolled": 0.0},
+}
+
+# Per truck: highway litres/100 km empty and at full payload, driver and capital ₹/h,
+# tyres and maintenance ₹/km, highway toll ₹/km
+TRUCK_PROFILES = {
+    "22 ft. Truck": {"empty_l": 20.0, "full_l": 28.0, "hourly": 350.0, "per_km": 4.0, "toll": 2.5},
+    "32 ft. Single Axle": {"empty_l": 25.0, "full_l": 36.0, "hourly": 450.0, "per_km": 5.0, "toll": 3.5},
+    "32 ft. Multi Axle": {"empty_l": 28.0, "full_l": 42.0, "hourly": 500.0, "per_km": 6.0, "toll": 5.5},
+}
+_PROFILE_PAYLOADS = {"22 ft. Truck": 10000, "32 ft. Single Axle": 16000, "32 ft. Multi Axle": 21000}
+
+# Road distances (km) between the cities offered on the input pages
+LANES = {
+    ("Mumbai", "Delhi"): 1420, ("Mumbai", "Chennai"): 1335, ("Mumbai", "Bangalore"): 985,
+    ("Mumbai", "Kolkata"): 1990, ("Mumbai", "Hyderabad"): 710, ("Mumbai", "Pune"): 150,
+    ("Mumbai", "Ahmedabad"): 525, ("Delhi", "Chennai"): 2180, ("Delhi", "Bangalore"): 2150,
+    ("Delhi", "Kolkata"): 1530, ("Delhi", "Hyderabad"): 1570, ("Delhi", "Pune"): 1450,
+    ("Delhi", "Ahmedabad"): 950, ("Chennai", "Bangalore"): 345, ("Chennai", "Kolkata"): 1670,
+    ("Chennai", "Hyderabad"): 630, ("Chennai", "Pune"): 1190, ("Chennai", "Ahmedabad"): 1850,
+    ("Bangalore", "Kolkata"): 1880, ("Bangalore", "Hyderabad"): 570, ("Bangalore", "Pune"): 840,
+    ("Bangalore", "Ahmedabad"): 1500, ("Kolkata", "Hyderabad"): 1490, ("Kolkata", "Pune"): 1870,
+    ("Kolkata", "Ahmedabad"): 2000, ("Hyderabad", "Pune"): 560, ("Hyderabad", "Ahmedabad"): 1200,
+    ("Pune", "Ahmedabad"): 660,
+}
+
+
+# -----------------------------
+# Lane table
+# -----------------------------
+@functools.lru_cache(maxsize=1)
+def lane_table():
+    """(city index, symmetric distance matrix in km; NaN where no lane is known), built once."""
+    lanes = dict(LANES)
+    if LANES_PATH and os.path.exists(LANES_PATH):
+        with open(LANES_PATH, newline="") as f:
+            for row in csv.DictReader(f):
+                lanes[(row["source"].strip(), row["destination"].strip())] = float(row["km"])
+    cities = sorted({c for pair in lanes for c in pair})
+    index = {c: i for i, c in enumerate(cities)}
+    km = np.full((len(cities), len(cities)), np.nan)
+    np.fill_diagonal(km, 0.0)
+    for (a, b), d in lanes.items():
+        km[index[a], index[b]] = km[index[b], index[a]] = d
+    return index, km
+
+
+def lane_km(source, destination, stops=None):
+    """Road distance of a lane, through any drop `stops` in order (the last stop may be the destination).
+
+    Returns None when a leg is not in the lane table.
+    """
+    index, km = lane_table()
+    legs = [source] + [s for s in (stops or []) if s != destination] + [destination]
+    if any(c not in index for c in legs):
+        return None
+    total = km[[index[a] for a in legs[:-1]], [index[b] for b in legs[1:]]].sum()
+    return None if np.isnan(total) else float(total)
+
+
+def route_shares(route_mix):
+    """Route mix ({type: %} or array-like in ROUTE_TYPES order, one row per scenario) as fractions."""
+    if isinstance(route_mix, dict):
+        route_mix = [route_mix.get(t, 0) for t in ROUTE_TYPES]
+    mix = np.atleast_2d(np.asarray(route_mix, dtype=float))
+    total = mix.sum(axis=1, keepdims=True)
+    if mix.shape[1] != len(ROUTE_TYPES) or (mix < 0).any() or (total <= 0).any():
+        raise ValueError(f"❌ Route mix needs non-negative shares of {', '.join(ROUTE_TYPES)}")
+    return mix / total
+
+
+def truck_profile(name, payload):
+    """Cost profile of a truck; unknown trucks are interpolated on payload."""
+    if name in TRUCK_PROFILES:
+        return TRUCK_PROFILES[name]
+    known = sorted(TRUCK_PROFILES, key=_PROFILE_PAYLOADS.get)
+    xs = [_PROFILE_PAYLOADS[k] for k in known]
+    return {f: float(np.interp(payload, xs, [TRUCK_PROFILES[k][f] for k in known]))
+            for f in TRUCK_PROFILES[known[0]]}
+
+
+# -----------------------------
+# Vectorised costs (scenarios × trucks)
+# -----------------------------
+def trip_costs(distance_km, route_mix, trucks, load_kg, round_trip=True):
+    """Cost (₹), diesel (L), CO₂ (kg) and hours of one truck trip, as (scenarios, trucks) arrays.
+
+    `distance_km` has one value per scenario (or one for all), `route_mix` one
+    row per scenario, `trucks` is a list of {"name", "payload"} and `load_kg`
+    the cargo weight per truck (trucks, or scenarios × trucks). Fuel rises
+    linearly with the load factor; returnable boxes make the way back an
+    empty run when `round_trip` is set.
+    """
+    mix = route_shares(route_mix)
+    distance = np.asarray(distance_km, dtype=float).reshape(-1, 1)
+    profiles = [truck_profile(t["name"], t["payload"]) for t in trucks]
+    field = {f: np.array([p[f] for p in profiles]) for f in profiles[0]}
+    payload = np.array([float(t["payload"]) for t in trucks])
+
+    load_factor = np.clip(np.asarray(load_kg, dtype=float) / payload, 0.0, 1.0)
+    road = {k: np.array([ROAD[t][k] for t in ROUTE_TYPES]) for k in ("fuel", "speed", "tolled")}
+    fuel_factor = (mix @ road["fuel"])[:, None]                 # scenarios × 1
+    hours_per_km = (mix @ (1 / road["speed"]))[:, None]
+    tolled = (mix @ road["tolled"])[:, None]
+
+    litres_per_km = (field["empty_l"] + (field["full_l"] - field["empty_l"]) * load_factor) / 100 * fuel_factor
+    if round_trip:
+        litres_per_km = litres_per_km + field["empty_l"] / 100 * fuel_factor
+    legs = 2 if round_trip else 1
+    litres = distance * litres_per_km
+    hours = legs * distance * hours_per_km
+    cost = litres * DIESEL_PRICE + hours * field["hourly"] + legs * distance * (field["per_km"] + tolled * field["toll"])
+    shape = np.broadcast_shapes(cost.shape, load_factor.shape)
+    return {
+        "cost": np.broadcast_to(cost, shape),
+        "fuel_l": np.broadcast_to(litres, shape),
+        "co2_kg": np.broadcast_to(litres * DIESEL_CO2, shape),
+        "hours": np.broadcast_to(hours, shape),
+        "load_factor": np.broadcast_to(load_factor, shape),
+    }
+
+
+def part_costs(distance_km, route_mix, trucks, boxes_per_truck, box_weight, parts_per_box=1, round_trip=True):
+    """Cost and CO₂ per part for every scenario and truck; NaN where a truck carries nothing."""
+    boxes = np.asarray(boxes_per_truck, dtype=float)
+    trip = trip_costs(distance_km, route_mix, trucks, boxes * float(box_weight or 0), round_trip)
+    parts = boxes * max(1, int(parts_per_box or 1))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        per = np.where(parts > 0, 1 / np.where(parts > 0, parts, 1), np.nan)
+    return dict(trip, cost_per_part=trip["cost"] * per, co2_per_part=trip["co2_kg"] * per)
+
+
+# -----------------------------
+# Truck ranking
+# -----------------------------
+RANKINGS = {
+    "utilisation": ("utilisation_percent", True),
+    "cost": ("cost_per_part", False),
+    "co2": ("co2_per_part", False),
+}
+
+
+def with_costs(results, distance_km, route_mix, parts_per_box=1, round_trip=True):
+    """Truck results (calculate_optimisation shape) with cost and CO₂ per part and per trip added."""
+    if not results:
+        return []
+    trucks = [{"name": r["truck_name"], "payload": r["payload"]} for r in results]
+    costs = part_costs(distance_km, route_mix, trucks, [r["boxes_per_truck"] for r in results],
+                       results[0]["box_weight"], parts_per_box, round_trip)
+    return [
+        dict(r,
+             trip_cost=round(float(costs["cost"][0, i]), 0),
+             trip_co2_kg=round(float(costs["co2_kg"][0, i]), 1),
+             load_factor=round(float(costs["load_factor"][0, i]), 3),
+             cost_per_part=round(float(costs["cost_per_part"][0, i]), 2),
+             co2_per_part=round(float(costs["co2_per_part"][0, i]), 3))
+        for i, r in enumerate(results)
+    ]
+
+
+def rank_trucks(results, by="cost"):
+    """Results best first by utilisation, cost per part or CO₂ per part; trucks without a cost go last."""
+    if by not in RANKINGS:
+        raise ValueError(f"❌ Unknown ranking: {by}. Use one of {', '.join(RANKINGS)}")
+    column, descending = RANKINGS[by]
+
+    def key(r):
+        value = r.get(column)
+        if value is None or value != value:
+            return (1, 0.0)
+        return (0, -value if descending else value)
+
+    return sorted(results, key=key)
@@ -0,0 +1,135 @@
+# layers.py
+
+import os
+from functools import lru_cache
+
+from bounds import layer_bound
+from packing import STANDING_AXIS
+
+# PP separator sheet between layers and insert tray base under each layer (mm)
+SEPARATOR_MM = int(os.getenv("INSERT_SEPARATOR_MM", 3))
+TRAY_BASE_MM = int(os.getenv("INSERT_TRAY_BASE_MM", 5))
+
+
+# -----------------------------
+# 2D layer (one insert tray)
+# -----------------------------
+def _grid(length, width, a, b):
+    return (length // a) * (width // b)
+
+
+def _best_grid(length, width, a, b):
+    """Uniform grid in whichever in-plane rotation fits more: (count, cell_l, cell_w)."""
+    straight, turned = _grid(length, width, a, b), _grid(length, width, b, a)
+    return (straight, a, b) if straight >= turned else (turned, b, a)
+
+
+@lru_cache(maxsize=65536)
+def layer_2d(length, width, a, b):
+    """Most a×b cells in a length×width tray, as a two-block guillotine pattern.
+
+    The tray is cut once, along its length or width; the first block is a grid
+    of whole strips and the remainder a grid in the best rotation. Returns
+    (count, blocks) with blocks as (x, y, cols, rows, cell_l, cell_w); the
+    search is skipped when the plain grid already meets the 2D bound.
+    """
+    count, cl, cw = _best_grid(length, width, a, b)
+    best = (count, ((0, 0, length // cl, width // cw, cl, cw),) if count else ())
+    if count >= layer_bound(length, width, a, b):
+        # The plain grid already meets the 2D Barnes bound
+        return best
+
+    for p, q in ((a, b), (b, a)):
+        rows = width // q
+        for n in range(1, length // p):
+            rest, rl, rw = _best_grid(length - n * p, width, a, b)
+            total = n * rows + rest
+            if total > best[0]:
+                best = (total, ((0, 0, n, rows, p, q),
+                                (n * p, 0, (length - n * p) // rl, width // rw, rl, rw)))
+        cols = length // p
+        for m in range(1, width // q):
+            rest, rl, rw = _best_grid(length, width - m * q, a, b)
+            total = m * cols + rest
+            if total > best[0]:
+                best = (total, ((0, 0, cols, m, p, q),
+                                (0, m * q, length // rl, (width - m * q) // rw, rl, rw)))
+    return best
+
+
+# -----------------------------
+# 3D stack of layers
+# -----------------------------
+def _standing_options(part_dims, orientation, clearance):
+    labels = [o.lower() for o in (orientation or []) if o.lower() in STANDING_AXIS] or list(STANDING_AXIS)
+    options = {}
+    for label in labels:
+        up = STANDING_AXIS[label]
+        a, b = sorted((int(d) + clearance for i, d in enumerate(part_dims) if i != up), reverse=True)
+        h = int(part_dims[up]) + clearance
+        options.setdefault((a, b, h), label)
+    return options
+
+
+@lru_cache(maxsize=16384)
+def _plan(part_dims, box_internal, orientation, separator, tray, clearance):
+    length, width, height = (int(d) for d in box_internal)
+    layer_types = []
+    for (a, b, h), label in _standing_options(part_dims, orientation, clearance).items():
+        count, blocks = layer_2d(length, width, a, b)
+        if count:
+            # Each layer takes its tray base, its parts and one separator above it
+            layer_types.append((label, (a, b, h), count, blocks, h + tray + separator))
+
+    # Unbounded knapsack over height; the top layer needs no separator above it
+    capacity = height + separator
+    best = [0] * (capacity + 1)
+    choice = [-1] * (capacity + 1)
+    for z in range(1, capacity + 1):
+        best[z], choice[z] = best[z - 1], -1
+        for t, (_, _, count, _, cost) in enumerate(layer_types):
+            if cost <= z and best[z - cost] + count > best[z]:
+                best[z], choice[z] = best[z - cost] + count, t
+
+    stack, z = [], capacity
+    while z > 0:
+        if choice[z] < 0:
+            z -= 1
+            continue
+        stack.append(choice[z])
+        z -= layer_types[choice[z]][4]
+
+    # Fullest layers at the bottom
+    stack.sort(key=lambda t: (-layer_types[t][2], t))
+    layers = tuple(layer_types[t][:4] + (layer_types[t][1][2] + tray,) for t in stack)
+    used = sum(layer_types[t][4] for t in stack) - (separator if stack else 0)
+
+    uniform = max((count * (capacity // cost) for _, _, count, _, cost in layer_types), default=0)
+    return best[capacity], layers, used, uniform
+
+
+def plan_layers(part_dims, box_internal, orientation=None, separator=SEPARATOR_MM,
+                tray=TRAY_BASE_MM, clearance=0):
+    """Per-layer orientation and matrix that fit the most parts into a box.
+
+    Layers may stand the part on different faces, so leftover height above the
+    main layers can take a flatter layer. Tray bases and separator sheets are
+    included in the height budget. 2D layers and whole plans are memoised, so
+    ranking hundreds of candidate boxes stays interactive.
+    """
+    count, layers, used, uniform = _plan(
+        tuple(int(d) for d in part_dims), tuple(int(d) for d in box_internal),
+        tuple(orientation or ()), int(separator), int(tray), int(clearance),
+    )
+    return {
+        "parts_per_box": count,
+        "uniform_parts_per_box": uniform,
+        "layers": [
+            {"orientation": label, "cell": cell, "count": n, "blocks": blocks, "height": h}
+            for label, cell, n, blocks, h in layers
+        ],
+        "used_height": used,
+        "free_height": int(box_internal[2]) - used,
+        "separator_mm": int(separator),
+        "tray_mm": int(tray),
+    }
@@ -10,6 +10,11 @@ import vertexai
 from vertexai.generative_models import GenerativeModel, Part
 import math
 
+from similarity_cache import get_similarity_cache
+from geometry import parse_dims
+from layers import plan_layers
+from footprint import plan_nested_layers
+
 load_dotenv()
 
 def _extract_json(text: str) -> str:
@@ -34,6 +39,7 @@ class LLMRecommender:
 
         vertexai.init(project=self.project, location=self.location, credentials=self.credentials)
         self.model = GenerativeModel(self.model_name)
+        self.similarity_cache = get_similarity_cache()
 
     # ----------------------------------------------------
     # 1️⃣ Outer Box Recommendation
@@ -41,6 +47,11 @@ class LLMRecommender:
     def recommend(self, length, width, height, weight="", fragile="low",
                   forklift=False, forklift_capacity=0, stacking=False,
                   quantity=1, orientation=None, source="N/A", destination="N/A"):
+        # Near-identical parts reuse an accepted recommendation instead of calling Gemini
+        cached = self.similarity_cache.lookup(length, width, height, weight, fragile, stacking)
+        if cached is not None:
+            return cached
+
         prompt = f"""
         You are a packaging design expert. 
         Recommend the best *outer box type* for the given auto part.
@@ -79,6 +90,13 @@ class LLMRecommender:
             if not data or "box" not in data or "type" not in data["box"]:
                 raise ValueError("Invalid LLM JSON structure")
 
+            try:
+                internal_dims = self._clean_dimensions_tuple(str(data["box"]["internal"]))
+                self.similarity_cache.add(length, width, height, weight, fragile, stacking,
+                                          data, internal_dims)
+            except (KeyError, ValueError) as e:
+                print("Similarity cache skipped:", e)
+
             return data
 
         except Exception as e:
@@ -144,12 +162,24 @@ class LLMRecommender:
     # ----------------------------------------------------
     def recommend_insert_matrix(self, part_length, part_width, part_height,
                                 weight, orientation, outer_box_length,
-                                outer_box_width, outer_box_height):
+                                outer_box_width, outer_box_height, allowed_orientations=None, footprint=None,
+                                nest_options=None):
         if not all([part_length, part_width, part_height,
                 outer_box_length, outer_box_width, outer_box_height]):
             raise ValueError(f"❌ Missing dimensions: part=({part_length},{part_width},{part_height}), "
                          f"box=({outer_box_length},{outer_box_width},{outer_box_height})")
 
+        # Layer stack over every allowed orientation, with trays and separators
+        layer_plan = plan_layers(
+            (part_length, part_width, part_height),
+            (outer_box_length, outer_box_width, outer_box_height),
+            allowed_orientations or [orientation],
+        )
+        # Non-cuboid parts: interlocked pockets shaped to the part footprint
+        nested = plan_nested_layers(
+            footprint, (outer_box_length, outer_box_width, outer_box_height), **(nest_options or {})
+        ) if footprint else None
+
         if orientation == "width-standing":
             part_length, part_width = part_width, part_length
         elif orientation == "height-standing":
@@ -186,28 +216,81 @@ class LLMRecommender:
                     "width": part_width,
                     "height": part_height
                 },
-                "units_per_insert": units_per_layer
+                "units_per_insert": units_per_layer,
+                "parts_per_box": layer_plan["parts_per_box"] or total_units
             },
             "visualization": {
                 "matrix_pattern": matrix_pattern
             },
+            "layer_plan": layer_plan,
             "reason": (
                 f"{rows}×{cols} layout fits inside {outer_box_length}×{outer_box_width} mm. "
-                f"Total {units_per_layer} parts per layer."
+                f"Total {units_per_layer} parts per layer; "
+                f"{len(layer_plan['layers'])} layers hold {layer_plan['parts_per_box']} parts per box."
             )
         }
 
+        if nested and nested["parts_per_box"] > insert_data["insert"]["parts_per_box"]:
+            insert_data["insert"].update(
+                type="PP Insert (nested pockets)",
+                units_per_insert=nested["per_layer"],
+                parts_per_box=nested["parts_per_box"],
+            )
+            insert_data["reason"] += (
+                f" Nesting the {nested['hull']} footprint with alternating rotation fits "
+                f"{nested['per_layer']} parts per layer ({nested['gain_percent']:+} % on cuboid cells), "
+                f"{nested['parts_per_box']} parts in {nested['layers']} layers."
+            )
+        if nested:
+            insert_data["nesting"] = nested
+
         return insert_data
 
     # ----------------------------------------------------
-    # 4️⃣ Helpers for cleaning dimensions
+    # 4️⃣ Box Library Tie-Breaker
     # ----------------------------------------------------
-    def _clean_dimension(self, dim: str) -> int:
-        return int(re.sub(r"[^0-9]", "", dim.strip()))
+    def break_tie(self, length, width, height, weight, fragile, candidates):
+        """Picks one of several equally scored library boxes; falls back to the first."""
+        options = "\n".join(
+            f"- {c['box']['id']}: {c['box']['type']}, internal "
+            f"{'×'.join(str(d) for d in c['box']['internal'])} mm, "
+            f"{c['parts_per_box']} parts per box, {c['gross_weight']} kg gross"
+            for c in candidates
+        )
+        prompt = f"""
+        You are a packaging design expert. The following standard returnable boxes
+        carry the same number of parts per box and per truck.
+
+        📦 Part: {length} × {width} × {height} mm, {weight} kg, fragility: {fragile}
+
+        Candidates:
+        {options}
 
+        ✅ Return JSON with this structure (do not include extra text, only JSON):
+        {{
+            "choice": "candidate id",
+            "reason": "One or two sentences on why this box is preferable."
+        }}
+        """
+        try:
+            response = self.model.generate_content([Part.from_text(prompt)])
+            text = _extract_json(response.candidates[0].content.parts[0].text.strip())
+            data = json.loads(text)
+            ids = [c["box"]["id"] for c in candidates]
+            if data.get("choice") not in ids:
+                raise ValueError("Tie-breaker chose an unknown box")
+            return candidates[ids.index(data["choice"])], data.get("reason")
+
+        except Exception as e:
+            print("LLM tie-break error:", e)
+            return candidates[0], None
+
+    # ----------------------------------------------------
+    # 5️⃣ Helpers for cleaning dimensions
+    # ----------------------------------------------------
     def _clean_dimensions_tuple(self, dims: str):
-        parts = re.split(r"[×x]", dims)
-        return tuple(self._clean_dimension(p) for p in parts if p.strip())
+        # Keeps decimals and units ("110.5 x 90 x 58 cm"); see geometry.parse_dims
+        return parse_dims(dims)
 
 # llm_recommender.py
 
@@ -220,6 +303,11 @@ import vertexai
 from vertexai.generative_models import GenerativeModel, Part
 import math
 
+from similarity_cache import get_similarity_cache
+from geometry import parse_dims
+from layers import plan_layers
+from footprint import plan_nested_layers
+
 load_dotenv()
 
 def _extract_json(text: str) -> str:
@@ -244,6 +332,7 @@ class LLMRecommender:
 
         vertexai.init(project=self.project, location=self.location, credentials=self.credentials)
         self.model = GenerativeModel(self.model_name)
+        self.similarity_cache = get_similarity_cache()
 
     # ----------------------------------------------------
     # 1️⃣ Outer Box Recommendation
@@ -251,6 +340,11 @@ class LLMRecommender:
     def recommend(self, length, width, height, weight="", fragile="low",
                   forklift=False, forklift_capacity=0, stacking=False,
                   quantity=1, orientation=None, source="N/A", destination="N/A"):
+        # Near-identical parts reuse an accepted recommendation instead of calling Gemini
+        cached = self.similarity_cache.lookup(length, width, height, weight, fragile, stacking)
+        if cached is not None:
+            return cached
+
         prompt = f"""
         You are a packaging design expert. 
         Recommend the best *outer box type* for the given auto part.
@@ -289,6 +383,13 @@ class LLMRecommender:
             if not data or "box" not in data or "type" not in data["box"]:
                 raise ValueError("Invalid LLM JSON structure")
 
+            try:
+                internal_dims = self._clean_dimensions_tuple(str(data["box"]["internal"]))
+                self.similarity_cache.add(length, width, height, weight, fragile, stacking,
+                                          data, internal_dims)
+            except (KeyError, ValueError) as e:
+                print("Similarity cache skipped:", e)
+
             return data
 
         except Exception as e:
@@ -354,12 +455,24 @@ class LLMRecommender:
     # ----------------------------------------------------
     def recommend_insert_matrix(self, part_length, part_width, part_height,
                                 weight, orientation, outer_box_length,
-                                outer_box_width, outer_box_height):
+                                outer_box_width, outer_box_height, allowed_orientations=None, footprint=None,
+                                nest_options=None):
         if not all([part_length, part_width, part_height,
                 outer_box_length, outer_box_width, outer_box_height]):
             raise ValueError(f"❌ Missing dimensions: part=({part_length},{part_width},{part_height}), "
                          f"box=({outer_box_length},{outer_box_width},{outer_box_height})")
 
+        # Layer stack over every allowed orientation, with trays and separators
+        layer_plan = plan_layers(
+            (part_length, part_width, part_height),
+            (outer_box_length, outer_box_width, outer_box_height),
+            allowed_orientations or [orientation],
+        )
+        # Non-cuboid parts: interlocked pockets shaped to the part footprint
+        nested = plan_nested_layers(
+            footprint, (outer_box_length, outer_box_width, outer_box_height), **(nest_options or {})
+        ) if footprint else None
+
         if orientation == "width-standing":
             part_length, part_width = part_width, part_length
         elif orientation == "height-standing":
@@ -396,26 +509,79 @@ class LLMRecommender:
                     "width": part_width,
                     "height": part_height
                 },
-                "units_per_insert": units_per_layer
+                "units_per_insert": units_per_layer,
+                "parts_per_box": layer_plan["parts_per_box"] or total_units
             },
             "visualization": {
                 "matrix_pattern": matrix_pattern
             },
+            "layer_plan": layer_plan,
             "reason": (
                 f"{rows}×{cols} layout fits inside {outer_box_length}×{outer_box_width} mm. "
-                f"Total {units_per_layer} parts per layer."
+                f"Total {units_per_layer} parts per layer; "
+                f"{len(layer_plan['layers'])} layers hold {layer_plan['parts_per_box']} parts per box."
             )
         }
 
+        if nested and nested["parts_per_box"] > insert_data["insert"]["parts_per_box"]:
+            insert_data["insert"].update(
+                type="PP Insert (nested pockets)",
+                units_per_insert=nested["per_layer"],
+                parts_per_box=nested["parts_per_box"],
+            )
+            insert_data["reason"] += (
+                f" Nesting the {nested['hull']} footprint with alternating rotation fits "
+                f"{nested['per_layer']} parts per layer ({nested['gain_percent']:+} % on cuboid cells), "
+                f"{nested['parts_per_box']} parts in {nested['layers']} layers."
+            )
+        if nested:
+            insert_data["nesting"] = nested
+
         return insert_data
 
     # ----------------------------------------------------
-    # 4️⃣ Helpers for cleaning dimensions
+    # 4️⃣ Box Library Tie-Breaker
     # ----------------------------------------------------
-    def _clean_dimension(self, dim: str) -> int:
-        return int(re.sub(r"[^0-9]", "", dim.strip()))
+    def break_tie(self, length, width, height, weight, fragile, candidates):
+        """Picks one of several equally scored library boxes; falls back to the first."""
+        options = "\n".join(
+            f"- {c['box']['id']}: {c['box']['type']}, internal "
+            f"{'×'.join(str(d) for d in c['box']['internal'])} mm, "
+            f"{c['parts_per_box']} parts per box, {c['gross_weight']} kg gross"
+            for c in candidates
+        )
+        prompt = f"""
+        You are a packaging design expert. The following standard returnable boxes
+        carry the same number of parts per box and per truck.
+
+        📦 Part: {length} × {width} × {height} mm, {weight} kg, fragility: {fragile}
+
+        Candidates:
+        {options}
 
+        ✅ Return JSON with this structure (do not include extra text, only JSON):
+        {{
+            "choice": "candidate id",
+            "reason": "One or two sentences on why this box is preferable."
+        }}
+        """
+        try:
+            response = self.model.generate_content([Part.from_text(prompt)])
+            text = _extract_json(response.candidates[0].content.parts[0].text.strip())
+            data = json.loads(text)
+            ids = [c["box"]["id"] for c in candidates]
+            if data.get("choice") not in ids:
+                raise ValueError("Tie-breaker chose an unknown box")
+            return candidates[ids.index(data["choice"])], data.get("reason")
+
+        except Exception as e:
+            print("LLM tie-break error:", e)
+            return candidates[0], None
+
+    # ----------------------------------------------------
+    # 5️⃣ Helpers for cleaning dimensions
+    # ----------------------------------------------------
     def _clean_dimensions_tuple(self, dims: str):
-        parts = re.split(r"[×x]", dims)
-        return tuple(self._clean_dimension(p) for p in parts if p.strip())
+        # Keeps decimals and units ("110.5 x 90 x 58 cm"); see geometry.parse_dims
+        return parse_dims(dims)
 
@@ -0,0 +1,327 @@
+# mesh.py
+
+import os
+import re
+import sys
+import math
+import mmap
+import itertools
+
+import numpy as np
+
+from geometry import Dims
+
+MESH_EXTENSIONS = (".stl", ".obj")
+# Millimetres per mesh unit; CAD exports carry no units of their own
+MESH_UNITS = {"mm": 1.0, "cm": 10.0, "m": 1000.0, "in": 25.4}
+# Vertices per streaming pass; bounds the temporary arrays to a few tens of MB
+CHUNK_VERTICES = 1 << 20
+# Rotations tried about each principal axis when tightening the oriented box
+OBB_ANGLE_STEPS = 90
+# Default part material for weights from mesh volume (steel, kg/m³)
+DEFAULT_DENSITY = float(os.getenv("MESH_DENSITY_KG_M3", 7850))
+
+_STL_TRIANGLE = np.dtype([("normal", "<f4", (3,)), ("vertices", "<f4", (3, 3)), ("attribute", "<u2")])
+_STL_VERTEX = re.compile(rb"vertex\s+(\S+)\s+(\S+)\s+(\S+)")
+_OBJ_VERTEX = re.compile(rb"^v\s+(\S+)\s+(\S+)\s+(\S+)", re.MULTILINE)
+_OBJ_FACE = re.compile(rb"^f\s+(.+)$", re.MULTILINE)
+
+# 13 k-DOP directions: extreme points along them seed the oriented box search
+_KDOP = np.array([d for d in itertools.product((-1, 0, 1), repeat=3) if d > (0, 0, 0)], dtype=float)
+_KDOP /= np.linalg.norm(_KDOP, axis=1)[:, None]
+_AXES = [next(i for i, d in enumerate(_KDOP) if d[axis] == 1) for axis in range(3)]
+# Every n-th vertex feeds the principal axis estimate on meshes above PCA_FULL_BELOW vertices
+PCA_SAMPLE_STEP = 16
+PCA_FULL_BELOW = 200_000
+# Extra directions (Fibonacci sphere) whose extreme points outline the hull for the box search
+HULL_DIRECTIONS = 256
+# Largest-area face normals tried as a box axis
+NORMAL_CANDIDATES = 48
+# Vertices per chunk that feed the hull directions and face normals (they only steer the search)
+STEER_SAMPLE = 1 << 16
+
+
+def _sphere(n):
+    i = np.arange(n) + 0.5
+    z = 1 - i / n                                   # upper half: opposite extremes come from argmin
+    r = np.sqrt(1 - z * z)
+    phi = np.pi * (1 + 5 ** 0.5) * i
+    return np.c_[r * np.cos(phi), r * np.sin(phi), z]
+
+
+# k-DOP directions first: their extremes also give the axis-aligned box
+_DIRECTIONS = np.concatenate([_KDOP, _sphere(HULL_DIRECTIONS)])
+
+
+# -----------------------------
+# Readers (vertex arrays, triangles as consecutive triples)
+# -----------------------------
+def _source(path_or_bytes):
+    """Read-only buffer over a file (memory-mapped) or an in-memory upload."""
+    if isinstance(path_or_bytes, (bytes, bytearray, memoryview)):
+        return memoryview(path_or_bytes)
+    with open(path_or_bytes, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise ValueError(f"❌ Empty mesh file: {path_or_bytes}")
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _is_binary_stl(buf):
+    if len(buf) < 84:
+        return False
+    count = int(np.frombuffer(buf, dtype="<u4", count=1, offset=80)[0])
+    return len(buf) == 84 + count * _STL_TRIANGLE.itemsize
+
+
+def read_stl(path_or_bytes):
+    """(vertices, triangles) of a binary or ASCII STL; binary files stay memory-mapped."""
+    buf = _source(path_or_bytes)
+    if _is_binary_stl(buf):
+        count = (len(buf) - 84) // _STL_TRIANGLE.itemsize
+        triangles = np.frombuffer(buf, dtype=_STL_TRIANGLE, count=count, offset=84)
+        return triangles["vertices"].reshape(-1, 3), count
+    vertices = np.array(_STL_VERTEX.findall(buf), dtype=float).reshape(-1, 3)
+    return vertices, len(vertices) // 3
+
+
+def read_obj(path_or_bytes):
+    """(vertices, triangles) of a Wavefront OBJ; polygons are fanned into triangles."""
+    buf = _source(path_or_bytes)
+    points = np.array(_OBJ_VERTEX.findall(buf), dtype=float).reshape(-1, 3)
+    corners = []
+    for face in _OBJ_FACE.findall(buf):
+        idx = [int(v.split(b"/")[0]) for v in face.split()]
+        idx = [i - 1 if i > 0 else len(points) + i for i in idx]
+        for k in range(1, len(idx) - 1):
+            corners.extend((idx[0], idx[k], idx[k + 1]))
+    if not corners:
+        # Point cloud: bounds only
+        return points, 0
+    return points[np.asarray(corners)], len(corners) // 3
+
+
+READERS = {".stl": read_stl, ".obj": read_obj}
+
+
+def read_mesh(path_or_bytes, name=None):
+    """(vertices, triangles) by file extension of `name` (or the path)."""
+    ext = os.path.splitext(name or str(path_or_bytes))[1].lower()
+    if ext not in READERS:
+        raise ValueError(f"❌ Unsupported mesh format {ext!r}; use one of {', '.join(MESH_EXTENSIONS)}")
+    return READERS[ext](path_or_bytes)
+
+
+# -----------------------------
+# Streaming bounds
+# -----------------------------
+def _chunks(vertices):
+    # Whole triangles per chunk, so volumes can be summed chunk by chunk
+    step = CHUNK_VERTICES - CHUNK_VERTICES % 3
+    for start in range(0, len(vertices), step):
+        yield np.array(vertices[start:start + step], dtype=np.float32)
+
+
+def _signed_volume(chunk, origin):
+    a, b, c = (chunk.reshape(-1, 3, 3).astype(np.float64) - origin).transpose(1, 2, 0)
+    return float((a[0] * (b[1] * c[2] - b[2] * c[1]) - a[1] * (b[0] * c[2] - b[2] * c[0])
+                  + a[2] * (b[0] * c[1] - b[1] * c[0])).sum()) / 6
+
+
+def _face_normals(chunk):
+    """Unit normals (sign-folded, rounded) with their summed triangle areas."""
+    a, b, c = chunk.reshape(-1, 3, 3).astype(np.float64).transpose(1, 0, 2)
+    cross = np.cross(b - a, c - a)
+    area = np.linalg.norm(cross, axis=1)
+    keep = area > 0
+    unit = cross[keep] / area[keep, None]
+    # n and -n give the same box axis
+    unit *= np.where((unit[:, 2] < 0) | ((unit[:, 2] == 0) & (unit[:, 1] < 0)), -1.0, 1.0)[:, None]
+    # One integer per rounded normal: a 1D unique is far cheaper than a row-wise one
+    q = np.rint(unit * 1000).astype(np.int64) + 1000
+    keys, group = np.unique((q[:, 0] * 2001 + q[:, 1]) * 2001 + q[:, 2], return_inverse=True)
+    normals = np.c_[keys // 2001 ** 2, keys // 2001 % 2001, keys % 2001] / 1000 - 1
+    return normals, np.bincount(group.ravel(), area[keep] / 2, len(keys))
+
+
+def _scan(vertices, triangles):
+    """One pass: axis-aligned box, moments for PCA, extreme points, face normals, signed volume."""
+    lo, hi = np.full(3, np.inf), np.full(3, -np.inf)
+    n, total, outer = 0, np.zeros(3), np.zeros((3, 3))
+    extremes, normals, areas, volume = [], [], [], 0.0
+    kdop, directions = _KDOP.astype(np.float32), _DIRECTIONS.astype(np.float32)
+    origin = np.asarray(vertices[0], dtype=np.float64)
+    # Principal axes only steer the search, so large meshes feed a sample of vertices
+    step = PCA_SAMPLE_STEP if len(vertices) >= PCA_FULL_BELOW else 1
+    for chunk in _chunks(vertices):
+        # Row-major projections keep the per-direction reductions contiguous
+        proj = kdop @ chunk.T
+        low, high = proj.argmin(axis=1), proj.argmax(axis=1)
+        extremes.append(chunk[np.concatenate([low, high])])
+        lo = np.minimum(lo, chunk[low[_AXES], [0, 1, 2]])
+        hi = np.maximum(hi, chunk[high[_AXES], [0, 1, 2]])
+        # Whole triangles, so the sample still yields face normals
+        stride = max(1, len(chunk) // STEER_SAMPLE)
+        steer = chunk.reshape(-1, 3, 3)[::stride].reshape(-1, 3) if triangles else chunk[::stride]
+        proj = directions @ steer.T
+        extremes.append(steer[np.concatenate([proj.argmin(axis=1), proj.argmax(axis=1)])])
+        sample = chunk[::step].astype(np.float64) - origin
+        n += len(sample)
+        total += sample.sum(axis=0)
+        outer += sample.T @ sample
+        if triangles:
+            volume += _signed_volume(chunk, origin)
+            keys, area = _face_normals(steer)
+            top = np.argsort(area)[::-1][:NORMAL_CANDIDATES]
+            normals.append(keys[top])
+            areas.append(area[top])
+    mean = total / n
+    covariance = outer / n - np.outer(mean, mean)
+    if normals:
+        keys, group = np.unique(np.concatenate(normals), axis=0, return_inverse=True)
+        area = np.bincount(group.ravel(), np.concatenate(areas), len(keys))
+        normals = keys[np.argsort(area)[::-1][:NORMAL_CANDIDATES]]
+        normals /= np.linalg.norm(normals, axis=1, keepdims=True)
+    else:
+        normals = np.zeros((0, 3))
+    points = np.unique(np.concatenate(extremes).astype(np.float64), axis=0)
+    return lo, hi, covariance, points, normals, abs(volume)
+
+
+def _rotation(axis, angle):
+    c, s = math.cos(angle), math.sin(angle)
+    x, y, z = axis
+    return np.array([
+        [c + x * x * (1 - c), x * y * (1 - c) - z * s, x * z * (1 - c) + y * s],
+        [y * x * (1 - c) + z * s, c + y * y * (1 - c), y * z * (1 - c) - x * s],
+        [z * x * (1 - c) - y * s, z * y * (1 - c) + x * s, c + z * z * (1 - c)],
+    ])
+
+
+def convex_hull(points):
+    """Counter-clockwise hull of 2D points (Andrew's monotone chain)."""
+    points = sorted(set(map(tuple, np.asarray(points, dtype=float).tolist())))
+    if len(points) < 3:
+        return np.array(points)
+
+    def half(seq):
+        chain = []
+        for p in seq:
+            while len(chain) >= 2 and ((chain[-1][0] - chain[-2][0]) * (p[1] - chain[-2][1])
+                                       - (chain[-1][1] - chain[-2][1]) * (p[0] - chain[-2][0])) <= 0:
+                chain.pop()
+            chain.append(p)
+        return chain[:-1]
+
+    return np.array(half(points) + half(reversed(points)))
+
+
+def _flush_frame(axis, points):
+    """Box axes with one face normal to `axis`: the minimum-area rectangle of the
+    projected hull has a side along one of its edges (rotating calipers)."""
+    axis = axis / np.linalg.norm(axis)
+    e1 = np.cross(axis, [1.0, 0, 0] if abs(axis[0]) < 0.9 else [0, 1.0, 0])
+    e1 /= np.linalg.norm(e1)
+    e2 = np.cross(axis, e1)
+    hull = convex_hull(np.round(points @ np.c_[e1, e2], 6))
+    if len(hull) < 3:
+        return np.array([e1, e2, axis])
+    edges = np.roll(hull, -1, axis=0) - hull
+    angles = np.arctan2(edges[:, 1], edges[:, 0])
+    c, s = np.cos(angles), np.sin(angles)
+    u = hull[None, :, 0] * c[:, None] + hull[None, :, 1] * s[:, None]
+    v = -hull[None, :, 0] * s[:, None] + hull[None, :, 1] * c[:, None]
+    k = int(((u.max(1) - u.min(1)) * (v.max(1) - v.min(1))).argmin())
+    a = c[k] * e1 + s[k] * e2
+    return np.array([a, np.cross(axis, a), axis])
+
+
+def _best_frame(covariance, candidates, normals=()):
+    """Rows = box axes: the smallest-volume box over the candidate points.
+
+    Tried: world axes, principal axes and rotations about each of them, plus
+    a box flush with each large face (and each principal plane), sized by
+    the minimum-area rectangle in that plane.
+    """
+    _, vectors = np.linalg.eigh(covariance)
+    pca = vectors.T
+    frames = [np.eye(3), pca]
+    for axis in pca:
+        for step in range(1, OBB_ANGLE_STEPS):
+            frames.append(pca @ _rotation(axis, math.pi / 2 * step / OBB_ANGLE_STEPS).T)
+    for axis in [*normals, *pca, *np.eye(3)]:
+        frames.append(_flush_frame(np.asarray(axis, dtype=float), candidates))
+    frames = np.array(frames)
+    proj = np.einsum("fij,pj->fpi", frames, candidates)
+    volumes = (proj.max(axis=1) - proj.min(axis=1)).prod(axis=1)
+    return frames[int(volumes.argmin())]
+
+
+def mesh_bounds(path_or_bytes, name=None, unit_mm=1.0):
+    """Axis-aligned and oriented bounding boxes of a mesh, in whole millimetres.
+
+    Vertices are streamed in chunks from the memory-mapped file. The oriented
+    box is searched on extreme points along a few hundred directions (world,
+    principal, rotated principal and face-flush frames), then measured
+    exactly over every vertex.
+    """
+    name = name or os.path.basename(str(path_or_bytes))
+    vertices, triangles = read_mesh(path_or_bytes, name)
+    if len(vertices) == 0:
+        raise ValueError(f"❌ No vertices found in {name}")
+
+    lo, hi, covariance, candidates, normals, volume = _scan(vertices, triangles)
+    frame = _best_frame(covariance, candidates, normals)
+    o_lo, o_hi = np.full(3, np.inf), np.full(3, -np.inf)
+    axes = frame.astype(np.float32)
+    for chunk in _chunks(vertices):
+        proj = axes @ chunk.T
+        o_lo = np.minimum(o_lo, proj.min(axis=1))
+        o_hi = np.maximum(o_hi, proj.max(axis=1))
+
+    # Round up so the part always fits its box
+    aabb = Dims(*(math.ceil(d * unit_mm - 1e-3) for d in hi - lo))
+    extents = (o_hi - o_lo) * unit_mm
+    order = np.argsort(extents)[::-1]
+    return {
+        "name": name,
+        "aabb": aabb,
+        "obb": Dims(*(math.ceil(extents[i] - 1e-3) for i in order)),
+        "obb_axes": frame[order].round(6).tolist(),
+        "vertices": len(vertices),
+        "triangles": triangles,
+        "volume_m3": volume * unit_mm ** 3 / 1e9 if triangles else None,
+    }
+
+
+def part_weight(bounds, density=DEFAULT_DENSITY):
+    """Part weight (kg) from the mesh volume, or None for open meshes and point clouds."""
+    if not bounds["volume_m3"]:
+        return None
+    return round(bounds["volume_m3"] * density, 3)
+
+
+def import_folder(folder, unit_mm=1.0, density=DEFAULT_DENSITY):
+    """Bounds (plus weight) of every mesh file in `folder`, sorted by name; bad files report an error."""
+    results = []
+    for entry in sorted(os.scandir(folder), key=lambda e: e.name):
+        if not entry.is_file() or os.path.splitext(entry.name)[1].lower() not in MESH_EXTENSIONS:
+            continue
+        try:
+            bounds = mesh_bounds(entry.path, unit_mm=unit_mm)
+            bounds["weight"] = part_weight(bounds, density)
+        except (ValueError, OSError) as e:
+            bounds = {"name": entry.name, "error": str(e)}
+        results.append(bounds)
+    return results
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("usage: python mesh.py <mesh file or folder>")
+        sys.exit(1)
+    target = sys.argv[1]
+    for b in (import_folder(target) if os.path.isdir(target) else [mesh_bounds(target)]):
+        if "error" in b:
+            print(f"{b['name']}: {b['error']}")
+        else:
+            print(f"{b['name']}: OBB {b['obb']} mm, AABB {b['aabb']} mm, {b['triangles']} triangles")
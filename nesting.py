@@ -0,0 +1,141 @@
+# nesting.py
+
+import os
+import bisect
+from collections import Counter
+
+# -----------------------------
+# Stock PP sheets
+# -----------------------------
+STOCK_SHEETS = [
+    {"name": "PP sheet 2440×1220", "dimensions": (2440, 1220)},
+    {"name": "PP sheet 2000×1000", "dimensions": (2000, 1000)},
+    {"name": "PP sheet 1500×1000", "dimensions": (1500, 1000)},
+]
+
+# Saw / knife allowance between neighbouring pieces (mm)
+KERF_MM = int(os.getenv("NESTING_KERF_MM", 3))
+
+
+# -----------------------------
+# Piece list from an insert layer plan
+# -----------------------------
+def partition_pieces(layer_plan, box_internal):
+    """Partition strips, tray bases and separator sheets for one box.
+
+    Each block of cells gets interior dividers in both directions, two-block
+    layers one extra divider along the cut; the box walls close the outside.
+    Returns [{"name", "length", "width", "quantity"}] with length >= width.
+    """
+    box_l, box_w, _ = (int(d) for d in box_internal)
+    counts = Counter()
+    for layer in layer_plan["layers"]:
+        strip_h = int(layer["cell"][2])
+        for x, y, cols, rows, cell_l, cell_w in layer["blocks"]:
+            if rows > 1:
+                counts[("Partition strip", cols * cell_l, strip_h)] += rows - 1
+            if cols > 1:
+                counts[("Partition strip", rows * cell_w, strip_h)] += cols - 1
+            if x > 0:
+                counts[("Partition strip", box_w, strip_h)] += 1
+            elif y > 0:
+                counts[("Partition strip", box_l, strip_h)] += 1
+        counts[("Tray base", box_l, box_w)] += 1
+
+    separators = max(0, len(layer_plan["layers"]) - 1)
+    if separators:
+        counts[("Separator sheet", box_l, box_w)] += separators
+
+    return [
+        {"name": name, "length": max(a, b), "width": min(a, b), "quantity": n}
+        for (name, a, b), n in sorted(counts.items())
+    ]
+
+
+# -----------------------------
+# First-fit-decreasing shelf nesting
+# -----------------------------
+def nest(pieces, sheet_dims, kerf=KERF_MM):
+    """Nests pieces onto identical sheets with guillotine shelves (FFD).
+
+    Pieces are laid longest side along the sheet where they fit, sorted by
+    shelf height then length, and go on the first shelf (of the first sheet)
+    with room; new shelves and sheets are opened only when none has.
+    """
+    sheet_l, sheet_w = sheet_dims
+    groups, oversize = Counter(), []
+    for p in pieces:
+        l, w = p["length"], p["width"]
+        if not (l <= sheet_l and w <= sheet_w):
+            if w <= sheet_l and l <= sheet_w:
+                l, w = w, l
+            else:
+                oversize.append(p)
+                continue
+        groups[(w, l, p["name"])] += p["quantity"]
+
+    sheets = []   # per sheet: placements (name, x, y, length, width)
+    shelves = []  # open shelves in sheet order: [sheet, y, height, next_x]
+    free_w = []   # per sheet: y where the next shelf would start
+    first_open = 0
+    min_l = min((l for _, l, _ in groups), default=0)
+    min_w = min((w for w, _, _ in groups), default=0)
+    for (w, l, name), quantity in sorted(groups.items(), key=lambda g: (-g[0][0], -g[0][1], g[0][2])):
+        while quantity:
+            shelf = next((s for s in shelves if w <= s[2] and s[3] + l <= sheet_l), None)
+            if shelf is None:
+                sheet = next((i for i in range(first_open, len(sheets)) if free_w[i] + w <= sheet_w), None)
+                if sheet is None:
+                    sheets.append([])
+                    free_w.append(0)
+                    sheet = len(sheets) - 1
+                shelf = [sheet, free_w[sheet], w, 0]
+                free_w[sheet] += w + kerf
+                # Keep shelves in sheet order so earlier sheets fill first
+                bisect.insort(shelves, shelf)
+                while first_open < len(sheets) and free_w[first_open] + min_w > sheet_w:
+                    first_open += 1
+
+            # Identical pieces go onto the shelf in one step
+            fits = min(quantity, (sheet_l - shelf[3] + kerf) // (l + kerf))
+            for _ in range(fits):
+                sheets[shelf[0]].append((name, shelf[3], shelf[1], l, w))
+                shelf[3] += l + kerf
+            quantity -= fits
+            if shelf[3] + min_l > sheet_l:
+                # Nothing left fits on this shelf
+                shelves.remove(shelf)
+
+    piece_area = sum(w * l * n for (w, l, _), n in groups.items())
+    sheet_area = len(sheets) * sheet_l * sheet_w
+    return {
+        "sheet_dimensions": (sheet_l, sheet_w),
+        "sheets_used": len(sheets),
+        "placements": sheets,
+        "piece_area_m2": round(piece_area / 1e6, 3),
+        "sheet_area_m2": round(sheet_area / 1e6, 3),
+        "scrap_percent": round((1 - piece_area / sheet_area) * 100, 1) if sheet_area else 0.0,
+        "oversize": oversize,
+    }
+
+
+def material_report(layer_plan, box_internal, boxes=1, sheets=None, kerf=KERF_MM):
+    """Cheapest stock sheet for cutting `boxes` sets of inserts, with usage per box."""
+    per_box = partition_pieces(layer_plan, box_internal)
+    batch = [dict(p, quantity=p["quantity"] * boxes) for p in per_box]
+
+    best = None
+    for sheet in sheets or STOCK_SHEETS:
+        result = nest(batch, sheet["dimensions"], kerf)
+        result["sheet"] = sheet["name"]
+        # Oversize pieces cannot be cut from this sheet at all
+        key = (len(result["oversize"]), result["sheet_area_m2"], sheet["name"])
+        if best is None or key < best[0]:
+            best = (key, result)
+
+    result = best[1]
+    result["boxes"] = boxes
+    result["pieces_per_box"] = per_box
+    result["sheet_area_per_box_m2"] = round(result["sheet_area_m2"] / boxes, 4) if boxes else 0.0
+    result["scrap_per_box_m2"] = round((result["sheet_area_m2"] - result["piece_area_m2"]) / boxes, 4) if boxes else 0.0
+    return result
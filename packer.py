@@ -0,0 +1,556 @@
+# packer.py
+
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from bounds import gap_percent, utilisation_bound
+from packing import allowed_orientations
+
+# Load a box can carry on top, by box type, when the user gives no crush limit
+DEFAULT_CRUSH_LIMITS = {"PLC": 1500, "FLC": 2500, "CRATE": 200, "PP": 100}
+DEFAULT_CRUSH_LIMIT = 1000
+# Fragile boxes only carry this share of their nominal crush limit
+FRAGILE_CRUSH_FACTOR = 0.25
+# Volume share a full solve typically reaches on a full truck, until one has been observed
+DEFAULT_FILL_REFERENCE = 0.85
+# Repairs scoring below this share of the reference fall back to a full solve
+REPAIR_QUALITY_THRESHOLD = 0.95
+
+
+def normalise_item(item):
+    """Fills in the constraint fields a box spec may leave out (idempotent)."""
+    if item.get("normalised"):
+        return item
+    box_type = str(item.get("type", "")).upper()
+    crush = item.get("crush_limit") or DEFAULT_CRUSH_LIMITS.get(box_type, DEFAULT_CRUSH_LIMIT)
+    fragile = bool(item.get("fragile", False))
+    stackable = bool(item.get("stacking", True))
+    if fragile:
+        crush *= FRAGILE_CRUSH_FACTOR
+    if not stackable:
+        crush = 0
+    return {
+        "name": item.get("name", item.get("type", "Box")),
+        "type": item.get("type", ""),
+        "dimensions": tuple(item["dimensions"]),
+        "weight": float(item.get("weight", item.get("payload", 0)) or 0),
+        "quantity": int(item.get("quantity", 1)),
+        "fragile": fragile,
+        "stacking": stackable,
+        "upright": bool(item.get("upright", False)),
+        "crush_limit": float(crush),
+        "stop": int(item.get("stop", 1) or 1),
+        "normalised": True,
+    }
+
+
+def item_orientations(item):
+    """(l, w, h) placements the box may take in the truck."""
+    return allowed_orientations(item["dimensions"], ["height-standing"] if item["upright"] else None)
+
+
+@dataclass
+class PlacementPlan:
+    """Positions of every loaded box plus the column state needed to extend it."""
+
+    truck: dict
+    items: list
+    apply_payload: bool = True
+    placements: list = field(default_factory=list)  # dicts: item, column, x, y, z, dims, weight
+    unplaced: dict = field(default_factory=dict)     # item index -> count that did not fit
+    total_weight: float = 0.0
+    state: object = field(default=None, repr=False, compare=False)
+    fill_reference: float = DEFAULT_FILL_REFERENCE
+    solve_mode: str = "full"      # "full" or "repair"
+    quality: float = 1.0
+
+    def counts(self):
+        loaded = [0] * len(self.items)
+        for p in self.placements:
+            loaded[p["item"]] += 1
+        return loaded
+
+    def stop_counts(self):
+        """Boxes loaded for each drop stop, in stop order."""
+        loaded = {}
+        for p in self.placements:
+            stop = self.items[p["item"]]["stop"]
+            loaded[stop] = loaded.get(stop, 0) + 1
+        return dict(sorted(loaded.items()))
+
+    def max_stack(self):
+        """Boxes in the tallest column (0 for an empty plan)."""
+        heights = {}
+        for p in self.placements:
+            heights[p["column"]] = heights.get(p["column"], 0) + 1
+        return max(heights.values(), default=0)
+
+    def summary(self):
+        t_len, t_wid, t_hei = self.truck["dimensions"]
+        truck_volume = t_len * t_wid * t_hei / 1e9
+        used_volume = sum(p["dims"][0] * p["dims"][1] * p["dims"][2] for p in self.placements) / 1e9
+        bound = self.bound()
+        return {
+            "truck_name": self.truck["name"],
+            "truck_dimensions": self.truck["dimensions"],
+            "truck_volume": round(truck_volume, 2),
+            "payload": self.truck["payload"],
+            "boxes_per_truck": len(self.placements),
+            "loaded_per_item": self.counts(),
+            "loaded_per_stop": self.stop_counts(),
+            "max_stack": self.max_stack(),
+            "rehandles": rehandles(self),
+            "unplaced": dict(self.unplaced),
+            "total_weight": round(self.total_weight, 1),
+            "utilisation_percent": round(used_volume / truck_volume * 100, 1) if truck_volume else 0,
+            "payload_percent": round(self.total_weight / self.truck["payload"] * 100, 1) if self.truck["payload"] else 0,
+            "utilisation_bound_percent": round(bound * 100, 1),
+            "gap_percent": gap_percent(used_volume / truck_volume, bound) if truck_volume else 0,
+            "solve_mode": self.solve_mode,
+            "quality": round(self.quality, 3),
+        }
+
+    def bound(self):
+        """Volume share no plan for these items can exceed (volume, payload and Barnes bounds)."""
+        return utilisation_bound(self.truck, self.items, self.apply_payload)["bound"]
+
+
+class _Columns:
+    """Per-column stack state as parallel arrays, so feasibility checks are vectorised."""
+
+    def __init__(self, capacity=64):
+        self.n = 0
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.length = np.zeros(capacity)     # footprint of the base box
+        self.width = np.zeros(capacity)
+        self.height = np.zeros(capacity)     # used height
+        self.load_cap = np.zeros(capacity)   # extra load the stack can still take
+        self.top_weight = np.zeros(capacity)
+        self.top_fragile = np.zeros(capacity, dtype=bool)
+        self.top_stop = np.zeros(capacity, dtype=np.int64)  # drop stop of the top box
+        self.top_length = np.zeros(capacity)  # footprint of the top box, which carries the next one
+        self.top_width = np.zeros(capacity)
+        self.open = np.zeros(capacity, dtype=bool)  # False once a non-stackable box tops the column
+
+    def _grow(self):
+        for name in ("x", "y", "length", "width", "height", "load_cap", "top_weight", "top_fragile", "top_stop",
+                     "top_length", "top_width", "open"):
+            arr = getattr(self, name)
+            setattr(self, name, np.concatenate([arr, np.zeros_like(arr)]))
+
+    def add(self, x, y, length, width):
+        if self.n == len(self.x):
+            self._grow()
+        i = self.n
+        self.x[i], self.y[i], self.length[i], self.width[i] = x, y, length, width
+        self.height[i] = 0
+        self.load_cap[i] = np.inf
+        self.top_weight[i] = np.inf
+        self.top_fragile[i] = False
+        self.top_stop[i] = np.iinfo(np.int64).max
+        self.top_length[i], self.top_width[i] = length, width
+        self.open[i] = True
+        self.n += 1
+        return i
+
+    def feasible(self, dims, weight, truck_height, stop=1, limits=None):
+        """Mask of columns that can take a box of `dims` on top, checked incrementally."""
+        n = self.n
+        l, w, h = dims
+        # Fully supported by the box below, never overhanging it
+        mask = (self.top_length[:n] >= l) & (self.top_width[:n] >= w)
+        mask &= self.height[:n] + h <= truck_height
+        # A spent crush limit stops even weightless boxes
+        mask &= self.open[:n] & (self.load_cap[:n] > 0) & (self.load_cap[:n] >= weight)
+        # Nothing heavier than a fragile box may sit on it
+        mask &= ~self.top_fragile[:n] | (self.top_weight[:n] >= weight)
+        # Boxes for later drops never go on top of earlier ones
+        mask &= self.top_stop[:n] >= stop
+        if limits is not None:
+            lo, hi = limits
+            mask &= (self.x[:n] + l > lo) & (self.x[:n] < hi)
+        return mask
+
+    def push(self, i, dims, weight, crush_limit, fragile, stop=1, stacking=True):
+        self.height[i] += dims[2]
+        self.load_cap[i] = min(self.load_cap[i] - weight, crush_limit)
+        self.top_weight[i] = weight
+        self.top_fragile[i] = fragile
+        self.top_stop[i] = stop
+        self.top_length[i], self.top_width[i] = dims[0], dims[1]
+        self.open[i] &= bool(stacking)
+
+
+class _StopFrontier:
+    """Per-drop extent of the load along the truck, for LIFO reachability.
+
+    The door is at x = truck length. A box for stop s stays reachable when no
+    box for a later stop lies wholly between it and the door, so every box
+    must end beyond the starts of later-stop boxes and start before the ends
+    of earlier-stop boxes. Both limits come from per-stop extremes in O(stops).
+    """
+
+    def __init__(self):
+        self.max_start = {}  # stop -> furthest x at which one of its boxes starts
+        self.min_end = {}    # stop -> nearest x at which one of its boxes ends
+
+    def limits(self, stop):
+        """(lo, hi): a box for `stop` must end after lo and start before hi; None if unconstrained."""
+        if not self.max_start or self.max_start.keys() == {stop}:
+            return None
+        lo = max((x for s, x in self.max_start.items() if s > stop), default=-np.inf)
+        hi = min((x for s, x in self.min_end.items() if s < stop), default=np.inf)
+        return lo, hi
+
+    def add(self, stop, x, length):
+        self.max_start[stop] = max(self.max_start.get(stop, -np.inf), x)
+        self.min_end[stop] = min(self.min_end.get(stop, np.inf), x + length)
+
+
+class _Floor:
+    """Shelf packing of column footprints on the truck floor (x = length, y = width)."""
+
+    def __init__(self, truck_length, truck_width):
+        self.truck_length = truck_length
+        self.truck_width = truck_width
+        self.shelf_x = 0.0
+        self.shelf_depth = 0.0
+        self.shelf_y = 0.0
+
+    def place(self, length, width, limits=None):
+        """Returns (x, y) for a new footprint, or None when the floor is full.
+
+        `limits` (lo, hi) rejects footprints that would not end after lo and
+        start before hi (drop-stop reachability).
+        """
+        if width > self.truck_width:
+            return None
+        in_shelf = self.shelf_depth and length <= self.shelf_depth and self.shelf_y + width <= self.truck_width
+        if in_shelf and (limits is None or self.shelf_x + length > limits[0] and self.shelf_x < limits[1]):
+            pos = (self.shelf_x, self.shelf_y)
+            self.shelf_y += width
+            return pos
+        next_x = self.shelf_x + self.shelf_depth
+        if next_x + length > self.truck_length:
+            return None
+        if limits is not None and not (next_x + length > limits[0] and next_x < limits[1]):
+            return None
+        self.shelf_x, self.shelf_depth, self.shelf_y = next_x, length, width
+        return (next_x, 0.0)
+
+
+def _column_density(dims, truck_dims, stackable):
+    """Boxes per mm of truck length when a whole shelf uses this orientation."""
+    l, w, h = dims
+    per_shelf = (truck_dims[1] // w) * ((truck_dims[2] // h) if stackable else 1)
+    return per_shelf / l
+
+
+def load_order(items, counts=None):
+    """Last drop first (deepest), then strong/heavy boxes low, fragile and non-stackable ones last."""
+    order = []
+    for idx, item in enumerate(items):
+        order.extend([idx] * (item["quantity"] if counts is None else counts[idx]))
+    return sorted(
+        order,
+        key=lambda i: (-items[i]["stop"], items[i]["fragile"], not items[i]["stacking"],
+                       -items[i]["weight"], -items[i]["dimensions"][0] * items[i]["dimensions"][1], i),
+    )
+
+
+def pack(truck, items, apply_payload=True, deadline=None, order=None, prefer=None):
+    """Constraint-aware column packing of mixed box types into one truck.
+
+    Honours orientation (upright boxes), stacking, fragility, per-box crush
+    limits and drop-stop order (LIFO from the rear door) while placing, so
+    infeasible placements are never generated.
+    `order` (item indices, one per box) and `prefer` ({item index: (l, w, h)}
+    tried first when opening a column) override the default heuristics.
+    """
+    items = [normalise_item(it) for it in items]
+    plan = PlacementPlan(truck=truck, items=items, apply_payload=apply_payload)
+    state = _PackState(truck)
+    _fill(plan, state, load_order(items) if order is None else order, deadline, prefer)
+    plan.state = state
+    if plan.unplaced:
+        # The truck filled up: remember how full a from-scratch solve gets it
+        t_len, t_wid, t_hei = truck["dimensions"]
+        plan.fill_reference = _loaded_volume(plan) / (t_len * t_wid * t_hei)
+    return plan
+
+
+class _PackState:
+    def __init__(self, truck):
+        self.truck_dims = truck["dimensions"]
+        self.columns = _Columns()
+        self.floor = _Floor(self.truck_dims[0], self.truck_dims[1])
+        self.stack_of = []  # column -> list of placement indices, bottom to top
+        self.stops = _StopFrontier()
+
+
+def _fill(plan, state, order, deadline=None, prefer=None):
+    """Places boxes in `order` onto the plan."""
+    items = plan.items
+    truck = plan.truck
+    payload_left = truck["payload"] - plan.total_weight if plan.apply_payload else np.inf
+    dead_types = set()  # item types that can no longer be placed anywhere
+    orientations = {i: item_orientations(items[i]) for i in set(order)}
+    t_hei = state.truck_dims[2]
+    cols = state.columns
+
+    for n, idx in enumerate(order):
+        if deadline and n % 64 == 0 and time.monotonic() > deadline:
+            # Out of time: everything not placed yet stays unplaced
+            for rest in order[n:]:
+                plan.unplaced[int(rest)] = plan.unplaced.get(int(rest), 0) + 1
+            break
+        item = items[idx]
+        if idx in dead_types or item["weight"] > payload_left:
+            plan.unplaced[idx] = plan.unplaced.get(idx, 0) + 1
+            continue
+
+        best = None
+        limits = state.stops.limits(item["stop"])
+        if cols.n:
+            for dims in orientations[idx]:
+                mask = cols.feasible(dims, item["weight"], t_hei, item["stop"], limits)
+                if not mask.any():
+                    continue
+                cand = np.flatnonzero(mask)
+                # Best fit: least unsupported footprint, then lowest stack
+                waste = cols.top_length[cand] * cols.top_width[cand] - dims[0] * dims[1]
+                j = cand[np.lexsort((cols.height[cand], waste))[0]]
+                score = (waste[cand == j][0], cols.height[j])
+                if best is None or score < best[0]:
+                    best = (score, j, dims)
+
+        if best is not None:
+            _, col, dims = best
+        else:
+            col, dims = _open_column(state, item, orientations[idx], t_hei, (prefer or {}).get(idx), limits)
+            if col is None:
+                dead_types.add(idx)
+                plan.unplaced[idx] = plan.unplaced.get(idx, 0) + 1
+                continue
+
+        z = cols.height[col]
+        cols.push(col, dims, item["weight"], item["crush_limit"], item["fragile"], item["stop"], item["stacking"])
+        state.stops.add(item["stop"], float(cols.x[col]), dims[0])
+        plan.placements.append({
+            "item": idx, "column": int(col),
+            "x": float(cols.x[col]), "y": float(cols.y[col]), "z": float(z),
+            "dims": dims, "weight": item["weight"],
+        })
+        state.stack_of[col].append(len(plan.placements) - 1)
+        plan.total_weight += item["weight"]
+        payload_left -= item["weight"]
+
+
+def _open_column(state, item, orientations, truck_height, preferred=None, limits=None):
+    stackable = item["stacking"]
+    ranked = sorted(
+        (d for d in orientations if d[2] <= truck_height),
+        key=lambda d: (d != preferred, -_column_density(d, state.truck_dims, stackable), d[2]),
+    )
+    for dims in ranked:
+        pos = state.floor.place(dims[0], dims[1], limits)
+        if pos is not None:
+            col = state.columns.add(pos[0], pos[1], dims[0], dims[1])
+            state.stack_of.append([])
+            return col, dims
+    return None, None
+
+
+def rehandles(plan):
+    """Boxes that a box for a later stop blocks, from above or from the door side."""
+    if len(plan.placements) < 2 or len({it["stop"] for it in plan.items}) < 2:
+        return 0
+    stop = np.array([plan.items[p["item"]]["stop"] for p in plan.placements])
+    column = np.array([p["column"] for p in plan.placements])
+    x = np.array([p["x"] for p in plan.placements])
+    z = np.array([p["z"] for p in plan.placements])
+    end = x + np.array([p["dims"][0] for p in plan.placements])
+    later = stop[None, :] > stop[:, None]  # [b, c]: c is dropped after b
+    above = (column[None, :] == column[:, None]) & (z[None, :] > z[:, None])
+    in_front = x[None, :] >= end[:, None]
+    return int((later & (above | in_front)).any(axis=1).sum())
+
+
+# ----------------------------------------------------
+# Warm-start repair
+# ----------------------------------------------------
+def _loaded_volume(plan):
+    return float(sum(p["dims"][0] * p["dims"][1] * p["dims"][2] for p in plan.placements))
+
+
+def _same_item(a, b):
+    keys = ("dimensions", "weight", "fragile", "stacking", "upright", "crush_limit", "stop")
+    return all(a[k] == b[k] for k in keys)
+
+
+def _rebuild_state(truck, placements, items):
+    """Column arrays and floor shelves replayed from surviving placements.
+
+    Stacks must be intact from the floor up (see `_drop_unsupported`), so every
+    box keeps the support and neighbours the original solve checked.
+    """
+    state = _PackState(truck)
+    cols = state.columns
+    by_column = {}
+    for i, p in enumerate(placements):
+        by_column.setdefault(p["column"], []).append(i)
+
+    for old_col in sorted(by_column, key=lambda c: (placements[by_column[c][0]]["x"], placements[by_column[c][0]]["y"])):
+        stack = sorted(by_column[old_col], key=lambda i: placements[i]["z"])
+        base = placements[stack[0]]
+        col = cols.add(base["x"], base["y"], base["dims"][0], base["dims"][1])
+        state.stack_of.append([])
+        for i in stack:
+            p = placements[i]
+            item = items[p["item"]]
+            cols.push(col, p["dims"], item["weight"], item["crush_limit"], item["fragile"], item["stop"],
+                      item["stacking"])
+            state.stops.add(item["stop"], base["x"], p["dims"][0])
+            p["column"] = col
+            p["z"] = float(cols.height[col] - p["dims"][2])
+            state.stack_of[col].append(i)
+
+    # Continue filling the floor after the last shelf still in use
+    if cols.n:
+        last_x = float(cols.x[:cols.n].max())
+        in_shelf = cols.x[:cols.n] == last_x
+        state.floor.shelf_x = last_x
+        state.floor.shelf_depth = float(cols.length[:cols.n][in_shelf].max())
+        state.floor.shelf_y = float((cols.y[:cols.n] + cols.width[:cols.n])[in_shelf].max())
+    return state
+
+
+def _pop_tops(placements, keep, predicate):
+    """Removes boxes from stack tops while `predicate(placement)` asks for it."""
+    stacks = {}
+    for i in sorted((i for i in range(len(placements)) if keep[i]), key=lambda i: placements[i]["z"]):
+        stacks.setdefault(placements[i]["column"], []).append(i)
+    changed = True
+    while changed:
+        changed = False
+        for stack in stacks.values():
+            while stack and predicate(placements[stack[-1]]):
+                keep[stack.pop()] = False
+                changed = True
+
+
+def _drop_unsupported(placements, keep):
+    """Takes off every box above a removed one; they are refilled through the normal feasibility checks."""
+    stacks = {}
+    for i in sorted(range(len(placements)), key=lambda i: placements[i]["z"]):
+        stacks.setdefault(placements[i]["column"], []).append(i)
+    for stack in stacks.values():
+        gone = False
+        for i in stack:
+            gone = gone or not keep[i]
+            keep[i] = keep[i] and not gone
+
+
+def repack(previous, truck=None, items=None, apply_payload=None, deadline=None,
+           quality_threshold=REPAIR_QUALITY_THRESHOLD):
+    """Repairs `previous` for new quantities, payload toggle or truck.
+
+    Surplus boxes are taken off stack tops (buried ones together with the
+    boxes on them), the payload is re-checked and the freed space refilled.
+    Falls back to a full solve when the repair reaches less than
+    `quality_threshold` of what a full solve is expected to load.
+    """
+    truck = truck or previous.truck
+    apply_payload = previous.apply_payload if apply_payload is None else apply_payload
+    items = [normalise_item(it) for it in (items if items is not None else previous.items)]
+    t_len, t_wid, t_hei = truck["dimensions"]
+
+    # Old placements survive only for unchanged box types that still fit the truck
+    placements = [dict(p) for p in previous.placements]
+    keep = [
+        p["item"] < len(items) and _same_item(items[p["item"]], previous.items[p["item"]])
+        and p["x"] + p["dims"][0] <= t_len and p["y"] + p["dims"][1] <= t_wid
+        for p in placements
+    ]
+    _drop_unsupported(placements, keep)
+
+    # Over height after a truck change: trim stack tops
+    _pop_tops(placements, keep, lambda p: p["z"] + p["dims"][2] > t_hei)
+
+    # Fewer boxes requested: unload surplus from the tops
+    loaded = [0] * len(items)
+    for i, p in enumerate(placements):
+        if keep[i]:
+            loaded[p["item"]] += 1
+
+    def surplus(p):
+        if loaded[p["item"]] > items[p["item"]]["quantity"]:
+            loaded[p["item"]] -= 1
+            return True
+        return False
+    _pop_tops(placements, keep, surplus)
+
+    # Surplus buried under other types: unload it, highest first, with everything stacked on it
+    for i in sorted(range(len(placements)), key=lambda i: -placements[i]["z"]):
+        if keep[i] and loaded[placements[i]["item"]] > items[placements[i]["item"]]["quantity"]:
+            keep[i] = False
+            loaded[placements[i]["item"]] -= 1
+    _drop_unsupported(placements, keep)
+    loaded = [0] * len(items)
+    for i, p in enumerate(placements):
+        if keep[i]:
+            loaded[p["item"]] += 1
+
+    # Payload switched on or reduced: unload until within the limit
+    weight = sum(p["weight"] for i, p in enumerate(placements) if keep[i])
+
+    def overweight(p):
+        nonlocal weight
+        if apply_payload and weight > truck["payload"]:
+            weight -= p["weight"]
+            loaded[p["item"]] -= 1
+            return True
+        return False
+    _pop_tops(placements, keep, overweight)
+
+    # Boxes buried under surplus ones may have come off with them
+    _drop_unsupported(placements, keep)
+    placements = [p for i, p in enumerate(placements) if keep[i]]
+    loaded = [0] * len(items)
+    for p in placements:
+        loaded[p["item"]] += 1
+
+    plan = PlacementPlan(truck=truck, items=items, apply_payload=apply_payload,
+                         fill_reference=previous.fill_reference, solve_mode="repair")
+    plan.state = _rebuild_state(truck, placements, items)
+    plan.placements = placements
+    plan.total_weight = float(sum(p["weight"] for p in placements))
+
+    # Refill freed space with whatever is still missing
+    missing = [max(0, it["quantity"] - n) for it, n in zip(items, loaded)]
+    _fill(plan, plan.state, load_order(items, missing), deadline)
+    plan.quality = _repair_quality(plan)
+
+    if plan.quality < quality_threshold:
+        full = pack(truck, items, apply_payload, deadline)
+        full.quality = _repair_quality(full)
+        if _loaded_volume(full) >= _loaded_volume(plan):
+            return full
+    return plan
+
+
+def _repair_quality(plan):
+    """Loaded share of what a full solve is expected to reach, by volume or by weight."""
+    t_len, t_wid, t_hei = plan.truck["dimensions"]
+    requested_volume = sum(it["quantity"] * it["dimensions"][0] * it["dimensions"][1] * it["dimensions"][2]
+                           for it in plan.items)
+    requested_weight = sum(it["quantity"] * it["weight"] for it in plan.items)
+
+    reference_volume = min(requested_volume, t_len * t_wid * t_hei * plan.fill_reference)
+    quality = _loaded_volume(plan) / reference_volume if reference_volume else 1.0
+    if plan.apply_payload and requested_weight > plan.truck["payload"]:
+        quality = max(quality, plan.total_weight / plan.truck["payload"])
+    return min(1.0, quality)
@@ -0,0 +1,133 @@
+# packing.py
+
+import itertools
+
+from bounds import box_count_bound, gap_percent
+from capacity import lookup as capacity_lookup
+
+# -----------------------------
+# Truck catalog
+# -----------------------------
+TRUCKS = [
+    {"name": "32 ft. Single Axle", "dimensions": (9750, 2440, 2440), "payload": 16000},
+    {"name": "32 ft. Multi Axle", "dimensions": (9750, 2440, 2440), "payload": 21000},
+    {"name": "22 ft. Truck", "dimensions": (7300, 2440, 2440), "payload": 10000},
+]
+
+# Index of the part dimension that stands vertical for each orientation label
+STANDING_AXIS = {"length-standing": 0, "width-standing": 1, "height-standing": 2}
+
+
+def allowed_orientations(dims, orientation=None):
+    """Returns the distinct (l, w, h) placements of `dims`.
+
+    `orientation` is the list of permitted standing labels from the Inputs page
+    (e.g. ["Height-standing"]); empty or None means any face may stand.
+    """
+    labels = [o.lower() for o in (orientation or []) if o.lower() in STANDING_AXIS]
+    if not labels:
+        return sorted(set(itertools.permutations(dims, 3)))
+
+    placements = set()
+    for label in labels:
+        up = STANDING_AXIS[label]
+        a, b = [d for i, d in enumerate(dims) if i != up]
+        placements.add((a, b, dims[up]))
+        placements.add((b, a, dims[up]))
+    return sorted(placements)
+
+
+def uniform_fit(container_dims, item_dims, orientations=None):
+    """Best single-orientation grid of items in a container.
+
+    Returns (count, dims_used, (fit_l, fit_w, fit_h)); count is 0 when nothing fits.
+    """
+    c_len, c_wid, c_hei = container_dims
+    best = (0, None, (0, 0, 0))
+    for dims in allowed_orientations(item_dims, orientations):
+        fit = (int(c_len // dims[0]), int(c_wid // dims[1]), int(c_hei // dims[2]))
+        count = fit[0] * fit[1] * fit[2]
+        if count > best[0]:
+            best = (count, dims, fit)
+    return best
+
+
+# -----------------------------
+# Truck optimisation
+# -----------------------------
+def calculate_optimisation(truck, box, apply_payload=True):
+    """Best uniform-orientation loading of one box type into one truck."""
+    truck_len, truck_wid, truck_hei = truck["dimensions"]
+    box_len, box_wid, box_hei = box["dimensions"]
+    box_weight = float(box.get("weight", box.get("payload", 0)) or 0)
+
+    best_result = None
+
+    # No arrangement of this box can beat the reduced-dimension (and payload) bound
+    truck_volume = (truck_len * truck_wid * truck_hei) / 1e9  # m³
+    count_bound = box_count_bound(truck["dimensions"], box["dimensions"], box_weight,
+                                  truck["payload"] if apply_payload else None)
+    bound_percent = count_bound * (box_len * box_wid * box_hei) / 1e9 / truck_volume * 100 if truck_volume > 0 else 0
+
+    # Precomputed table answers on-grid boxes with the best orientation directly
+    tabulated = capacity_lookup(truck["dimensions"], box["dimensions"])
+    if tabulated is not None:
+        orientations = [tabulated[1]]
+    else:
+        # Try all 6 orientations
+        orientations = set(itertools.permutations([box_len, box_wid, box_hei], 3))
+
+    for dims in orientations:
+        b_len, b_wid, b_hei = dims
+
+        # Fit counts along each axis
+        fit_len = int(truck_len // b_len)
+        fit_wid = int(truck_wid // b_wid)
+        fit_hei = int(truck_hei // b_hei)
+        boxes_by_space = fit_len * fit_wid * fit_hei
+
+        if boxes_by_space <= 0:
+            continue
+
+        # Payload limit: whichever is smaller
+        max_boxes_by_weight = int(truck["payload"] // box_weight) if box_weight > 0 else None
+        if apply_payload and max_boxes_by_weight is not None:
+            total_boxes = min(boxes_by_space, max_boxes_by_weight)
+        else:
+            total_boxes = boxes_by_space
+
+        # Volume utilisation
+        box_volume = (b_len * b_wid * b_hei) / 1e9  # m³
+        utilised_volume = total_boxes * box_volume
+        utilisation_percent = (utilised_volume / truck_volume) * 100 if truck_volume > 0 else 0
+
+        # Space utilisation (% of boxes that fit by space actually loaded)
+        utilisation_by_space = (total_boxes / boxes_by_space) * 100
+
+        result = {
+            "truck_name": truck["name"],
+            "truck_dimensions": truck["dimensions"],
+            "truck_volume": round(truck_volume, 2),
+            "payload": truck["payload"],
+            "box_name": box.get("name", box.get("type", "Outer Box")),
+            "box_dims_used": dims,
+            "box_volume": round(box_volume, 3),
+            "box_weight": box_weight,
+            "boxes_by_space": boxes_by_space,
+            "max_boxes_by_weight": max_boxes_by_weight,
+            "boxes_per_truck": total_boxes,
+            "utilisation_percent": round(utilisation_percent, 1),
+            "utilisation_by_space": round(utilisation_by_space, 1),
+            "boxes_bound": count_bound,
+            "utilisation_bound_percent": round(bound_percent, 1),
+            "gap_percent": gap_percent(utilisation_percent, bound_percent),
+            "orientation": (fit_len, fit_wid, fit_hei),
+        }
+
+        if best_result is None or result["utilisation_percent"] > best_result["utilisation_percent"]:
+            best_result = result
+            if total_boxes >= count_bound:
+                # Provably optimal; the other orientations cannot do better
+                break
+
+    return best_result
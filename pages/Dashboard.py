@@ -0,0 +1,123 @@
+import streamlit as st
+import pandas as pd
+import altair as alt
+import datetime
+import sys, os
+
+# 🔧 Add parent directory to path for module imports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from aggregates import get_aggregates
+
+st.set_page_config(page_title="📊 Fleet Utilisation", layout="wide")
+st.title("📊 Fleet Utilisation")
+st.caption("Utilisation, trucks needed and payload vs volume limits across every evaluated part and truck. "
+           "Saved truck plans and merged batch runs update these figures as they land.")
+
+
+@st.cache_data(show_spinner=False, ttl=30)
+def load_snapshot():
+    snapshot = get_aggregates().snapshot()
+    return pd.DataFrame(snapshot["stats"]), pd.DataFrame(snapshot["histogram"]), snapshot
+
+
+def weighted(frame, by, column):
+    """Pair-weighted mean of a per-group mean column."""
+    total = frame.assign(_w=frame[column] * frame["pairs"]).groupby(by)[["_w", "pairs"]].sum()
+    return (total["_w"] / total["pairs"]).rename(column).reset_index()
+
+
+def heatmap(frame, x, y, value, title, fmt):
+    base = alt.Chart(frame).encode(x=alt.X(f"{x}:N", title=None), y=alt.Y(f"{y}:N", title=None))
+    cells = base.mark_rect().encode(color=alt.Color(f"{value}:Q", title=title, scale=alt.Scale(scheme="viridis")),
+                                    tooltip=[x, y, alt.Tooltip(f"{value}:Q", format=fmt), "pairs"])
+    labels = base.mark_text(fontSize=11).encode(text=alt.Text(f"{value}:Q", format=fmt),
+                                                color=alt.value("white"))
+    return (cells + labels).properties(height=max(160, 28 * frame[y].nunique()))
+
+
+stats, hist, snapshot = load_snapshot()
+if stats.empty:
+    st.info("No evaluated pairs yet. Optimise a truck plan or merge a batch run to fill the dashboard.")
+    st.stop()
+
+# -------------------------------
+# Filters
+# -------------------------------
+col1, col2 = st.columns(2)
+families = col1.multiselect("Box families", sorted(stats["family"].unique()))
+lanes = col2.multiselect("Lanes", sorted(stats["lane"].unique()))
+if families:
+    stats = stats[stats["family"].isin(families)]
+if lanes:
+    stats = stats[stats["lane"].isin(lanes)]
+if stats.empty:
+    st.warning("⚠ No pairs match these filters.")
+    st.stop()
+
+fitted = stats["pairs"] - stats["no_fit"]
+col1, col2, col3, col4 = st.columns(4)
+col1.metric("Evaluated pairs", f"{int(stats['pairs'].sum()):,}")
+col2.metric("Mean utilisation", f"{(stats['utilisation_sum'].sum() / stats['pairs'].sum()):.1f}%")
+col3.metric("Payload-bound", f"{(stats['payload_bound'].sum() / max(1, fitted.sum())) * 100:.0f}%")
+col4.metric("Results folded in", f"{snapshot['sources']:,}")
+if snapshot["updated"]:
+    st.caption(f"Last update {datetime.datetime.fromtimestamp(snapshot['updated']):%Y-%m-%d %H:%M}")
+
+# -------------------------------
+# 1️⃣ Utilisation heatmaps
+# -------------------------------
+st.subheader("1️⃣ Mean utilisation")
+by_family = weighted(stats, ["truck", "family"], "mean_utilisation") \
+    .merge(stats.groupby(["truck", "family"])["pairs"].sum().reset_index())
+st.altair_chart(heatmap(by_family, "truck", "family", "mean_utilisation", "Utilisation (%)", ".1f"),
+                use_container_width=True)
+
+st.subheader("2️⃣ Trucks needed per lane")
+st.caption("Summed over parts with a known quantity.")
+by_lane = stats.groupby(["truck", "lane"])[["trucks_needed", "pairs"]].sum().reset_index()
+st.altair_chart(heatmap(by_lane, "truck", "lane", "trucks_needed", "Trucks", ",.0f"), use_container_width=True)
+
+# -------------------------------
+# 3️⃣ Distributions
+# -------------------------------
+st.subheader("3️⃣ Utilisation distribution")
+if families or lanes:
+    st.caption("The distribution covers every family and lane; the histogram is kept per truck only.")
+if not hist.empty:
+    st.altair_chart(
+        alt.Chart(hist).mark_bar().encode(
+            x=alt.X("from_percent:O", title="Utilisation from (%)"),
+            y=alt.Y("pairs:Q", title="Pairs"),
+            color=alt.Color("truck:N", title="Truck"),
+            xOffset="truck:N",
+            tooltip=["truck", "from_percent", "pairs"],
+        ),
+        use_container_width=True,
+    )
+
+st.subheader("4️⃣ What limits each truck")
+binding = stats.groupby("truck")[["payload_bound", "volume_bound", "no_fit"]].sum().reset_index() \
+    .rename(columns={"payload_bound": "Payload", "volume_bound": "Volume", "no_fit": "Does not fit"}) \
+    .melt("truck", var_name="Limit", value_name="pairs")
+st.altair_chart(
+    alt.Chart(binding).mark_bar().encode(
+        x=alt.X("pairs:Q", stack="normalize", title="Share of pairs", axis=alt.Axis(format="%")),
+        y=alt.Y("truck:N", title=None),
+        color=alt.Color("Limit:N", scale=alt.Scale(domain=["Volume", "Payload", "Does not fit"],
+                                                     range=["#4c9f70", "#e0a800", "#c0392b"])),
+        tooltip=["truck", "Limit", "pairs"],
+    ),
+    use_container_width=True,
+)
+
+with st.expander("📋 Aggregates by truck, family and lane"):
+    st.dataframe(
+        stats[["truck", "family", "lane", "pairs", "mean_utilisation", "std_utilisation", "trucks_needed",
+               "payload_share", "no_fit"]].sort_values(["truck", "family", "lane"]).round(2),
+        use_container_width=True, hide_index=True,
+    )
+
+if st.button("🧹 Reset the dashboard figures"):
+    get_aggregates().reset()
+    load_snapshot.clear()
+    st.rerun()
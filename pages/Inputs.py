@@ -1,12 +1,29 @@
 
 import streamlit as st
+import os
 from llm_recommender import LLMRecommender
+from box_library import get_box_library, ties, to_recommendation
+from pipeline import start_prefetch
+import prefetch
+from results_store import get_results_store
+from geometry import Box, Part
+from mesh import DEFAULT_DENSITY, MESH_UNITS, import_folder, mesh_bounds, part_weight
 
 st.set_page_config(page_title="📦 Packaging Asset Recommender", layout="wide")
 st.title("Step 1️⃣ - Enter Part Details")
 
 llm = LLMRecommender()
 
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def cad_bounds(data, name, unit):
+    return mesh_bounds(data, name=name, unit_mm=MESH_UNITS[unit])
+
+
+# Part fields are keyed so a CAD import can fill them in
+for key, default in (("part_L", 450), ("part_W", 300), ("part_H", 220), ("part_weight", 1.0)):
+    st.session_state.setdefault(key, default)
+
 # -------------------------------
 # Layout: Two columns
 # -------------------------------
@@ -17,10 +34,37 @@ left_col, right_col = st.columns([2, 1], gap="large")
 # -------------------------------
 with left_col:
     st.subheader("Auto Part Details")
-    length = st.number_input("Length (mm)", min_value=10, value=450)
-    width = st.number_input("Width (mm)", min_value=10, value=300)
-    height = st.number_input("Height (mm)", min_value=10, value=220)
-    weight = st.number_input("Weight (kg)", min_value=0.1, value=1.0)
+
+    with st.expander("📐 Import dimensions from CAD (STL / OBJ)"):
+        upload = st.file_uploader("Mesh file", type=["stl", "obj"])
+        col1, col2, col3 = st.columns(3)
+        unit = col1.selectbox("Mesh units", list(MESH_UNITS))
+        fit = col2.radio("Use", ["Oriented box", "Axis-aligned box"],
+                         help="The oriented box is the tightest; the axis-aligned one keeps the CAD orientation.")
+        density = col3.number_input("Density (kg/m³)", min_value=1.0, value=DEFAULT_DENSITY)
+        if upload is not None:
+            try:
+                bounds = cad_bounds(upload.getvalue(), upload.name, unit)
+            except ValueError as e:
+                st.error(str(e))
+            else:
+                dims = bounds["obb"] if fit == "Oriented box" else bounds["aabb"]
+                imported = (upload.name, upload.size, unit, fit, density)
+                # Fill the fields once per import, so manual edits afterwards stick
+                if st.session_state.get("cad_imported") != imported:
+                    st.session_state["cad_imported"] = imported
+                    st.session_state["part_L"], st.session_state["part_W"], st.session_state["part_H"] = (
+                        max(10, d) for d in dims)
+                    weight_kg = part_weight(bounds, density)
+                    if weight_kg:
+                        st.session_state["part_weight"] = max(0.1, weight_kg)
+                st.caption(f"{bounds['triangles']:,} triangles — oriented {bounds['obb']} mm, "
+                           f"axis-aligned {bounds['aabb']} mm")
+
+    length = st.number_input("Length (mm)", min_value=10, key="part_L")
+    width = st.number_input("Width (mm)", min_value=10, key="part_W")
+    height = st.number_input("Height (mm)", min_value=10, key="part_H")
+    weight = st.number_input("Weight (kg)", min_value=0.1, key="part_weight")
     fragile = st.checkbox("Is the product fragile?")
     stacking = st.checkbox("Stacking Allowed?")
 
@@ -36,6 +80,7 @@ with left_col:
     cities = ["Mumbai", "Chennai", "Bangalore", "Delhi", "Kolkata"]
     source_city = st.selectbox("Source City", options=cities)
     destination_city = st.selectbox("Destination City", options=cities)
+    quantity = st.number_input("Annual demand (parts)", min_value=1, value=500, step=100)
 
 # -------------------------------
 # Recommendation & Buttons (RIGHT)
@@ -43,46 +88,79 @@ with left_col:
 with right_col:
     st.subheader("Outer Box Recommendation")
 
+    use_tie_breaker = st.checkbox("🤖 Let AI break ties between equal library boxes")
+
+    product = {
+        "L": float(length),
+        "W": float(width),
+        "H": float(height),
+        "weight": float(weight),
+        "fragile": fragile,
+        "stacking": stacking,
+        "orientation": orientation,
+        "source": source_city,
+        "destination": destination_city,
+        "quantity": int(quantity)
+    }
+    # The box does not depend on the demand, so saved runs match on everything else
+    saved_key = prefetch.fingerprint({k: v for k, v in product.items() if k != "quantity"})
+    saved = get_results_store().load("recommendation", saved_key)
+
+    if saved and st.button(f"📂 Load the saved recommendation from {saved['created']:%d %b %Y, %H:%M}",
+                           use_container_width=True):
+        recommendation = saved["payload"]["recommendation"]
+        st.session_state["product"] = product
+        st.session_state["recommendation"] = recommendation
+        st.session_state["box_candidates"] = []
+        st.session_state["box"] = Box.from_recommendation(recommendation, saved["payload"]["gross_weight"])
+        st.session_state["part"] = Part.from_product(product)
+        start_prefetch(st.session_state, llm)
+        st.success(f"📂 Loaded {recommendation['box']['type']} {recommendation['box']['external']} mm "
+                   "without solving again.")
+
     if st.button("🔍 Generate Recommendation", use_container_width=True):
         if all([length, width, height, weight]):
             with st.spinner("Thinking through optimal packaging..."):
-                recommendation = llm.recommend(
-                    length=length,
-                    width=width,
-                    height=height,
-                    weight=weight,
-                    fragile="High" if fragile else "Low",
-                    stacking=stacking,
-                    orientation=orientation,
-                    forklift=False,
-                    forklift_capacity=0,
-                    quantity=500,
-                    source=source_city,
-                    destination=destination_city
-                )
+                # Standard returnable boxes first; the LLM only designs a box when none fits
+                ranked = get_box_library().top_k(length, width, height, weight, orientation=orientation, k=5)
+
+                if ranked:
+                    best, reason = ranked[0], None
+                    tied = ties(ranked)
+                    if use_tie_breaker and len(tied) > 1:
+                        best, reason = llm.break_tie(length, width, height, weight,
+                                                     "High" if fragile else "Low", tied)
+                    recommendation = to_recommendation(best, reason)
+                    st.session_state["box_candidates"] = ranked
+                else:
+                    recommendation = llm.recommend(
+                        length=length,
+                        width=width,
+                        height=height,
+                        weight=weight,
+                        fragile="High" if fragile else "Low",
+                        stacking=stacking,
+                        orientation=orientation,
+                        forklift=False,
+                        forklift_capacity=0,
+                        quantity=quantity,
+                        source=source_city,
+                        destination=destination_city
+                    )
+                    st.session_state["box_candidates"] = []
 
                 # Save to session
-                st.session_state["product"] = {
-                    "L": float(length),
-                    "W": float(width),
-                    "H": float(height),
-                    "weight": float(weight),
-                    "fragile": fragile,
-                    "stacking": stacking,
-                    "orientation": orientation,
-                    "source": source_city,
-                    "destination": destination_city
-                }
+                st.session_state["product"] = product
                 st.session_state["recommendation"] = recommendation
 
-                # ✅ Fixed: clean dimensions safely
-                internal_dims = llm._clean_dimensions_tuple(recommendation['box']['internal'])
+                # One parse at the LLM boundary; every later page reads the typed Box
+                gross_weight = best["gross_weight"] if ranked else weight
+                st.session_state["box"] = Box.from_recommendation(recommendation, gross_weight)
+                st.session_state["part"] = Part.from_product(st.session_state["product"])
+                get_results_store().save_recommendation(saved_key, product, recommendation, gross_weight)
 
-                st.session_state["user_box"] = {
-                    "name": recommendation['box']['type'],
-                    "dimensions": internal_dims,
-                    "weight": float(weight)
-                }
+                # Start Insert Design / Visualisation / truck scoring while the user reads the card
+                start_prefetch(st.session_state, llm)
 
                 # Styled card for recommendation
                 with st.container(border=True):
@@ -95,6 +173,28 @@ with right_col:
                     """)
                     st.info("💡 Why this recommendation:")
                     st.write(recommendation["reason"])
+                    if recommendation.get("cached"):
+                        matched = recommendation["cached"]["matched_part"]
+                        st.caption(
+                            f"♻️ Reused from a near-identical part "
+                            f"({matched['length']:g}×{matched['width']:g}×{matched['height']:g} mm)"
+                        )
+
+                if len(ranked) > 1:
+                    with st.expander("📚 Other library boxes"):
+                        for c in ranked[1:]:
+                            st.markdown(
+                                f"**{c['box']['id']}** — {c['parts_per_box']} parts/box, "
+                                f"{c['parts_per_truck']} parts/truck ({c['truck']})"
+                            )
+
+    # Similarity cache metrics
+    cache_stats = llm.similarity_cache.metrics()
+    st.caption(
+        f"Similarity cache: {cache_stats['hits']}/{cache_stats['lookups']} hits "
+        f"({cache_stats['hit_rate']:.0%}), {cache_stats['fit_rejections']} fit-check rejections, "
+        f"{cache_stats['entries']} stored"
+    )
 
     # Navigation button
     if st.button("➡️ Go to Insert Design", use_container_width=True):
@@ -103,14 +203,68 @@ with right_col:
         else:
             st.warning("⚠️ Please generate a recommendation first.")
 
+# -------------------------------
+# Catalog import (folder of meshes)
+# -------------------------------
+with st.expander("📁 Import a folder of CAD parts"):
+    col1, col2, col3 = st.columns([3, 1, 1])
+    folder = col1.text_input("Folder on this machine")
+    folder_unit = col2.selectbox("Units", list(MESH_UNITS), key="folder_unit")
+    folder_density = col3.number_input("Density (kg/m³)", min_value=1.0, value=DEFAULT_DENSITY, key="folder_density")
+    if st.button("📥 Import folder") and folder:
+        if not os.path.isdir(folder):
+            st.error(f"❌ Not a folder: {folder}")
+        else:
+            with st.spinner("Reading meshes and ranking library boxes..."):
+                rows = []
+                for b in import_folder(folder, MESH_UNITS[folder_unit], folder_density):
+                    if "error" in b:
+                        st.warning(f"{b['name']}: {b['error']}")
+                        continue
+                    l, w, h = b["obb"]
+                    ranked = get_box_library().top_k(l, w, h, b["weight"] or 0, k=1) if b["weight"] else []
+                    rows.append({
+                        "part": os.path.splitext(b["name"])[0],
+                        "L": l, "W": w, "H": h,
+                        "weight": b["weight"],
+                        "box": ranked[0]["box"]["id"] if ranked else "—",
+                        "parts_per_box": ranked[0]["parts_per_box"] if ranked else None,
+                        "parts_per_truck": ranked[0]["parts_per_truck"] if ranked else None,
+                    })
+            st.session_state["cad_catalog"] = rows
+    catalog = st.session_state.get("cad_catalog")
+    if catalog:
+        st.dataframe(catalog, hide_index=True, use_container_width=True)
+        header = "part,L,W,H,weight"
+        csv = "\n".join([header] + [f"{r['part']},{r['L']},{r['W']},{r['H']},{r['weight'] or ''}" for r in catalog])
+        st.download_button("⬇️ Part catalog (CSV)", csv, file_name="parts.csv", mime="text/csv")
+        st.caption("Add `lane`, `period` and `quantity` columns to plan a year on the Planning page.")
+
 import streamlit as st
+import os
 from llm_recommender import LLMRecommender
+from box_library import get_box_library, ties, to_recommendation
+from pipeline import start_prefetch
+import prefetch
+from results_store import get_results_store
+from geometry import Box, Part
+from mesh import DEFAULT_DENSITY, MESH_UNITS, import_folder, mesh_bounds, part_weight
 
 st.set_page_config(page_title="📦 Packaging Asset Recommender", layout="wide")
 st.title("Step 1️⃣ - Enter Part Details")
 
 llm = LLMRecommender()
 
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def cad_bounds(data, name, unit):
+    return mesh_bounds(data, name=name, unit_mm=MESH_UNITS[unit])
+
+
+# Part fields are keyed so a CAD import can fill them in
+for key, default in (("part_L", 450), ("part_W", 300), ("part_H", 220), ("part_weight", 1.0)):
+    st.session_state.setdefault(key, default)
+
 # -------------------------------
 # Layout: Two columns
 # -------------------------------
@@ -121,10 +275,37 @@ left_col, right_col = st.columns([2, 1], gap="large")
 # -------------------------------
 with left_col:
     st.subheader("Auto Part Details")
-    length = st.number_input("Length (mm)", min_value=10, value=450)
-    width = st.number_input("Width (mm)", min_value=10, value=300)
-    height = st.number_input("Height (mm)", min_value=10, value=220)
-    weight = st.number_input("Weight (kg)", min_value=0.1, value=1.0)
+
+    with st.expander("📐 Import dimensions from CAD (STL / OBJ)"):
+        upload = st.file_uploader("Mesh file", type=["stl", "obj"])
+        col1, col2, col3 = st.columns(3)
+        unit = col1.selectbox("Mesh units", list(MESH_UNITS))
+        fit = col2.radio("Use", ["Oriented box", "Axis-aligned box"],
+                         help="The oriented box is the tightest; the axis-aligned one keeps the CAD orientation.")
+        density = col3.number_input("Density (kg/m³)", min_value=1.0, value=DEFAULT_DENSITY)
+        if upload is not None:
+            try:
+                bounds = cad_bounds(upload.getvalue(), upload.name, unit)
+            except ValueError as e:
+                st.error(str(e))
+            else:
+                dims = bounds["obb"] if fit == "Oriented box" else bounds["aabb"]
+                imported = (upload.name, upload.size, unit, fit, density)
+                # Fill the fields once per import, so manual edits afterwards stick
+                if st.session_state.get("cad_imported") != imported:
+                    st.session_state["cad_imported"] = imported
+                    st.session_state["part_L"], st.session_state["part_W"], st.session_state["part_H"] = (
+                        max(10, d) for d in dims)
+                    weight_kg = part_weight(bounds, density)
+                    if weight_kg:
+                        st.session_state["part_weight"] = max(0.1, weight_kg)
+                st.caption(f"{bounds['triangles']:,} triangles — oriented {bounds['obb']} mm, "
+                           f"axis-aligned {bounds['aabb']} mm")
+
+    length = st.number_input("Length (mm)", min_value=10, key="part_L")
+    width = st.number_input("Width (mm)", min_value=10, key="part_W")
+    height = st.number_input("Height (mm)", min_value=10, key="part_H")
+    weight = st.number_input("Weight (kg)", min_value=0.1, key="part_weight")
     fragile = st.checkbox("Is the product fragile?")
     stacking = st.checkbox("Stacking Allowed?")
 
@@ -140,6 +321,7 @@ with left_col:
     cities = ["Mumbai", "Chennai", "Bangalore", "Delhi", "Kolkata"]
     source_city = st.selectbox("Source City", options=cities)
     destination_city = st.selectbox("Destination City", options=cities)
+    quantity = st.number_input("Annual demand (parts)", min_value=1, value=500, step=100)
 
 # -------------------------------
 # Recommendation & Buttons (RIGHT)
@@ -147,46 +329,79 @@ with left_col:
 with right_col:
     st.subheader("Outer Box Recommendation")
 
+    use_tie_breaker = st.checkbox("🤖 Let AI break ties between equal library boxes")
+
+    product = {
+        "L": float(length),
+        "W": float(width),
+        "H": float(height),
+        "weight": float(weight),
+        "fragile": fragile,
+        "stacking": stacking,
+        "orientation": orientation,
+        "source": source_city,
+        "destination": destination_city,
+        "quantity": int(quantity)
+    }
+    # The box does not depend on the demand, so saved runs match on everything else
+    saved_key = prefetch.fingerprint({k: v for k, v in product.items() if k != "quantity"})
+    saved = get_results_store().load("recommendation", saved_key)
+
+    if saved and st.button(f"📂 Load the saved recommendation from {saved['created']:%d %b %Y, %H:%M}",
+                           use_container_width=True):
+        recommendation = saved["payload"]["recommendation"]
+        st.session_state["product"] = product
+        st.session_state["recommendation"] = recommendation
+        st.session_state["box_candidates"] = []
+        st.session_state["box"] = Box.from_recommendation(recommendation, saved["payload"]["gross_weight"])
+        st.session_state["part"] = Part.from_product(product)
+        start_prefetch(st.session_state, llm)
+        st.success(f"📂 Loaded {recommendation['box']['type']} {recommendation['box']['external']} mm "
+                   "without solving again.")
+
     if st.button("🔍 Generate Recommendation", use_container_width=True):
         if all([length, width, height, weight]):
             with st.spinner("Thinking through optimal packaging..."):
-                recommendation = llm.recommend(
-                    length=length,
-                    width=width,
-                    height=height,
-                    weight=weight,
-                    fragile="High" if fragile else "Low",
-                    stacking=stacking,
-                    orientation=orientation,
-                    forklift=False,
-                    forklift_capacity=0,
-                    quantity=500,
-                    source=source_city,
-                    destination=destination_city
-                )
+                # Standard returnable boxes first; the LLM only designs a box when none fits
+                ranked = get_box_library().top_k(length, width, height, weight, orientation=orientation, k=5)
+
+                if ranked:
+                    best, reason = ranked[0], None
+                    tied = ties(ranked)
+                    if use_tie_breaker and len(tied) > 1:
+                        best, reason = llm.break_tie(length, width, height, weight,
+                                                     "High" if fragile else "Low", tied)
+                    recommendation = to_recommendation(best, reason)
+                    st.session_state["box_candidates"] = ranked
+                else:
+                    recommendation = llm.recommend(
+                        length=length,
+                        width=width,
+                        height=height,
+                        weight=weight,
+                        fragile="High" if fragile else "Low",
+                        stacking=stacking,
+                        orientation=orientation,
+                        forklift=False,
+                        forklift_capacity=0,
+                        quantity=quantity,
+                        source=source_city,
+                        destination=destination_city
+                    )
+                    st.session_state["box_candidates"] = []
 
                 # Save to session
-                st.session_state["product"] = {
-                    "L": float(length),
-                    "W": float(width),
-                    "H": float(height),
-                    "weight": float(weight),
-                    "fragile": fragile,
-                    "stacking": stacking,
-                    "orientation": orientation,
-                    "source": source_city,
-                    "destination": destination_city
-                }
+                st.session_state["product"] = product
                 st.session_state["recommendation"] = recommendation
 
-                # ✅ Fixed: clean dimensions safely
-                internal_dims = llm._clean_dimensions_tuple(recommendation['box']['internal'])
+                # One parse at the LLM boundary; every later page reads the typed Box
+                gross_weight = best["gross_weight"] if ranked else weight
+                st.session_state["box"] = Box.from_recommendation(recommendation, gross_weight)
+                st.session_state["part"] = Part.from_product(st.session_state["product"])
+                get_results_store().save_recommendation(saved_key, product, recommendation, gross_weight)
 
-                st.session_state["user_box"] = {
-                    "name": recommendation['box']['type'],
-                    "dimensions": internal_dims,
-                    "weight": float(weight)
-                }
+                # Start Insert Design / Visualisation / truck scoring while the user reads the card
+                start_prefetch(st.session_state, llm)
 
                 # Styled card for recommendation
                 with st.container(border=True):
@@ -199,6 +414,28 @@ with right_col:
                     """)
                     st.info("💡 Why this recommendation:")
                     st.write(recommendation["reason"])
+                    if recommendation.get("cached"):
+                        matched = recommendation["cached"]["matched_part"]
+                        st.caption(
+                            f"♻️ Reused from a near-identical part "
+                            f"({matched['length']:g}×{matched['width']:g}×{matched['height']:g} mm)"
+                        )
+
+                if len(ranked) > 1:
+                    with st.expander("📚 Other library boxes"):
+                        for c in ranked[1:]:
+                            st.markdown(
+                                f"**{c['box']['id']}** — {c['parts_per_box']} parts/box, "
+                                f"{c['parts_per_truck']} parts/truck ({c['truck']})"
+                            )
+
+    # Similarity cache metrics
+    cache_stats = llm.similarity_cache.metrics()
+    st.caption(
+        f"Similarity cache: {cache_stats['hits']}/{cache_stats['lookups']} hits "
+        f"({cache_stats['hit_rate']:.0%}), {cache_stats['fit_rejections']} fit-check rejections, "
+        f"{cache_stats['entries']} stored"
+    )
 
     # Navigation button
     if st.button("➡️ Go to Insert Design", use_container_width=True):
@@ -207,3 +444,40 @@ with right_col:
         else:
             st.warning("⚠️ Please generate a recommendation first.")
 
+# -------------------------------
+# Catalog import (folder of meshes)
+# -------------------------------
+with st.expander("📁 Import a folder of CAD parts"):
+    col1, col2, col3 = st.columns([3, 1, 1])
+    folder = col1.text_input("Folder on this machine")
+    folder_unit = col2.selectbox("Units", list(MESH_UNITS), key="folder_unit")
+    folder_density = col3.number_input("Density (kg/m³)", min_value=1.0, value=DEFAULT_DENSITY, key="folder_density")
+    if st.button("📥 Import folder") and folder:
+        if not os.path.isdir(folder):
+            st.error(f"❌ Not a folder: {folder}")
+        else:
+            with st.spinner("Reading meshes and ranking library boxes..."):
+                rows = []
+                for b in import_folder(folder, MESH_UNITS[folder_unit], folder_density):
+                    if "error" in b:
+                        st.warning(f"{b['name']}: {b['error']}")
+                        continue
+                    l, w, h = b["obb"]
+                    ranked = get_box_library().top_k(l, w, h, b["weight"] or 0, k=1) if b["weight"] else []
+                    rows.append({
+                        "part": os.path.splitext(b["name"])[0],
+                        "L": l, "W": w, "H": h,
+                        "weight": b["weight"],
+                        "box": ranked[0]["box"]["id"] if ranked else "—",
+                        "parts_per_box": ranked[0]["parts_per_box"] if ranked else None,
+                        "parts_per_truck": ranked[0]["parts_per_truck"] if ranked else None,
+                    })
+            st.session_state["cad_catalog"] = rows
+    catalog = st.session_state.get("cad_catalog")
+    if catalog:
+        st.dataframe(catalog, hide_index=True, use_container_width=True)
+        header = "part,L,W,H,weight"
+        csv = "\n".join([header] + [f"{r['part']},{r['L']},{r['W']},{r['H']},{r['weight'] or ''}" for r in catalog])
+        st.download_button("⬇️ Part catalog (CSV)", csv, file_name="parts.csv", mime="text/csv")
+        st.caption("Add `lane`, `period` and `quantity` columns to plan a year on the Planning page.")
+
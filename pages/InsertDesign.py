@@ -4,44 +4,63 @@ import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from llm_recommender import LLMRecommender
+import prefetch
+from pipeline import allowed_orientation as first_allowed_orientation, feasible_orientations, session_key
+from geometry import Box, Dims
+from nesting import material_report
+from footprint import (FREE_ROTATIONS, HULLS, INTERLOCK_ROTATIONS, footprint_from_mesh, footprint_from_outline,
+                       layout_image)
+from mesh import MESH_UNITS
+from packing import STANDING_AXIS
+from results_store import get_results_store
 
 st.set_page_config(page_title="🧩 InsertDesign", layout="wide")
 st.title("Step 2️⃣ - Insert Design")
 
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def mesh_footprint(data, name, orientation, unit, hull):
+    return footprint_from_mesh(data, name, orientation, MESH_UNITS[unit], hull)
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def outline_footprint(points, height, hull):
+    return footprint_from_outline(points, height, hull=hull)
+
 # -------------------------------
 # 0️⃣ Optional: Default test values
 # -------------------------------
 if "product" not in st.session_state:
     st.session_state["product"] = {"L": 450, "W": 300, "H": 220, "weight": 18}
 
-if "outer_box" not in st.session_state:
-    st.session_state["outer_box"] = {
-        "internal_length": 1120,
-        "internal_width": 920,
-        "internal_height": 580
-    }
+if "box" not in st.session_state:
+    st.session_state["box"] = Box("Outer Box", Dims(1120, 920, 580), Dims(1120, 920, 580), 18.0)
 
 # -------------------------------
 # 1️⃣ Check Step 1 completion
 # -------------------------------
-if "product" not in st.session_state or "outer_box" not in st.session_state:
+if "product" not in st.session_state or "box" not in st.session_state:
     st.warning("⚠️ Please complete Step 1 first.")
     if st.button("⬅️ Go to Step 1"):
         st.switch_page("Step 1️⃣ - Enter Part Details")
     st.stop()  # Stop execution if Step 1 not done
 
 product = st.session_state["product"]
-outer_box = st.session_state["outer_box"]
+box = st.session_state["box"]
 
 llm = LLMRecommender()
+prefetch_key = session_key(st.session_state)
 
 # -------------------------------
 # 2️⃣ Analyze orientations
 # -------------------------------
 with st.spinner("Analyzing optimal orientations..."):
-    orientation_analysis = llm.analyze_orientations(
-        product["L"], product["W"], product["H"], product["weight"]
-    )
+    # Prefetched on Step 1 when the inputs have not changed since
+    orientation_analysis = prefetch.result(st.session_state, "orientation", prefetch_key)
+    if orientation_analysis is None:
+        orientation_analysis = llm.analyze_orientations(
+            product["L"], product["W"], product["H"], product["weight"]
+        )
 
 if not orientation_analysis or "orientations" not in orientation_analysis:
     st.error("⚠️ No orientation analysis returned from LLM.")
@@ -62,22 +81,76 @@ for label, status in orientation_analysis["orientations"].items():
 # -------------------------------
 # 3️⃣ Generate insert design
 # -------------------------------
-allowed_orientation = next(
-    (k for k, v in orientation_analysis["orientations"].items() if v == "✅"),
-    "length-standing"
-)
+allowed_orientation = first_allowed_orientation(orientation_analysis)
+
+with st.expander("🧩 Nested pockets for non-cuboid parts"):
+    st.caption("Shape the pockets to the part footprint and interlock neighbours with alternating rotation, "
+               "instead of one cuboid cell per part.")
+    source = st.radio("Footprint from", ["None", "CAD mesh (STL / OBJ)", "Outline"], horizontal=True)
+    col1, col2, col3 = st.columns(3)
+    hull = col1.radio("Hull", HULLS, format_func=str.title,
+                      help="Concave keeps notches and recesses a neighbour can nest into; convex is the "
+                           "stretched outline.")
+    turns = col2.radio("Rotations", ["Half turns", "Quarter turns"])
+    clearance = col3.number_input("Clearance between parts (mm)", min_value=0, value=0)
+
+    footprint = None
+    if source == "CAD mesh (STL / OBJ)":
+        upload = st.file_uploader("Mesh file", type=["stl", "obj"], key="footprint_mesh")
+        unit = st.selectbox("Mesh units", list(MESH_UNITS), key="footprint_unit")
+        if upload is not None:
+            try:
+                footprint = mesh_footprint(upload.getvalue(), upload.name, allowed_orientation, unit, hull)
+            except ValueError as e:
+                st.error(str(e))
+    elif source == "Outline":
+        outline = st.text_area("Outline points (mm)", "0,0; 250,0; 250,60; 60,60; 60,180; 0,180",
+                               help="x,y pairs in order around the part, separated by semicolons.")
+        part_dims = (product["L"], product["W"], product["H"])
+        try:
+            points = tuple(tuple(float(v) for v in p.split(",")) for p in outline.split(";") if p.strip())
+            footprint = outline_footprint(points, part_dims[STANDING_AXIS[allowed_orientation]], hull)
+        except ValueError as e:
+            st.error(f"❌ Could not read the outline: {e}")
+    if footprint is not None:
+        st.caption(f"Footprint {footprint['length']:.0f} × {footprint['width']:.0f} mm, "
+                   f"{footprint['area_mm2'] / 100:.0f} cm², {footprint['height']} mm tall ({allowed_orientation}).")
+
+# Nested designs are saved per footprint and nesting options
+design_key = prefetch_key if footprint is None else prefetch.fingerprint(
+    prefetch_key, footprint["name"], footprint["hull"], turns, clearance)
+saved = get_results_store().load("insert_design", design_key)
+use_saved = saved is not None and st.toggle(
+    f"📂 Use the saved insert design from {saved['created']:%d %b %Y, %H:%M}", value=True)
 
 with st.spinner("Generating insert design matrix..."):
-    insert_design = llm.recommend_insert_matrix(
-        part_length=product["L"],
-        part_width=product["W"],
-        part_height=product["H"],
-        weight=product["weight"],
-        orientation=allowed_orientation,
-        outer_box_length=outer_box.get("internal_length", 1100),
-        outer_box_width=outer_box.get("internal_width", 900),
-        outer_box_height=outer_box.get("internal_height", 580)
-    )
+    # A prefetched design never has nested pockets
+    insert_design = saved["payload"] if use_saved else None
+    if insert_design is None and footprint is None:
+        insert_design = prefetch.result(st.session_state, "insert_design", prefetch_key)
+    if insert_design is None:
+        insert_design = llm.recommend_insert_matrix(
+            part_length=product["L"],
+            part_width=product["W"],
+            part_height=product["H"],
+            weight=product["weight"],
+            orientation=allowed_orientation,
+            outer_box_length=box.internal.length,
+            outer_box_width=box.internal.width,
+            outer_box_height=box.internal.height,
+            allowed_orientations=feasible_orientations(orientation_analysis),
+            footprint=footprint,
+            nest_options={
+                "rotations": FREE_ROTATIONS if turns == "Quarter turns" else INTERLOCK_ROTATIONS,
+                "clearance": int(clearance),
+            },
+        )
+
+# Saved once per session and inputs; reruns on every widget change would repeat it
+saved_results = st.session_state.setdefault("saved_results", set())
+if not use_saved and ("insert_design", design_key) not in saved_results:
+    get_results_store().save_insert_design(design_key, product, box, insert_design)
+    saved_results.add(("insert_design", design_key))
 
 st.session_state["insert_design"] = insert_design
 
@@ -88,8 +161,10 @@ st.subheader("📦 Insert Design Summary (JSON)")
 st.json(st.session_state["insert_design"])
 insert = insert_design["insert"]
 insert_layer_height = insert["insert_dimensions"]["height"]  # 220
-outer_height = outer_box["internal_height"]                  # 580
-layers_possible = outer_height // insert_layer_height        # 2
+outer_height = box.internal.height                           # 580
+layer_plan = insert_design.get("layer_plan")
+# Planner stacks trays of mixed orientation into the leftover height too
+layers_possible = len(layer_plan["layers"]) if layer_plan else outer_height // insert_layer_height
 
 # Attach these extra values for clarity
 insert["insert_dimensions"]["outer_box_height"] = outer_height
@@ -103,9 +178,10 @@ st.json(insert_design)
 insert = insert_design["insert"]
 
 summary = f"""
-Part dimensions {product['L']}×{product['W']}×{product['H']} mm fit within internal {outer_box['internal_length']}×{outer_box['internal_width']}×{outer_box['internal_height']} mm.
+Part dimensions {product['L']}×{product['W']}×{product['H']} mm fit within internal {box.internal} mm.
 Orientation used: {insert['orientation']}.
 Units per insert: {insert['units_per_insert']} ({insert['matrix']} matrix).
+Layers: {layers_possible}, {insert.get('parts_per_box', insert['units_per_insert'] * layers_possible)} parts per box.
 Cell dimensions: {insert['cell_dimensions']['length']}×{insert['cell_dimensions']['width']}×{insert['cell_dimensions']['height']} mm.
 Reason: {insert_design.get('reason', 'No reason provided by LLM.')}
 """
@@ -114,8 +190,40 @@ st.json(insert_design)
 st.subheader("📋 Engineering Summary")
 st.text(summary)
 
+nested = insert_design.get("nesting")
+if nested and footprint is not None:
+    st.subheader("🧩 Nested Pockets")
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Parts per layer", nested["per_layer"], f"{nested['gain_percent']:+} % vs cuboid cells")
+    col2.metric("Cuboid cells per layer", nested["cuboid_per_layer"])
+    col3.metric("Parts per box", nested["parts_per_box"], f"{nested['layers']} layers", delta_color="off")
+    col4.metric("Tray area used", f"{nested['area_utilisation_percent']} %")
+    st.image(layout_image(footprint, nested, box.internal.length, box.internal.width),
+             caption=f"Tray {box.internal.length} × {box.internal.width} mm, {footprint['resolution']:g} mm raster")
+
+# -------------------------------
+# 6️⃣ Partition & separator cutting plan
+# -------------------------------
+if layer_plan and layer_plan["layers"]:
+    st.subheader("✂️ Insert Material & Cutting Plan")
+    boxes_to_cut = st.number_input("Boxes to cut inserts for", min_value=1, value=100, step=10)
+    material = material_report(layer_plan, box.internal, boxes=int(boxes_to_cut))
+
+    st.table([
+        {"Piece": p["name"], "Size (mm)": f"{p['length']} × {p['width']}", "Per box": p["quantity"]}
+        for p in material["pieces_per_box"]
+    ])
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Stock sheet", material["sheet"], f"{material['sheets_used']} sheets")
+    col2.metric("Sheet area per box", f"{material['sheet_area_per_box_m2']} m²")
+    col3.metric("Scrap", f"{material['scrap_percent']} %", f"{material['scrap_per_box_m2']} m² per box",
+                delta_color="off")
+    if material["oversize"]:
+        st.warning("Some pieces are larger than every stock sheet: "
+                   + ", ".join(f"{p['name']} {p['length']} × {p['width']} mm" for p in material["oversize"]))
+
 # -------------------------------
-# 6️⃣ Navigation to visualization
+# 7️⃣ Navigation to visualization
 # -------------------------------
 if st.button("➡️ Go to Visualization"):
     st.switch_page("pages/Visualisation.py")
@@ -125,44 +233,63 @@ import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from llm_recommender import LLMRecommender
+import prefetch
+from pipeline import allowed_orientation as first_allowed_orientation, feasible_orientations, session_key
+from geometry import Box, Dims
+from nesting import material_report
+from footprint import (FREE_ROTATIONS, HULLS, INTERLOCK_ROTATIONS, footprint_from_mesh, footprint_from_outline,
+                       layout_image)
+from mesh import MESH_UNITS
+from packing import STANDING_AXIS
+from results_store import get_results_store
 
 st.set_page_config(page_title="🧩 InsertDesign", layout="wide")
 st.title("Step 2️⃣ - Insert Design")
 
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def mesh_footprint(data, name, orientation, unit, hull):
+    return footprint_from_mesh(data, name, orientation, MESH_UNITS[unit], hull)
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def outline_footprint(points, height, hull):
+    return footprint_from_outline(points, height, hull=hull)
+
 # -------------------------------
 # 0️⃣ Optional: Default test values
 # -------------------------------
 if "product" not in st.session_state:
     st.session_state["product"] = {"L": 450, "W": 300, "H": 220, "weight": 18}
 
-if "outer_box" not in st.session_state:
-    st.session_state["outer_box"] = {
-        "internal_length": 1120,
-        "internal_width": 920,
-        "internal_height": 580
-    }
+if "box" not in st.session_state:
+    st.session_state["box"] = Box("Outer Box", Dims(1120, 920, 580), Dims(1120, 920, 580), 18.0)
 
 # -------------------------------
 # 1️⃣ Check Step 1 completion
 # -------------------------------
-if "product" not in st.session_state or "outer_box" not in st.session_state:
+if "product" not in st.session_state or "box" not in st.session_state:
     st.warning("⚠️ Please complete Step 1 first.")
     if st.button("⬅️ Go to Step 1"):
         st.switch_page("Step 1️⃣ - Enter Part Details")
     st.stop()  # Stop execution if Step 1 not done
 
 product = st.session_state["product"]
-outer_box = st.session_state["outer_box"]
+box = st.session_state["box"]
 
 llm = LLMRecommender()
+prefetch_key = session_key(st.session_state)
 
 # -------------------------------
 # 2️⃣ Analyze orientations
 # -------------------------------
 with st.spinner("Analyzing optimal orientations..."):
-    orientation_analysis = llm.analyze_orientations(
-        product["L"], product["W"], product["H"], product["weight"]
-    )
+    # Prefetched on Step 1 when the inputs have not changed since
+    orientation_analysis = prefetch.result(st.session_state, "orientation", prefetch_key)
+    if orientation_analysis is None:
+        orientation_analysis = llm.analyze_orientations(
+            product["L"], product["W"], product["H"], product["weight"]
+        )
 
 if not orientation_analysis or "orientations" not in orientation_analysis:
     st.error("⚠️ No orientation analysis returned from LLM.")
@@ -183,22 +310,76 @@ for label, status in orientation_analysis["orientations"].items():
 # -------------------------------
 # 3️⃣ Generate insert design
 # -------------------------------
-allowed_orientation = next(
-    (k for k, v in orientation_analysis["orientations"].items() if v == "✅"),
-    "length-standing"
-)
+allowed_orientation = first_allowed_orientation(orientation_analysis)
+
+with st.expander("🧩 Nested pockets for non-cuboid parts"):
+    st.caption("Shape the pockets to the part footprint and interlock neighbours with alternating rotation, "
+               "instead of one cuboid cell per part.")
+    source = st.radio("Footprint from", ["None", "CAD mesh (STL / OBJ)", "Outline"], horizontal=True)
+    col1, col2, col3 = st.columns(3)
+    hull = col1.radio("Hull", HULLS, format_func=str.title,
+                      help="Concave keeps notches and recesses a neighbour can nest into; convex is the "
+                           "stretched outline.")
+    turns = col2.radio("Rotations", ["Half turns", "Quarter turns"])
+    clearance = col3.number_input("Clearance between parts (mm)", min_value=0, value=0)
+
+    footprint = None
+    if source == "CAD mesh (STL / OBJ)":
+        upload = st.file_uploader("Mesh file", type=["stl", "obj"], key="footprint_mesh")
+        unit = st.selectbox("Mesh units", list(MESH_UNITS), key="footprint_unit")
+        if upload is not None:
+            try:
+                footprint = mesh_footprint(upload.getvalue(), upload.name, allowed_orientation, unit, hull)
+            except ValueError as e:
+                st.error(str(e))
+    elif source == "Outline":
+        outline = st.text_area("Outline points (mm)", "0,0; 250,0; 250,60; 60,60; 60,180; 0,180",
+                               help="x,y pairs in order around the part, separated by semicolons.")
+        part_dims = (product["L"], product["W"], product["H"])
+        try:
+            points = tuple(tuple(float(v) for v in p.split(",")) for p in outline.split(";") if p.strip())
+            footprint = outline_footprint(points, part_dims[STANDING_AXIS[allowed_orientation]], hull)
+        except ValueError as e:
+            st.error(f"❌ Could not read the outline: {e}")
+    if footprint is not None:
+        st.caption(f"Footprint {footprint['length']:.0f} × {footprint['width']:.0f} mm, "
+                   f"{footprint['area_mm2'] / 100:.0f} cm², {footprint['height']} mm tall ({allowed_orientation}).")
+
+# Nested designs are saved per footprint and nesting options
+design_key = prefetch_key if footprint is None else prefetch.fingerprint(
+    prefetch_key, footprint["name"], footprint["hull"], turns, clearance)
+saved = get_results_store().load("insert_design", design_key)
+use_saved = saved is not None and st.toggle(
+    f"📂 Use the saved insert design from {saved['created']:%d %b %Y, %H:%M}", value=True)
 
 with st.spinner("Generating insert design matrix..."):
-    insert_design = llm.recommend_insert_matrix(
-        part_length=product["L"],
-        part_width=product["W"],
-        part_height=product["H"],
-        weight=product["weight"],
-        orientation=allowed_orientation,
-        outer_box_length=outer_box.get("internal_length", 1100),
-        outer_box_width=outer_box.get("internal_width", 900),
-        outer_box_height=outer_box.get("internal_height", 580)
-    )
+    # A prefetched design never has nested pockets
+    insert_design = saved["payload"] if use_saved else None
+    if insert_design is None and footprint is None:
+        insert_design = prefetch.result(st.session_state, "insert_design", prefetch_key)
+    if insert_design is None:
+        insert_design = llm.recommend_insert_matrix(
+            part_length=product["L"],
+            part_width=product["W"],
+            part_height=product["H"],
+            weight=product["weight"],
+            orientation=allowed_orientation,
+            outer_box_length=box.internal.length,
+            outer_box_width=box.internal.width,
+            outer_box_height=box.internal.height,
+            allowed_orientations=feasible_orientations(orientation_analysis),
+            footprint=footprint,
+            nest_options={
+                "rotations": FREE_ROTATIONS if turns == "Quarter turns" else INTERLOCK_ROTATIONS,
+                "clearance": int(clearance),
+            },
+        )
+
+# Saved once per session and inputs; reruns on every widget change would repeat it
+saved_results = st.session_state.setdefault("saved_results", set())
+if not use_saved and ("insert_design", design_key) not in saved_results:
+    get_results_store().save_insert_design(design_key, product, box, insert_design)
+    saved_results.add(("insert_design", design_key))
 
 st.session_state["insert_design"] = insert_design
 
@@ -209,8 +390,10 @@ st.subheader("📦 Insert Design Summary (JSON)")
 st.json(st.session_state["insert_design"])
 insert = insert_design["insert"]
 insert_layer_height = insert["insert_dimensions"]["height"]  # 220
-outer_height = outer_box["internal_height"]                  # 580
-layers_possible = outer_height // insert_layer_height        # 2
+outer_height = box.internal.height                           # 580
+layer_plan = insert_design.get("layer_plan")
+# Planner stacks trays of mixed orientation into the leftover height too
+layers_possible = len(layer_plan["layers"]) if layer_plan else outer_height // insert_layer_height
 
 # Attach these extra values for clarity
 insert["insert_dimensions"]["outer_box_height"] = outer_height
@@ -224,9 +407,10 @@ st.json(insert_design)
 insert = insert_design["insert"]
 
 summary = f"""
-Part dimensions {product['L']}×{product['W']}×{product['H']} mm fit within internal {outer_box['internal_length']}×{outer_box['internal_width']}×{outer_box['internal_height']} mm.
+Part dimensions {product['L']}×{product['W']}×{product['H']} mm fit within internal {box.internal} mm.
 Orientation used: {insert['orientation']}.
 Units per insert: {insert['units_per_insert']} ({insert['matrix']} matrix).
+Layers: {layers_possible}, {insert.get('parts_per_box', insert['units_per_insert'] * layers_possible)} parts per box.
 Cell dimensions: {insert['cell_dimensions']['length']}×{insert['cell_dimensions']['width']}×{insert['cell_dimensions']['height']} mm.
 Reason: {insert_design.get('reason', 'No reason provided by LLM.')}
 """
@@ -235,8 +419,40 @@ st.json(insert_design)
 st.subheader("📋 Engineering Summary")
 st.text(summary)
 
+nested = insert_design.get("nesting")
+if nested and footprint is not None:
+    st.subheader("🧩 Nested Pockets")
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Parts per layer", nested["per_layer"], f"{nested['gain_percent']:+} % vs cuboid cells")
+    col2.metric("Cuboid cells per layer", nested["cuboid_per_layer"])
+    col3.metric("Parts per box", nested["parts_per_box"], f"{nested['layers']} layers", delta_color="off")
+    col4.metric("Tray area used", f"{nested['area_utilisation_percent']} %")
+    st.image(layout_image(footprint, nested, box.internal.length, box.internal.width),
+             caption=f"Tray {box.internal.length} × {box.internal.width} mm, {footprint['resolution']:g} mm raster")
+
+# -------------------------------
+# 6️⃣ Partition & separator cutting plan
+# -------------------------------
+if layer_plan and layer_plan["layers"]:
+    st.subheader("✂️ Insert Material & Cutting Plan")
+    boxes_to_cut = st.number_input("Boxes to cut inserts for", min_value=1, value=100, step=10)
+    material = material_report(layer_plan, box.internal, boxes=int(boxes_to_cut))
+
+    st.table([
+        {"Piece": p["name"], "Size (mm)": f"{p['length']} × {p['width']}", "Per box": p["quantity"]}
+        for p in material["pieces_per_box"]
+    ])
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Stock sheet", material["sheet"], f"{material['sheets_used']} sheets")
+    col2.metric("Sheet area per box", f"{material['sheet_area_per_box_m2']} m²")
+    col3.metric("Scrap", f"{material['scrap_percent']} %", f"{material['scrap_per_box_m2']} m² per box",
+                delta_color="off")
+    if material["oversize"]:
+        st.warning("Some pieces are larger than every stock sheet: "
+                   + ", ".join(f"{p['name']} {p['length']} × {p['width']} mm" for p in material["oversize"]))
+
 # -------------------------------
-# 6️⃣ Navigation to visualization
+# 7️⃣ Navigation to visualization
 # -------------------------------
 if st.button("➡️ Go to Visualization"):
     st.switch_page("pages/Visualisation.py")
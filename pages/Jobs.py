@@ -0,0 +1,52 @@
+import streamlit as st
+import sys, os
+
+# 🔧 Add parent directory to path for module imports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import jobs
+
+st.set_page_config(page_title="🛰 Background Jobs", layout="wide")
+st.title("🛰 Background Jobs")
+st.caption("Long optimisations run in local worker processes and survive page refreshes. "
+           "Finished results are kept for later sessions.")
+
+STATUS_ICONS = {"queued": "⏳", "running": "🔄", "done": "✅", "failed": "❌", "cancelled": "⏹"}
+
+
+# -------------------------------
+# Job list (polls while visible)
+# -------------------------------
+@st.fragment(run_every=2)
+def job_list():
+    recent = jobs.list_jobs(limit=25)
+    if not recent:
+        st.info("No background jobs yet. Start a fleet sweep from the truck optimisation page.")
+        return
+
+    for job in recent:
+        icon = STATUS_ICONS.get(job["status"], "•")
+        with st.container(border=True):
+            left, right = st.columns([4, 1])
+            with left:
+                st.markdown(f"**{icon} {job['label']}** · `{job['id']}` · {job['status']}")
+                st.progress(job["progress"], text=job["message"] or None)
+            with right:
+                if job["status"] in ("queued", "running"):
+                    if st.button("⏹ Cancel", key=f"cancel_{job['id']}"):
+                        jobs.cancel(job["id"])
+                elif job["status"] in ("cancelled", "failed"):
+                    if st.button("▶️ Resume", key=f"resume_{job['id']}"):
+                        jobs.resume(job["id"])
+
+            if job["status"] == "failed" and job["error"]:
+                st.code(job["error"])
+            results = job["result"] if job["status"] == "done" else job["partial"]
+            if results:
+                with st.expander("Results" if job["status"] == "done" else "Partial results"):
+                    st.json(results, expanded=False)
+
+
+job_list()
+
+if st.button("🧹 Remove finished jobs older than 30 days"):
+    jobs.purge(older_than_days=30)
@@ -0,0 +1,149 @@
+import streamlit as st
+import pandas as pd
+import sys, os
+
+# 🔧 Add parent directory to path for module imports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from box_library import get_box_library
+from planning import (DEFAULT_CYCLE_DAYS, PERIODS_PER_YEAR, SAFETY_STOCK, demand_matrix, demand_profile,
+                      parts_per_box, plan_year)
+
+st.set_page_config(page_title="📅 Annual Volume Planning", layout="wide")
+st.title("📅 Annual Volume Planning")
+st.caption("Trucks per period, returnable box pool and utilisation over a year, for the Step 1 part "
+           "or a whole catalog of parts and lanes.")
+
+
+@st.cache_data(show_spinner=False, max_entries=4096)
+def library_box(length, width, height, weight):
+    """Best library box for a catalog part: (parts per box, external dims, gross weight) or None."""
+    ranked = get_box_library().top_k(length, width, height, weight, k=1)
+    if not ranked:
+        return None
+    best = ranked[0]
+    return best["parts_per_box"], tuple(best["box"]["external"]), best["gross_weight"]
+
+
+# -------------------------------
+# 1️⃣ Demand
+# -------------------------------
+st.subheader("1️⃣ Demand")
+granularity = st.radio("Planning periods", list(PERIODS_PER_YEAR), horizontal=True, format_func=str.title)
+periods = PERIODS_PER_YEAR[granularity]
+source = st.radio("Demand from", ["Step 1 part", "Demand file (CSV)"], horizontal=True)
+
+product = st.session_state.get("product", {})
+box = st.session_state.get("box")
+part = st.session_state.get("part")
+
+if source == "Step 1 part":
+    if box is None or part is None:
+        st.warning("⚠ Please generate a recommendation on the Input page first.")
+        st.stop()
+    col1, col2, col3 = st.columns(3)
+    annual = col1.number_input("Annual demand (parts)", min_value=1, value=int(product.get("quantity", 500)), step=100)
+    seasonality = col2.slider("Seasonal swing (±%)", 0, 50, 0, step=5) / 100
+    peak = col3.number_input(f"Peak period (1-{periods})", min_value=1, max_value=periods, value=1)
+
+    lane = f"{product.get('source', 'Source')} → {product.get('destination', 'Destination')}"
+    parts = [{"part": "Step 1 part", "lane": lane, "lane_index": 0}]
+    lanes = [lane]
+    demand = demand_profile(annual, granularity, seasonality, peak - 1)[None, :]
+    specs = [(parts_per_box(part, box), tuple(box.external), box.weight)]
+else:
+    st.caption("Columns: `part`, `lane`, `period` (1-based), `quantity` (parts). Optional `L`, `W`, `H`, "
+               "`weight` per part pick a library box; parts without them use the Step 1 box.")
+    upload = st.file_uploader("Demand file", type=["csv"])
+    if upload is None:
+        st.stop()
+    table = pd.read_csv(upload)
+    missing = {"part", "lane", "period", "quantity"} - set(table.columns)
+    if missing:
+        st.error(f"❌ Missing columns: {', '.join(sorted(missing))}")
+        st.stop()
+    try:
+        parts, lanes, demand = demand_matrix(table.to_dict("records"), granularity)
+    except ValueError as e:
+        st.error(str(e))
+        st.stop()
+
+    # One box per part, from its dimensions when the file has them
+    dims = table.assign(part=table["part"].astype(str)).drop_duplicates("part").set_index("part")
+    specs = []
+    for p in parts:
+        row = dims.loc[p["part"]] if {"L", "W", "H", "weight"} <= set(dims.columns) else None
+        if row is not None and not row[["L", "W", "H", "weight"]].isna().any():
+            spec = library_box(float(row["L"]), float(row["W"]), float(row["H"]), float(row["weight"]))
+        elif box is not None and part is not None:
+            spec = (parts_per_box(part, box), tuple(box.external), box.weight)
+        else:
+            spec = None
+        if spec is None:
+            st.error(f"❌ No box for part {p['part']}: add its dimensions or complete Step 1.")
+            st.stop()
+        specs.append(spec)
+
+# -------------------------------
+# 2️⃣ Returnable cycle
+# -------------------------------
+st.subheader("2️⃣ Returnable cycle")
+col1, col2, col3 = st.columns(3)
+cycle_days = col1.number_input("Box cycle time (days out and back)", min_value=1, value=int(DEFAULT_CYCLE_DAYS))
+safety = col2.slider("Safety stock (%)", 0, 50, int(SAFETY_STOCK * 100), step=5) / 100
+apply_payload = col3.checkbox("Apply payload restriction", value=True)
+
+# -------------------------------
+# 3️⃣ Year plan
+# -------------------------------
+plan = plan_year(
+    demand,
+    [s[0] for s in specs],
+    [s[1] for s in specs],
+    [s[2] for s in specs],
+    [p["lane_index"] for p in parts],
+    granularity=granularity,
+    cycle_days=cycle_days,
+    safety_stock=safety,
+    apply_payload=apply_payload,
+)
+
+st.subheader("3️⃣ Year plan")
+col1, col2, col3, col4 = st.columns(4)
+col1.metric("Trucks per year", plan["annual_trucks"])
+col2.metric("Boxes shipped", plan["annual_boxes"])
+col3.metric("Returnable box pool", plan["pool_size"])
+col4.metric("Truck utilisation", f"{plan['utilisation_percent']} %")
+
+for i in plan["unplannable"]:
+    st.warning(f"⚠ {parts[i]['part']} ({parts[i]['lane']}): its box fits no truck and is left out.")
+for i in plan["no_box"]:
+    st.warning(f"⚠ {parts[i]['part']} ({parts[i]['lane']}): the part does not fit its box and is left out.")
+
+label = "Week" if granularity == "weekly" else "Month"
+by_period = pd.DataFrame({
+    label: range(1, periods + 1),
+    "Trucks": plan["period_trucks"],
+    "Utilisation (%)": plan["period_utilisation"].round(1),
+    "Boxes": plan["boxes"].sum(axis=0),
+}).set_index(label)
+st.bar_chart(by_period["Trucks"])
+st.line_chart(by_period["Utilisation (%)"])
+
+with st.expander("🛣 Lanes"):
+    st.dataframe(pd.DataFrame({
+        "Lane": [lanes[i] for i in plan["lanes"]],
+        "Truck": plan["lane_truck"],
+        "Trucks per year": plan["lane_trucks"].sum(axis=1).astype(int),
+        "Peak trucks per period": plan["lane_trucks"].max(axis=1).astype(int),
+        "Payload shipped (t)": (plan["lane_payload_kg"].sum(axis=1) / 1000).round(1),
+    }), hide_index=True, use_container_width=True)
+
+with st.expander("📦 Box pool by part"):
+    st.dataframe(pd.DataFrame({
+        "Part": [p["part"] for p in parts],
+        "Lane": [p["lane"] for p in parts],
+        "Parts per box": [s[0] for s in specs],
+        "Boxes per year": plan["boxes"].sum(axis=1).astype(int),
+        "Peak boxes in circulation": plan["in_use"].max(axis=1).astype(int),
+        "Pool size": plan["pool"],
+    }), hide_index=True, use_container_width=True)
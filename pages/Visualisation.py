@@ -5,6 +5,11 @@ import sys, os
 # 🔧 Add parent directory to path for module imports
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from llm_recommender import LLMRecommender
+import prefetch
+from pipeline import session_key
+from geometry import DEFAULT_BOX
+from layers import plan_layers
+from packing import STANDING_AXIS
 
 # 🧭 Page config
 st.set_page_config(page_title="📊 Insert Matrix Visualization", layout="wide")
@@ -17,27 +22,8 @@ if "product" not in st.session_state:
 
 product = st.session_state["product"]
 
-# ✅ Normalize outer box keys with fallback defaults
-recommendation = st.session_state.get("recommendation")
-outer_box_raw = st.session_state.get("outer_box", {})
-
-outer_box_length = (
-    outer_box_raw.get("L")
-    or outer_box_raw.get("length")
-    or (recommendation.get("box", {}).get("length") if recommendation else None)
-    or 1100
-)
-outer_box_width = (
-    outer_box_raw.get("W")
-    or outer_box_raw.get("width")
-    or (recommendation.get("box", {}).get("width") if recommendation else None)
-    or 900
-)
-outer_box_height = (
-    outer_box_raw.get("H")
-    or outer_box_raw.get("height")
-    or 580
-)
+# ✅ Outer box internals (typed Box from Step 1)
+outer_box_length, outer_box_width, outer_box_height = st.session_state.get("box", DEFAULT_BOX).internal
 
 # ✅ Validate product keys
 required_keys = ["L", "W", "H", "weight"]
@@ -48,16 +34,20 @@ if not all(k in product for k in required_keys):
 # ✅ Call LLMRecommender
 llm = LLMRecommender()
 with st.spinner("🔄 Generating insert matrix layout..."):
-    insert_data = llm.recommend_insert_matrix(
-        part_length=product["L"],
-        part_width=product["W"],
-        part_height=product["H"],
-        weight=product["weight"],
-        orientation=product["orientation"][0] if product.get("orientation") else "length-standing",
-        outer_box_length=outer_box_length,
-        outer_box_width=outer_box_width,
-        outer_box_height=outer_box_height
-    )
+    # Prefetched on Step 1 when the inputs have not changed since
+    insert_data = prefetch.result(st.session_state, "insert_matrix", session_key(st.session_state))
+    if insert_data is None:
+        insert_data = llm.recommend_insert_matrix(
+            part_length=product["L"],
+            part_width=product["W"],
+            part_height=product["H"],
+            weight=product["weight"],
+            orientation=product["orientation"][0] if product.get("orientation") else "length-standing",
+            outer_box_length=outer_box_length,
+            outer_box_width=outer_box_width,
+            outer_box_height=outer_box_height,
+            allowed_orientations=product.get("orientation") or list(STANDING_AXIS)
+        )
 
 # ✅ Save for next step
 st.session_state["insert_matrix"] = insert_data
@@ -101,58 +91,56 @@ with right:
     st.subheader("🧮 Matrix Pattern Visualization")
 
     # get insert data
-    cell_L = insert['cell_dimensions']['length']
-    cell_W = insert['cell_dimensions']['width']
-    insert_H = insert['insert_dimensions']['height']
-
-    units_length = max(0, int(outer_box_length // cell_L))   # cols
-    units_width  = max(0, int(outer_box_width  // cell_W))   # rows
-    layers       = max(1, int(outer_box_height // insert_H))
+    layer_plan = insert_data.get("layer_plan") or plan_layers(
+        (product["L"], product["W"], product["H"]),
+        (outer_box_length, outer_box_width, outer_box_height),
+        product.get("orientation") or None,
+    )
+    layers = layer_plan["layers"]
 
     # Debug info (clean format)
     st.markdown(f"**Outer Box (L×W×H):** {outer_box_length} × {outer_box_width} × {outer_box_height} mm")
-    st.markdown(f"**Cell Dimensions (L×W):** {cell_L} × {cell_W} mm")
-    st.markdown(f"**Insert Tray Height:** {insert_H} mm")
-    st.markdown(f"**Matrix Pattern:** {units_length} × {units_width} (rows × cols)")
-    st.markdown(f"**Layers (stacked trays):** {layers}")
+    st.markdown(f"**Insert Tray Base / Separator:** {layer_plan['tray_mm']} / {layer_plan['separator_mm']} mm")
+    st.markdown(f"**Layers (stacked trays):** {len(layers)}")
+    st.markdown(f"**Height Used:** {layer_plan['used_height']} mm ({layer_plan['free_height']} mm free)")
 
-    if units_length == 0 or units_width == 0:
+    if not layers:
         st.error("❌ No cells fit into the outer box. Adjust box/cell dimensions.")
         st.stop()
 
-    # Pixel size so it fits neatly
+    # Pixel scale so the tray fits neatly
     max_visual_width_px = 350
-    cell_px = max(20, min(60, max_visual_width_px // max(1, units_length)))
+    scale = max_visual_width_px / outer_box_length
 
-    total_parts = units_length * units_width * layers
-    st.success(f"**Total Parts in Box:** {total_parts}")
+    st.success(f"**Total Parts in Box:** {layer_plan['parts_per_box']}")
+    if layer_plan["parts_per_box"] > layer_plan["uniform_parts_per_box"]:
+        st.info(f"Mixing orientations fits {layer_plan['parts_per_box'] - layer_plan['uniform_parts_per_box']} "
+                f"more parts than repeating a single layer.")
 
     # Show each layer
-    for l in range(layers):
-        with st.expander(f"Layer {l+1} — {units_width} × {units_length}", expanded=(l==0)):
-            grid_html = f"""
-            <div style="
-                display:grid;
-                grid-template-columns: repeat({units_length}, {cell_px}px);
-                grid-auto-rows: {cell_px}px;
-                gap: 4px;
-                justify-content:center;
-                margin: 6px 0;
-            ">
-            """
-            for _ in range(units_width * units_length):
-                grid_html += (
-                    f"<div style='width:{cell_px}px; height:{cell_px}px; "
-                    "background:#dfffe2; border:1px solid #b0b0b0; "
-                    "display:flex; align-items:center; justify-content:center; "
-                    f"font-size:{max(10, cell_px//3)}px; font-weight:600; color:#0b3d05; "
-                    "border-radius:4px;'>P</div>"
-                )
+    for l, layer in enumerate(layers):
+        cell_l, cell_w, cell_h = layer["cell"]
+        with st.expander(f"Layer {l+1} — {layer['orientation']}, {layer['count']} parts, {layer['height']} mm",
+                         expanded=(l==0)):
+            grid_html = (
+                f"<div style='position:relative; width:{max_visual_width_px}px; "
+                f"height:{int(outer_box_width * scale)}px; border:1px solid #b0b0b0; margin:6px auto;'>"
+            )
+            for x0, y0, cols, rows, bl, bw in layer["blocks"]:
+                for r in range(rows):
+                    for c in range(cols):
+                        grid_html += (
+                            f"<div style='position:absolute; left:{(x0 + c * bl) * scale:.1f}px; "
+                            f"top:{(y0 + r * bw) * scale:.1f}px; width:{bl * scale - 2:.1f}px; "
+                            f"height:{bw * scale - 2:.1f}px; background:#dfffe2; border:1px solid #b0b0b0; "
+                            "display:flex; align-items:center; justify-content:center; "
+                            "font-size:10px; font-weight:600; color:#0b3d05; border-radius:4px;'>P</div>"
+                        )
             grid_html += "</div>"
             st.markdown(grid_html, unsafe_allow_html=True)
 
     # Legend
-    st.caption("🟩 Each tile = 1 part cell. Grid auto-scales to fit screen.")
+    st.caption("🟩 Each tile = 1 part cell, drawn to scale. Layers may stand parts on different faces.")
 
 # -------------------------------
 # Navigation button
@@ -167,6 +155,11 @@ import sys, os
 # 🔧 Add parent directory to path for module imports
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from llm_recommender import LLMRecommender
+import prefetch
+from pipeline import session_key
+from geometry import DEFAULT_BOX
+from layers import plan_layers
+from packing import STANDING_AXIS
 
 # 🧭 Page config
 st.set_page_config(page_title="📊 Insert Matrix Visualization", layout="wide")
@@ -179,27 +172,8 @@ if "product" not in st.session_state:
 
 product = st.session_state["product"]
 
-# ✅ Normalize outer box keys with fallback defaults
-recommendation = st.session_state.get("recommendation")
-outer_box_raw = st.session_state.get("outer_box", {})
-
-outer_box_length = (
-    outer_box_raw.get("L")
-    or outer_box_raw.get("length")
-    or (recommendation.get("box", {}).get("length") if recommendation else None)
-    or 1100
-)
-outer_box_width = (
-    outer_box_raw.get("W")
-    or outer_box_raw.get("width")
-    or (recommendation.get("box", {}).get("width") if recommendation else None)
-    or 900
-)
-outer_box_height = (
-    outer_box_raw.get("H")
-    or outer_box_raw.get("height")
-    or 580
-)
+# ✅ Outer box internals (typed Box from Step 1)
+outer_box_length, outer_box_width, outer_box_height = st.session_state.get("box", DEFAULT_BOX).internal
 
 # ✅ Validate product keys
 required_keys = ["L", "W", "H", "weight"]
@@ -210,16 +184,20 @@ if not all(k in product for k in required_keys):
 # ✅ Call LLMRecommender
 llm = LLMRecommender()
 with st.spinner("🔄 Generating insert matrix layout..."):
-    insert_data = llm.recommend_insert_matrix(
-        part_length=product["L"],
-        part_width=product["W"],
-        part_height=product["H"],
-        weight=product["weight"],
-        orientation=product["orientation"][0] if product.get("orientation") else "length-standing",
-        outer_box_length=outer_box_length,
-        outer_box_width=outer_box_width,
-        outer_box_height=outer_box_height
-    )
+    # Prefetched on Step 1 when the inputs have not changed since
+    insert_data = prefetch.result(st.session_state, "insert_matrix", session_key(st.session_state))
+    if insert_data is None:
+        insert_data = llm.recommend_insert_matrix(
+            part_length=product["L"],
+            part_width=product["W"],
+            part_height=product["H"],
+            weight=product["weight"],
+            orientation=product["orientation"][0] if product.get("orientation") else "length-standing",
+            outer_box_length=outer_box_length,
+            outer_box_width=outer_box_width,
+            outer_box_height=outer_box_height,
+            allowed_orientations=product.get("orientation") or list(STANDING_AXIS)
+        )
 
 # ✅ Save for next step
 st.session_state["insert_matrix"] = insert_data
@@ -263,58 +241,56 @@ with right:
     st.subheader("🧮 Matrix Pattern Visualization")
 
     # get insert data
-    cell_L = insert['cell_dimensions']['length']
-    cell_W = insert['cell_dimensions']['width']
-    insert_H = insert['insert_dimensions']['height']
-
-    units_length = max(0, int(outer_box_length // cell_L))   # cols
-    units_width  = max(0, int(outer_box_width  // cell_W))   # rows
-    layers       = max(1, int(outer_box_height // insert_H))
+    layer_plan = insert_data.get("layer_plan") or plan_layers(
+        (product["L"], product["W"], product["H"]),
+        (outer_box_length, outer_box_width, outer_box_height),
+        product.get("orientation") or None,
+    )
+    layers = layer_plan["layers"]
 
     # Debug info (clean format)
     st.markdown(f"**Outer Box (L×W×H):** {outer_box_length} × {outer_box_width} × {outer_box_height} mm")
-    st.markdown(f"**Cell Dimensions (L×W):** {cell_L} × {cell_W} mm")
-    st.markdown(f"**Insert Tray Height:** {insert_H} mm")
-    st.markdown(f"**Matrix Pattern:** {units_length} × {units_width} (rows × cols)")
-    st.markdown(f"**Layers (stacked trays):** {layers}")
+    st.markdown(f"**Insert Tray Base / Separator:** {layer_plan['tray_mm']} / {layer_plan['separator_mm']} mm")
+    st.markdown(f"**Layers (stacked trays):** {len(layers)}")
+    st.markdown(f"**Height Used:** {layer_plan['used_height']} mm ({layer_plan['free_height']} mm free)")
 
-    if units_length == 0 or units_width == 0:
+    if not layers:
         st.error("❌ No cells fit into the outer box. Adjust box/cell dimensions.")
         st.stop()
 
-    # Pixel size so it fits neatly
+    # Pixel scale so the tray fits neatly
     max_visual_width_px = 350
-    cell_px = max(20, min(60, max_visual_width_px // max(1, units_length)))
+    scale = max_visual_width_px / outer_box_length
 
-    total_parts = units_length * units_width * layers
-    st.success(f"**Total Parts in Box:** {total_parts}")
+    st.success(f"**Total Parts in Box:** {layer_plan['parts_per_box']}")
+    if layer_plan["parts_per_box"] > layer_plan["uniform_parts_per_box"]:
+        st.info(f"Mixing orientations fits {layer_plan['parts_per_box'] - layer_plan['uniform_parts_per_box']} "
+                f"more parts than repeating a single layer.")
 
     # Show each layer
-    for l in range(layers):
-        with st.expander(f"Layer {l+1} — {units_width} × {units_length}", expanded=(l==0)):
-            grid_html = f"""
-            <div style="
-                display:grid;
-                grid-template-columns: repeat({units_length}, {cell_px}px);
-                grid-auto-rows: {cell_px}px;
-                gap: 4px;
-                justify-content:center;
-                margin: 6px 0;
-            ">
-            """
-            for _ in range(units_width * units_length):
-                grid_html += (
-                    f"<div style='width:{cell_px}px; height:{cell_px}px; "
-                    "background:#dfffe2; border:1px solid #b0b0b0; "
-                    "display:flex; align-items:center; justify-content:center; "
-                    f"font-size:{max(10, cell_px//3)}px; font-weight:600; color:#0b3d05; "
-                    "border-radius:4px;'>P</div>"
-                )
+    for l, layer in enumerate(layers):
+        cell_l, cell_w, cell_h = layer["cell"]
+        with st.expander(f"Layer {l+1} — {layer['orientation']}, {layer['count']} parts, {layer['height']} mm",
+                         expanded=(l==0)):
+            grid_html = (
+                f"<div style='position:relative; width:{max_visual_width_px}px; "
+                f"height:{int(outer_box_width * scale)}px; border:1px solid #b0b0b0; margin:6px auto;'>"
+            )
+            for x0, y0, cols, rows, bl, bw in layer["blocks"]:
+                for r in range(rows):
+                    for c in range(cols):
+                        grid_html += (
+                            f"<div style='position:absolute; left:{(x0 + c * bl) * scale:.1f}px; "
+                            f"top:{(y0 + r * bw) * scale:.1f}px; width:{bl * scale - 2:.1f}px; "
+                            f"height:{bw * scale - 2:.1f}px; background:#dfffe2; border:1px solid #b0b0b0; "
+                            "display:flex; align-items:center; justify-content:center; "
+                            "font-size:10px; font-weight:600; color:#0b3d05; border-radius:4px;'>P</div>"
+                        )
             grid_html += "</div>"
             st.markdown(grid_html, unsafe_allow_html=True)
 
     # Legend
-    st.caption("🟩 Each tile = 1 part cell. Grid auto-scales to fit screen.")
+    st.caption("🟩 Each tile = 1 part cell, drawn to scale. Layers may stand parts on different faces.")
 
 # -------------------------------
 # Navigation button
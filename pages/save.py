@@ -1,6 +1,13 @@
 
 import streamlit as st
-import itertools
+import sys, os, copy
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import jobs
+from fleet import score_fleet
+from packer import repack
+from improver import iter_improve
+from packing import TRUCKS
+from lane_cost import lane_km, with_costs
 
 st.set_page_config(page_title="Truck Optimization & Box Placement", layout="wide")
 st.title("📦 Truck Optimization & Box Placement")
@@ -30,6 +37,9 @@ with st.container():
     st.markdown("---")
     st.write(f"*Source:* {route_info['Source']}")
     st.write(f"*Destination:* {route_info['Destination']}")
+    stops = route_info.get("Stops") or [route_info["Destination"]]
+    if len(stops) > 1:
+        st.write("*Drop stops:* " + "  →  ".join(f"{n}. {city}" for n, city in enumerate(stops, 1)))
     st.write("🛣 *Route Type Distribution:*")
     for route, pct in route_info["Route Distribution"].items():
         st.write(f"- {route}: {pct}%")
@@ -39,11 +49,7 @@ st.divider()
 # -----------------------------
 # Define trucks
 # -----------------------------
-trucks = [
-    {"name": "32 ft. Single Axle", "dimensions": (9750, 2440, 2440), "payload": 16000},
-    {"name": "32 ft. Multi Axle", "dimensions": (9750, 2440, 2440), "payload": 21000},
-    {"name": "22 ft. Truck", "dimensions": (7300, 2440, 2440), "payload": 10000},
-]
+trucks = TRUCKS
 
 st.subheader("🚛 Available Trucks")
 cols = st.columns(len(trucks))
@@ -56,80 +62,51 @@ for col, truck in zip(cols, trucks):
 st.divider()
 
 # -----------------------------
-# Payload toggle
+# Cached computation shared by the panels
 # -----------------------------
-apply_payload = st.checkbox("🚦 Apply Payload Restriction", value=True)
+@st.cache_data(show_spinner=False, max_entries=64)
+def uniform_results(box, apply_payload):
+    # Trucks are scored in parallel; results come back in catalog order
+    return score_fleet({"box": box, "apply_payload": apply_payload}, trucks)
 
 
-# -----------------------------
-# Truck optimisation function
-# -----------------------------
-def calculate_optimisation(truck, box, apply_payload=True):
-    truck_len, truck_wid, truck_hei = truck["dimensions"]
-    box_len, box_wid, box_hei = box["dimensions"]
-
-    best_result = None
-
-    # Try all 6 orientations
-    for dims in set(itertools.permutations([box_len, box_wid, box_hei], 3)):
-        b_len, b_wid, b_hei = dims
-
-        # Fit counts along each axis
-        fit_len = int(truck_len // b_len)
-        fit_wid = int(truck_wid // b_wid)
-        fit_hei = int(truck_hei // b_hei)
-        boxes_by_space = fit_len * fit_wid * fit_hei
-
-        if boxes_by_space <= 0:
-            continue
-
-        # Payload limit
-        max_boxes_by_weight = None
-        if box["payload"] > 0:
-            max_boxes_by_weight = int(truck["payload"] // float(box["payload"]))
-            if apply_payload:
-                total_boxes = min(boxes_by_space, max_boxes_by_weight)
-            else:
-                total_boxes = boxes_by_space
-        else:
-            continue
-
-        # Volume utilisation
-        truck_volume = (truck_len * truck_wid * truck_hei) / 1e9  # m³
-        box_volume = (b_len * b_wid * b_hei) / 1e9  # m³
-        utilised_volume = total_boxes * box_volume
-        utilisation_percent = (utilised_volume / truck_volume) * 100 if truck_volume > 0 else 0
-
-        # Space utilisation (% of boxes that fit by space actually loaded)
-        utilisation_by_space = (total_boxes / boxes_by_space) * 100 if boxes_by_space > 0 else 0
-
-        result = {
-            "truck_name": truck["name"],
-            "truck_volume": round(truck_volume, 2),
-            "box_volume": round(box_volume, 3),
-            "boxes_by_space": boxes_by_space,
-            "max_boxes_by_weight": max_boxes_by_weight,
-            "boxes_per_truck": total_boxes,
-            "utilisation_percent": round(utilisation_percent, 1),
-            "utilisation_by_space": round(utilisation_by_space, 1),
-            "orientation": (fit_len, fit_wid, fit_hei),
-            "box_dims_used": dims,
-        }
-
-        if best_result is None or result["utilisation_percent"] > best_result["utilisation_percent"]:
-            best_result = result
-
-    return best_result
+def layer_grid(fit_len, fit_wid):
+    """One HTML element per layer instead of one Streamlit element per box."""
+    cell = ("<div style='background:#90EE90; border:1px solid #333; height:30px; "
+            "display:flex; justify-content:center; align-items:center;'>B</div>")
+    return (f"<div style='display:grid; grid-template-columns: repeat({fit_len}, 1fr); gap:2px;'>"
+            + cell * (fit_len * fit_wid) + "</div>")
 
 
 # -----------------------------
-# Optimisation Button
+# Optimisation results panel
 # -----------------------------
-if st.button("🔵 Optimise Truck Loading", type="primary", use_container_width=True):
-    st.subheader("📊 Truck Optimisation Results")
+# Fragments rerun on their own: the optimise button and the payload toggle only re-render this panel
+@st.fragment
+def optimisation_panel():
+    # Keyed so the other panels (and the sweep job) read the same setting when they next run
+    apply_payload = st.checkbox("🚦 Apply Payload Restriction", value=True, key="apply_payload")
+
+    # Optimisation Button
+    if st.button("🔵 Optimise Truck Loading", type="primary", use_container_width=True):
+        st.session_state["show_optimisation"] = True
+    if not st.session_state.get("show_optimisation"):
+        return
 
-    for truck in trucks:
-        result = calculate_optimisation(truck, box, apply_payload)
+    st.subheader("📊 Truck Optimisation Results")
+    results, timed_out = uniform_results(box, apply_payload)
+    # Trip cost and CO₂ from the lane distance and the route type mix entered on the previous page
+    lane = lane_km(route_info["Source"], route_info["Destination"], route_info.get("Stops"))
+    costs = {r["truck_name"]: r for r in with_costs([r for r in results if r and r["boxes_per_truck"]], lane, route_info["Route Distribution"])} \
+        if lane else {}
+    if not lane:
+        st.caption("🛣 Lane not in the lane table: trip cost and CO₂ are not shown.")
+
+    for truck, result in zip(trucks, results):
+        if result is None:
+            reason = "ran out of time" if truck["name"] in timed_out else "no valid arrangement"
+            st.warning(f"🚛 {truck['name']}: {reason}")
+            continue
 
         with st.expander(f"🚛 {result['truck_name']} - {result['utilisation_percent']}% filled"):
             # Summary row
@@ -141,8 +118,15 @@ if st.button("🔵 Optimise Truck Loading", type="primary", use_container_width=
             col5.markdown(f"**Boxes Loaded:** {result['boxes_per_truck']}")
 
             st.info(f"✅ Payload restriction applied: {apply_payload}")
-            total_trucks_needed = -(-box['quantity'] // result['boxes_per_truck'])  # ceil division
-            st.success(f"**Total Trucks Needed:** {total_trucks_needed}")
+            if result['boxes_per_truck'] > 0:
+                total_trucks_needed = -(-box['quantity'] // result['boxes_per_truck'])  # ceil division
+                st.success(f"**Total Trucks Needed:** {total_trucks_needed}")
+            else:
+                st.error("❌ Not a single box fits this truck (space or payload), so it cannot carry this load.")
+            if result["truck_name"] in costs:
+                cost = costs[result["truck_name"]]
+                st.info(f"💰 **Trip cost:** ₹{cost['trip_cost']:,.0f} (₹{cost['cost_per_part']} per box) · "
+                        f"🌱 **CO₂:** {cost['trip_co2_kg']} kg ({cost['co2_per_part']} kg per box) over {lane:,.0f} km")
 
             st.markdown("---")
 
@@ -169,7 +153,8 @@ if st.button("🔵 Optimise Truck Loading", type="primary", use_container_width=
                     f"**Boxes by Space:** {result['boxes_by_space']}  \n"
                     f"**Boxes by Payload:** {result['max_boxes_by_weight']}  \n"
                     f"**Boxes Loaded:** {result['boxes_per_truck']}  \n"
-                    f"**Utilisation (by volume):** {result['utilisation_percent']} %  \n"
+                    f"**Utilisation (by volume):** {result['utilisation_percent']} % "
+                    f"(gap {result['gap_percent']} % to the {result['utilisation_bound_percent']} % bound)  \n"
                     f"**Utilisation (by space):** {result['utilisation_by_space']} %"
                 )
 
@@ -193,39 +178,167 @@ if st.button("🔵 Optimise Truck Loading", type="primary", use_container_width=
                 elif total_boxes <= max_visual_boxes:
                     for layer in range(fit_hei):
                         st.markdown(f"**Layer {layer + 1}**")
-                        for row in range(fit_wid):
-                            cols = st.columns(fit_len)
-                            for col_idx in range(fit_len):
-                                with cols[col_idx]:
-                                    st.markdown(
-                                        "<div style='background:#90EE90; border:1px solid #333; height:30px; "
-                                        "display:flex; justify-content:center; align-items:center;'>B</div>",
-                                        unsafe_allow_html=True
-                                    )
+                        st.markdown(layer_grid(fit_len, fit_wid), unsafe_allow_html=True)
                     st.markdown("---")
                 else:
                     preview_len = min(fit_len, 5)
                     preview_wid = min(fit_wid, 5)
 
                     st.info(f"⚠ Too many boxes ({total_boxes}) to draw. Showing a {preview_len} × {preview_wid} preview instead.")
-
-                    for row in range(preview_wid):
-                        cols = st.columns(preview_len)
-                        for col_idx in range(preview_len):
-                            with cols[col_idx]:
-                                st.markdown(
-                                    "<div style='background:#90EE90; border:1px solid #333; height:30px; "
-                                    "display:flex; justify-content:center; align-items:center;'>B</div>",
-                                    unsafe_allow_html=True
-                                )
+                    st.markdown(layer_grid(preview_len, preview_wid), unsafe_allow_html=True)
 
             # ✅ Always show arrangement summary
             st.success(
                 f"Arrangement: {fit_len} × {fit_wid} × {fit_hei} = {total_boxes} boxes"
             )
 
+
+optimisation_panel()
+
+
+# -----------------------------
+# Mixed load plan (all box types)
+# -----------------------------
+st.divider()
+st.subheader("🧱 Mixed Load Plan")
+st.caption("Packs every box type together, keeping fragile boxes off the bottom, respecting "
+           "stacking, upright and max-load-on-top limits.")
+
+
+@st.fragment
+def mixed_plan_panel():
+    apply_payload = st.session_state.get("apply_payload", True)
+    mixed_inputs = {"items": box_data, "apply_payload": apply_payload}
+    previous_plans = st.session_state.get("mixed_plans")
+
+    if st.button("🧱 Plan Mixed Load", use_container_width=True):
+        if previous_plans and st.session_state.get("mixed_inputs") != mixed_inputs:
+            # Quantities or payload changed: repair the last plans instead of solving from scratch
+            plans = [repack(plan, truck=truck, items=box_data, apply_payload=apply_payload) if plan else None
+                     for truck, plan in zip(trucks, previous_plans)]
+            timed_out = []
+        else:
+            plans, timed_out = score_fleet(mixed_inputs, trucks, evaluator="mixed_plan")
+        st.session_state["mixed_plans"] = plans
+        st.session_state["mixed_timed_out"] = timed_out
+        st.session_state["mixed_inputs"] = copy.deepcopy(mixed_inputs)
+
+    if st.session_state.get("mixed_plans") and st.session_state.get("mixed_inputs") != mixed_inputs:
+        st.caption("🔄 Inputs or payload setting changed since these plans: press the button to re-plan.")
+    for truck, plan in zip(trucks, st.session_state.get("mixed_plans") or []):
+        if plan is None:
+            reason = "ran out of time" if truck["name"] in st.session_state.get("mixed_timed_out", []) \
+                else "no valid plan"
+            st.warning(f"🚛 {truck['name']}: {reason}")
+            continue
+        plan = plan.summary()
+        solve_note = {"repair": "re-planned from last plan", "improved": "improved"}.get(plan["solve_mode"], "full solve")
+        with st.expander(f"🚛 {plan['truck_name']} - {plan['boxes_per_truck']} boxes, "
+                         f"{plan['utilisation_percent']}% filled ({solve_note})"):
+            col1, col2, col3 = st.columns(3)
+            col1.markdown(f"**Boxes Loaded:** {plan['boxes_per_truck']}")
+            col2.markdown(f"**Volume Used:** {plan['utilisation_percent']} % "
+                          f"(gap {plan['gap_percent']} % to the {plan['utilisation_bound_percent']} % bound)")
+            col3.markdown(f"**Payload Used:** {plan['total_weight']} kg ({plan['payload_percent']} %)")
+            st.markdown("  \n".join(
+                f"*Box {i + 1} ({b['type']}):* {plan['loaded_per_item'][i]} loaded"
+                + (f", {plan['unplaced'][i]} left over" if plan["unplaced"].get(i) else "")
+                for i, b in enumerate(box_data[:len(plan["loaded_per_item"])])
+            ))
+            if len(plan["loaded_per_stop"]) > 1:
+                # Unloaded at the rear door, first drop first
+                st.markdown("**Unloading order:** " + ", ".join(
+                    f"stop {s} ({stops[s - 1] if s <= len(stops) else '?'}): {n} boxes"
+                    for s, n in plan["loaded_per_stop"].items()
+                ))
+                if plan["rehandles"]:
+                    st.warning(f"⚠ {plan['rehandles']} boxes must be moved to reach earlier drops.")
+                else:
+                    st.caption("✅ Every box is reachable at its stop without rehandling.")
+            if plan["solve_mode"] == "repair":
+                st.caption(f"Repair quality: {plan['quality'] * 100:.0f}% of a full solve's expected load")
+
+    # Trade seconds of CPU for utilisation on one truck's plan
+    if st.session_state.get("mixed_plans"):
+        with st.expander("✨ Improve a plan (multi-start annealing)"):
+            col1, col2, col3 = st.columns(3)
+            truck_name = col1.selectbox("Truck", [t["name"] for t in trucks], key="improve_truck")
+            seconds = col2.slider("Time budget (s)", 2, 120, 15, key="improve_seconds")
+            seed = col3.number_input("Seed", min_value=0, value=0, step=1, key="improve_seed")
+            if st.button("✨ Improve", use_container_width=True):
+                i = next(n for n, t in enumerate(trucks) if t["name"] == truck_name)
+                st.button("⏹ Stop improving")  # its rerun ends the search, keeping the best plan so far
+                status = st.empty()
+                # Every improved incumbent is kept at once, so stopping early loses nothing
+                for improved, stats in iter_improve(trucks[i], box_data, apply_payload,
+                                                    time_budget_s=seconds, seed=int(seed)):
+                    st.session_state["mixed_plans"][i] = improved
+                    st.session_state["improve_stats"] = stats
+                    status.info(f"⏱ {stats['elapsed_s']:.1f} s — {stats['utilisation']}% utilisation, "
+                                f"gap {stats['gap_percent']}%")
+                st.rerun(scope="fragment")
+            stats = st.session_state.get("improve_stats")
+            if stats:
+                st.caption(f"Utilisation {stats['baseline_utilisation']}% → {stats['utilisation']}% "
+                           f"(+{stats['gain_points']} points, {stats['epochs']} epochs × {stats['starts']} starts, "
+                           f"seed {stats['seed']})"
+                           + (" — reached the upper bound, stopped early" if stats.get("optimal") else ""))
+
+
+mixed_plan_panel()
+
+
+# -----------------------------
+st.divider()
+st.subheader("🛰 Background Fleet Sweep")
+st.caption("Scores every box type against every truck in a worker process. "
+           "The job keeps running if the page is refreshed; see the Jobs page for all runs.")
+
+@st.fragment
+def sweep_controls():
+    if st.button("▶️ Run fleet sweep in background", use_container_width=True):
+        st.session_state["sweep_job"] = jobs.submit(
+            "fleet_sweep",
+            {"boxes": box_data, "trucks": trucks, "apply_payload": st.session_state.get("apply_payload", True)},
+            label=f"Fleet sweep: {len(box_data)} box type(s) × {len(trucks)} trucks",
+        )
+
+
+sweep_controls()
+
+
+@st.fragment(run_every=2)
+def sweep_status():
+    job_id = st.session_state.get("sweep_job")
+    job = jobs.get(job_id) if job_id else None
+    if not job:
+        return
+
+    st.progress(job["progress"], text=f"{job['label']} — {job['status']} {job['message']}")
+    if job["status"] == "running" and st.button("⏹ Cancel sweep"):
+        jobs.cancel(job_id)
+    if job["status"] == "failed":
+        st.error(job["error"])
+
+    rows = job["result"] or job["partial"] or []
+    for row in rows:
+        best = max((r for r in row["trucks"] if r), key=lambda r: r["utilisation_percent"], default=None)
+        if best:
+            st.write(f"*{row['box']}* → {best['truck_name']}: {best['boxes_per_truck']} boxes, "
+                     f"{best['utilisation_percent']}% filled")
+
+
+sweep_status()
+
 import streamlit as st
-import itertools
+import sys, os, copy
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import jobs
+from fleet import score_fleet
+from packer import repack
+from improver import iter_improve
+from packing import TRUCKS
+from lane_cost import lane_km, with_costs
 
 st.set_page_config(page_title="Truck Optimization & Box Placement", layout="wide")
 st.title("📦 Truck Optimization & Box Placement")
@@ -255,6 +368,9 @@ with st.container():
     st.markdown("---")
     st.write(f"*Source:* {route_info['Source']}")
     st.write(f"*Destination:* {route_info['Destination']}")
+    stops = route_info.get("Stops") or [route_info["Destination"]]
+    if len(stops) > 1:
+        st.write("*Drop stops:* " + "  →  ".join(f"{n}. {city}" for n, city in enumerate(stops, 1)))
     st.write("🛣 *Route Type Distribution:*")
     for route, pct in route_info["Route Distribution"].items():
         st.write(f"- {route}: {pct}%")
@@ -264,11 +380,7 @@ st.divider()
 # -----------------------------
 # Define trucks
 # -----------------------------
-trucks = [
-    {"name": "32 ft. Single Axle", "dimensions": (9750, 2440, 2440), "payload": 16000},
-    {"name": "32 ft. Multi Axle", "dimensions": (9750, 2440, 2440), "payload": 21000},
-    {"name": "22 ft. Truck", "dimensions": (7300, 2440, 2440), "payload": 10000},
-]
+trucks = TRUCKS
 
 st.subheader("🚛 Available Trucks")
 cols = st.columns(len(trucks))
@@ -281,80 +393,51 @@ for col, truck in zip(cols, trucks):
 st.divider()
 
 # -----------------------------
-# Payload toggle
+# Cached computation shared by the panels
 # -----------------------------
-apply_payload = st.checkbox("🚦 Apply Payload Restriction", value=True)
+@st.cache_data(show_spinner=False, max_entries=64)
+def uniform_results(box, apply_payload):
+    # Trucks are scored in parallel; results come back in catalog order
+    return score_fleet({"box": box, "apply_payload": apply_payload}, trucks)
 
 
-# -----------------------------
-# Truck optimisation function
-# -----------------------------
-def calculate_optimisation(truck, box, apply_payload=True):
-    truck_len, truck_wid, truck_hei = truck["dimensions"]
-    box_len, box_wid, box_hei = box["dimensions"]
-
-    best_result = None
-
-    # Try all 6 orientations
-    for dims in set(itertools.permutations([box_len, box_wid, box_hei], 3)):
-        b_len, b_wid, b_hei = dims
-
-        # Fit counts along each axis
-        fit_len = int(truck_len // b_len)
-        fit_wid = int(truck_wid // b_wid)
-        fit_hei = int(truck_hei // b_hei)
-        boxes_by_space = fit_len * fit_wid * fit_hei
-
-        if boxes_by_space <= 0:
-            continue
-
-        # Payload limit
-        max_boxes_by_weight = None
-        if box["payload"] > 0:
-            max_boxes_by_weight = int(truck["payload"] // float(box["payload"]))
-            if apply_payload:
-                total_boxes = min(boxes_by_space, max_boxes_by_weight)
-            else:
-                total_boxes = boxes_by_space
-        else:
-            continue
-
-        # Volume utilisation
-        truck_volume = (truck_len * truck_wid * truck_hei) / 1e9  # m³
-        box_volume = (b_len * b_wid * b_hei) / 1e9  # m³
-        utilised_volume = total_boxes * box_volume
-        utilisation_percent = (utilised_volume / truck_volume) * 100 if truck_volume > 0 else 0
-
-        # Space utilisation (% of boxes that fit by space actually loaded)
-        utilisation_by_space = (total_boxes / boxes_by_space) * 100 if boxes_by_space > 0 else 0
-
-        result = {
-            "truck_name": truck["name"],
-            "truck_volume": round(truck_volume, 2),
-            "box_volume": round(box_volume, 3),
-            "boxes_by_space": boxes_by_space,
-            "max_boxes_by_weight": max_boxes_by_weight,
-            "boxes_per_truck": total_boxes,
-            "utilisation_percent": round(utilisation_percent, 1),
-            "utilisation_by_space": round(utilisation_by_space, 1),
-            "orientation": (fit_len, fit_wid, fit_hei),
-            "box_dims_used": dims,
-        }
-
-        if best_result is None or result["utilisation_percent"] > best_result["utilisation_percent"]:
-            best_result = result
-
-    return best_result
+def layer_grid(fit_len, fit_wid):
+    """One HTML element per layer instead of one Streamlit element per box."""
+    cell = ("<div style='background:#90EE90; border:1px solid #333; height:30px; "
+            "display:flex; justify-content:center; align-items:center;'>B</div>")
+    return (f"<div style='display:grid; grid-template-columns: repeat({fit_len}, 1fr); gap:2px;'>"
+            + cell * (fit_len * fit_wid) + "</div>")
 
 
 # -----------------------------
-# Optimisation Button
+# Optimisation results panel
 # -----------------------------
-if st.button("🔵 Optimise Truck Loading", type="primary", use_container_width=True):
-    st.subheader("📊 Truck Optimisation Results")
+# Fragments rerun on their own: the optimise button and the payload toggle only re-render this panel
+@st.fragment
+def optimisation_panel():
+    # Keyed so the other panels (and the sweep job) read the same setting when they next run
+    apply_payload = st.checkbox("🚦 Apply Payload Restriction", value=True, key="apply_payload")
+
+    # Optimisation Button
+    if st.button("🔵 Optimise Truck Loading", type="primary", use_container_width=True):
+        st.session_state["show_optimisation"] = True
+    if not st.session_state.get("show_optimisation"):
+        return
 
-    for truck in trucks:
-        result = calculate_optimisation(truck, box, apply_payload)
+    st.subheader("📊 Truck Optimisation Results")
+    results, timed_out = uniform_results(box, apply_payload)
+    # Trip cost and CO₂ from the lane distance and the route type mix entered on the previous page
+    lane = lane_km(route_info["Source"], route_info["Destination"], route_info.get("Stops"))
+    costs = {r["truck_name"]: r for r in with_costs([r for r in results if r and r["boxes_per_truck"]], lane, route_info["Route Distribution"])} \
+        if lane else {}
+    if not lane:
+        st.caption("🛣 Lane not in the lane table: trip cost and CO₂ are not shown.")
+
+    for truck, result in zip(trucks, results):
+        if result is None:
+            reason = "ran out of time" if truck["name"] in timed_out else "no valid arrangement"
+            st.warning(f"🚛 {truck['name']}: {reason}")
+            continue
 
         with st.expander(f"🚛 {result['truck_name']} - {result['utilisation_percent']}% filled"):
             # Summary row
@@ -366,8 +449,15 @@ if st.button("🔵 Optimise Truck Loading", type="primary", use_container_width=
             col5.markdown(f"**Boxes Loaded:** {result['boxes_per_truck']}")
 
             st.info(f"✅ Payload restriction applied: {apply_payload}")
-            total_trucks_needed = -(-box['quantity'] // result['boxes_per_truck'])  # ceil division
-            st.success(f"**Total Trucks Needed:** {total_trucks_needed}")
+            if result['boxes_per_truck'] > 0:
+                total_trucks_needed = -(-box['quantity'] // result['boxes_per_truck'])  # ceil division
+                st.success(f"**Total Trucks Needed:** {total_trucks_needed}")
+            else:
+                st.error("❌ Not a single box fits this truck (space or payload), so it cannot carry this load.")
+            if result["truck_name"] in costs:
+                cost = costs[result["truck_name"]]
+                st.info(f"💰 **Trip cost:** ₹{cost['trip_cost']:,.0f} (₹{cost['cost_per_part']} per box) · "
+                        f"🌱 **CO₂:** {cost['trip_co2_kg']} kg ({cost['co2_per_part']} kg per box) over {lane:,.0f} km")
 
             st.markdown("---")
 
@@ -394,7 +484,8 @@ if st.button("🔵 Optimise Truck Loading", type="primary", use_container_width=
                     f"**Boxes by Space:** {result['boxes_by_space']}  \n"
                     f"**Boxes by Payload:** {result['max_boxes_by_weight']}  \n"
                     f"**Boxes Loaded:** {result['boxes_per_truck']}  \n"
-                    f"**Utilisation (by volume):** {result['utilisation_percent']} %  \n"
+                    f"**Utilisation (by volume):** {result['utilisation_percent']} % "
+                    f"(gap {result['gap_percent']} % to the {result['utilisation_bound_percent']} % bound)  \n"
                     f"**Utilisation (by space):** {result['utilisation_by_space']} %"
                 )
 
@@ -418,34 +509,155 @@ if st.button("🔵 Optimise Truck Loading", type="primary", use_container_width=
                 elif total_boxes <= max_visual_boxes:
                     for layer in range(fit_hei):
                         st.markdown(f"**Layer {layer + 1}**")
-                        for row in range(fit_wid):
-                            cols = st.columns(fit_len)
-                            for col_idx in range(fit_len):
-                                with cols[col_idx]:
-                                    st.markdown(
-                                        "<div style='background:#90EE90; border:1px solid #333; height:30px; "
-                                        "display:flex; justify-content:center; align-items:center;'>B</div>",
-                                        unsafe_allow_html=True
-                                    )
+                        st.markdown(layer_grid(fit_len, fit_wid), unsafe_allow_html=True)
                     st.markdown("---")
                 else:
                     preview_len = min(fit_len, 5)
                     preview_wid = min(fit_wid, 5)
 
                     st.info(f"⚠ Too many boxes ({total_boxes}) to draw. Showing a {preview_len} × {preview_wid} preview instead.")
-
-                    for row in range(preview_wid):
-                        cols = st.columns(preview_len)
-                        for col_idx in range(preview_len):
-                            with cols[col_idx]:
-                                st.markdown(
-                                    "<div style='background:#90EE90; border:1px solid #333; height:30px; "
-                                    "display:flex; justify-content:center; align-items:center;'>B</div>",
-                                    unsafe_allow_html=True
-                                )
+                    st.markdown(layer_grid(preview_len, preview_wid), unsafe_allow_html=True)
 
             # ✅ Always show arrangement summary
             st.success(
                 f"Arrangement: {fit_len} × {fit_wid} × {fit_hei} = {total_boxes} boxes"
             )
 
+
+optimisation_panel()
+
+
+# -----------------------------
+# Mixed load plan (all box types)
+# -----------------------------
+st.divider()
+st.subheader("🧱 Mixed Load Plan")
+st.caption("Packs every box type together, keeping fragile boxes off the bottom, respecting "
+           "stacking, upright and max-load-on-top limits.")
+
+
+@st.fragment
+def mixed_plan_panel():
+    apply_payload = st.session_state.get("apply_payload", True)
+    mixed_inputs = {"items": box_data, "apply_payload": apply_payload}
+    previous_plans = st.session_state.get("mixed_plans")
+
+    if st.button("🧱 Plan Mixed Load", use_container_width=True):
+        if previous_plans and st.session_state.get("mixed_inputs") != mixed_inputs:
+            # Quantities or payload changed: repair the last plans instead of solving from scratch
+            plans = [repack(plan, truck=truck, items=box_data, apply_payload=apply_payload) if plan else None
+                     for truck, plan in zip(trucks, previous_plans)]
+            timed_out = []
+        else:
+            plans, timed_out = score_fleet(mixed_inputs, trucks, evaluator="mixed_plan")
+        st.session_state["mixed_plans"] = plans
+        st.session_state["mixed_timed_out"] = timed_out
+        st.session_state["mixed_inputs"] = copy.deepcopy(mixed_inputs)
+
+    if st.session_state.get("mixed_plans") and st.session_state.get("mixed_inputs") != mixed_inputs:
+        st.caption("🔄 Inputs or payload setting changed since these plans: press the button to re-plan.")
+    for truck, plan in zip(trucks, st.session_state.get("mixed_plans") or []):
+        if plan is None:
+            reason = "ran out of time" if truck["name"] in st.session_state.get("mixed_timed_out", []) \
+                else "no valid plan"
+            st.warning(f"🚛 {truck['name']}: {reason}")
+            continue
+        plan = plan.summary()
+        solve_note = {"repair": "re-planned from last plan", "improved": "improved"}.get(plan["solve_mode"], "full solve")
+        with st.expander(f"🚛 {plan['truck_name']} - {plan['boxes_per_truck']} boxes, "
+                         f"{plan['utilisation_percent']}% filled ({solve_note})"):
+            col1, col2, col3 = st.columns(3)
+            col1.markdown(f"**Boxes Loaded:** {plan['boxes_per_truck']}")
+            col2.markdown(f"**Volume Used:** {plan['utilisation_percent']} % "
+                          f"(gap {plan['gap_percent']} % to the {plan['utilisation_bound_percent']} % bound)")
+            col3.markdown(f"**Payload Used:** {plan['total_weight']} kg ({plan['payload_percent']} %)")
+            st.markdown("  \n".join(
+                f"*Box {i + 1} ({b['type']}):* {plan['loaded_per_item'][i]} loaded"
+                + (f", {plan['unplaced'][i]} left over" if plan["unplaced"].get(i) else "")
+                for i, b in enumerate(box_data[:len(plan["loaded_per_item"])])
+            ))
+            if len(plan["loaded_per_stop"]) > 1:
+                # Unloaded at the rear door, first drop first
+                st.markdown("**Unloading order:** " + ", ".join(
+                    f"stop {s} ({stops[s - 1] if s <= len(stops) else '?'}): {n} boxes"
+                    for s, n in plan["loaded_per_stop"].items()
+                ))
+                if plan["rehandles"]:
+                    st.warning(f"⚠ {plan['rehandles']} boxes must be moved to reach earlier drops.")
+                else:
+                    st.caption("✅ Every box is reachable at its stop without rehandling.")
+            if plan["solve_mode"] == "repair":
+                st.caption(f"Repair quality: {plan['quality'] * 100:.0f}% of a full solve's expected load")
+
+    # Trade seconds of CPU for utilisation on one truck's plan
+    if st.session_state.get("mixed_plans"):
+        with st.expander("✨ Improve a plan (multi-start annealing)"):
+            col1, col2, col3 = st.columns(3)
+            truck_name = col1.selectbox("Truck", [t["name"] for t in trucks], key="improve_truck")
+            seconds = col2.slider("Time budget (s)", 2, 120, 15, key="improve_seconds")
+            seed = col3.number_input("Seed", min_value=0, value=0, step=1, key="improve_seed")
+            if st.button("✨ Improve", use_container_width=True):
+                i = next(n for n, t in enumerate(trucks) if t["name"] == truck_name)
+                st.button("⏹ Stop improving")  # its rerun ends the search, keeping the best plan so far
+                status = st.empty()
+                # Every improved incumbent is kept at once, so stopping early loses nothing
+                for improved, stats in iter_improve(trucks[i], box_data, apply_payload,
+                                                    time_budget_s=seconds, seed=int(seed)):
+                    st.session_state["mixed_plans"][i] = improved
+                    st.session_state["improve_stats"] = stats
+                    status.info(f"⏱ {stats['elapsed_s']:.1f} s — {stats['utilisation']}% utilisation, "
+                                f"gap {stats['gap_percent']}%")
+                st.rerun(scope="fragment")
+            stats = st.session_state.get("improve_stats")
+            if stats:
+                st.caption(f"Utilisation {stats['baseline_utilisation']}% → {stats['utilisation']}% "
+                           f"(+{stats['gain_points']} points, {stats['epochs']} epochs × {stats['starts']} starts, "
+                           f"seed {stats['seed']})"
+                           + (" — reached the upper bound, stopped early" if stats.get("optimal") else ""))
+
+
+mixed_plan_panel()
+
+
+# -----------------------------
+st.divider()
+st.subheader("🛰 Background Fleet Sweep")
+st.caption("Scores every box type against every truck in a worker process. "
+           "The job keeps running if the page is refreshed; see the Jobs page for all runs.")
+
+@st.fragment
+def sweep_controls():
+    if st.button("▶️ Run fleet sweep in background", use_container_width=True):
+        st.session_state["sweep_job"] = jobs.submit(
+            "fleet_sweep",
+            {"boxes": box_data, "trucks": trucks, "apply_payload": st.session_state.get("apply_payload", True)},
+            label=f"Fleet sweep: {len(box_data)} box type(s) × {len(trucks)} trucks",
+        )
+
+
+sweep_controls()
+
+
+@st.fragment(run_every=2)
+def sweep_status():
+    job_id = st.session_state.get("sweep_job")
+    job = jobs.get(job_id) if job_id else None
+    if not job:
+        return
+
+    st.progress(job["progress"], text=f"{job['label']} — {job['status']} {job['message']}")
+    if job["status"] == "running" and st.button("⏹ Cancel sweep"):
+        jobs.cancel(job_id)
+    if job["status"] == "failed":
+        st.error(job["error"])
+
+    rows = job["result"] or job["partial"] or []
+    for row in rows:
+        best = max((r for r in row["trucks"] if r), key=lambda r: r["utilisation_percent"], default=None)
+        if best:
+            st.write(f"*{row['box']}* → {best['truck_name']}: {best['boxes_per_truck']} boxes, "
+                     f"{best['utilisation_percent']}% filled")
+
+
+sweep_status()
+
@@ -4,7 +4,16 @@
 # ==============================
 
 import streamlit as st
-import itertools
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import prefetch
+from pipeline import box_constraints, iter_truck_scores, session_key, truck_box
+from packing import TRUCKS, calculate_optimisation
+from planning import parts_per_box, trucks_needed
+from lane_cost import DEFAULT_ROUTE_MIX, RANKINGS, ROUTE_TYPES, lane_km, rank_trucks, with_costs
+from damage import simulate_damage
+from packer import normalise_item
+from results_store import get_results_store
 
 # -----------------------------
 # Page config
@@ -21,111 +30,121 @@ if "product" not in st.session_state:
 if "recommendation" not in st.session_state:
     st.session_state["recommendation"] = {}
 
-if "user_box" not in st.session_state:
-    st.session_state["user_box"] = {}
-
 # -----------------------------
 # Read user inputs safely
 # -----------------------------
 product = st.session_state.get("product", {})
 recommendation = st.session_state.get("recommendation", {})
-outer_box_raw = st.session_state.get("user_box", {})
+box = st.session_state.get("box")
 
-if not outer_box_raw:
+if box is None:
     st.warning("⚠ Please generate a recommendation on the Input page first.")
     st.stop()
 
 st.markdown(f"""
 **Recommended type:** {recommendation.get('box', {}).get('type', 'N/A')}  
-**Internal (L×W×H):** {recommendation.get('box', {}).get('internal', 'N/A')} mm
+**Internal (L×W×H):** {box.internal} mm
 """)
 
-outer_box = {
-    "name": outer_box_raw.get("name", "Outer Box"),
-    "dimensions": outer_box_raw.get("dimensions", (1100, 900, 580)),
-    "weight": outer_box_raw.get("weight", 18)
-}
-
-# -----------------------------
-# Define trucks
-# -----------------------------
-trucks = [
-    {"name": "32 ft. single axle", "dimensions": (9754, 2440, 2440), "payload": 16000},
-    {"name": "32 ft. multi axle", "dimensions": (9750, 2440, 2440), "payload": 21000},
-    {"name": "22 ft. truck", "dimensions": (7300, 2440, 2440), "payload": 10000},
-]
-
-# -----------------------------
-# Truck optimisation function
-# -----------------------------
-def calculate_optimisation(truck, box):
-    truck_len, truck_wid, truck_hei = truck["dimensions"]
-    box_len, box_wid, box_hei = box["dimensions"]
-
-    best_result = None
-
-    # Try all 6 orientations
-    for dims in set(itertools.permutations([box_len, box_wid, box_hei], 3)):
-        b_len, b_wid, b_hei = dims
+outer_box = truck_box(box)
+per_box = parts_per_box(st.session_state["part"], box) if "part" in st.session_state else 1
 
-        fit_len = truck_len // b_len
-        fit_wid = truck_wid // b_wid
-        fit_hei = truck_hei // b_hei
-        total_boxes_dim = int(fit_len * fit_wid * fit_hei)   # by dimensions
 
-        if total_boxes_dim == 0:
-            continue
-
-        # Weight constraint
-        max_boxes_by_weight = truck["payload"] // box["weight"]
-
-        # Apply restriction: whichever is smaller
-        total_boxes = min(total_boxes_dim, max_boxes_by_weight)
-
-        truck_volume = (truck_len * truck_wid * truck_hei) / 1e9  # m³
-        box_volume = (b_len * b_wid * b_hei) / 1e9  # m³
-        utilised_volume = total_boxes * box_volume
-        utilisation_percent = (utilised_volume / truck_volume) * 100 if truck_volume > 0 else 0
-
-        result = {
-            "truck_name": truck["name"],
-            "truck_dimensions": truck["dimensions"],
-            "truck_volume": round(truck_volume, 2),
-            "payload": truck["payload"],
-            "box_name": box["name"],
-            "box_dimensions": (b_len, b_wid, b_hei),
-            "box_volume": round(box_volume, 3),
-            "box_weight": box["weight"],
-            "boxes_dim_limit": total_boxes_dim,
-            "boxes_weight_limit": max_boxes_by_weight,
-            "boxes_per_truck": total_boxes,
-            "utilisation_percent": round(utilisation_percent, 1),
-            "orientation": (fit_len, fit_wid, fit_hei)
-        }
-
-        if best_result is None or result["utilisation_percent"] > best_result["utilisation_percent"]:
-            best_result = result
-
-    return best_result
+@st.cache_data(show_spinner=False, max_entries=64)
+def damage_risk(designs, route_mix, distance, samples):
+    return simulate_damage(designs, route_mix, distance, samples)
 
 # -----------------------------
 # UI: Optimisation button
 # -----------------------------
+def stream_truck_scores(run_key):
+    """Shows the best plan so far while trucks are refined; any click stops it."""
+    st.button("⏹ Stop refining")  # the rerun it triggers ends this run; the best plan is kept
+    status = st.empty()
+    results = []
+    for update in iter_truck_scores(outer_box, constraints=box_constraints(product)):
+        results = update["results"]
+        st.session_state["truck_scores"] = {"key": run_key, "results": results, "final": update["final"]}
+        if results:
+            best = max(results, key=lambda r: r["utilisation_percent"])
+            status.info(f"⏱ {update['elapsed_s'] * 1000:.0f} ms — best so far: {best['truck_name']}, "
+                        f"{best['boxes_per_truck']} boxes, {best['utilisation_percent']}% "
+                        + ("(final)" if update["final"] else "(refining…)"))
+    status.empty()
+    return results
+
+
+run_key = session_key(st.session_state)
+saved = get_results_store().load("truck_plan", run_key)
+results = None
 if st.button("🔵 Optimise Truck Loading", use_container_width=True):
+    # Prefetched on Step 1 when the inputs have not changed since
+    results = prefetch.result(st.session_state, "truck_scores", run_key)
+    if results is None:
+        results = stream_truck_scores(run_key)
+    st.session_state["truck_scores"] = {"key": run_key, "results": results, "final": True}
+    if results:
+        get_results_store().save_truck_plan(run_key, product, box, results, per_box)
+elif st.session_state.get("truck_scores", {}).get("key") == run_key:
+    # Kept across reruns, including the one a Stop click triggers
+    results = st.session_state["truck_scores"]["results"]
+    if not st.session_state["truck_scores"]["final"]:
+        st.caption("⏹ Stopped early: showing the best plan found so far.")
+elif saved and st.button(f"📂 Load the saved truck plan from {saved['created']:%d %b %Y, %H:%M}",
+                         use_container_width=True):
+    results = saved["payload"]
+    st.session_state["truck_scores"] = {"key": run_key, "results": results, "final": True}
+
+if results is not None:
     st.subheader(f"📦 Analysing for outer box: *{outer_box['name']}*")
 
-    results = []
-    for truck in trucks:
-        result = calculate_optimisation(truck, outer_box)
-        if result:
-            results.append(result)
-
     if not results:
         st.error("No valid truck arrangement found for this box.")
         st.stop()
 
-    # ✅ Pick best truck based on utilisation
-    best_truck = max(results, key=lambda r: r["utilisation_percent"])
+    # -----------------------------
+    # 💰 Lane cost & CO₂
+    # -----------------------------
+    # Route mix from the truck load page when it was filled in
+    default_mix = st.session_state.get("route_info", {}).get("Route Distribution", DEFAULT_ROUTE_MIX)
+    with st.expander("💰 Lane cost and CO₂", expanded=True):
+        known_km = lane_km(product.get("source"), product.get("destination"))
+        col1, col2 = st.columns(2)
+        distance = col1.number_input("Lane distance (km, one way)", min_value=1, value=int(known_km or 500), step=10)
+        round_trip = col2.checkbox("Empty boxes ride back (round trip)", value=True)
+        if not known_km:
+            col1.caption("Lane not in the lane table: enter the road distance.")
+        cols = st.columns(len(ROUTE_TYPES))
+        route_mix = {t: col.number_input(f"{t} (%)", 0, 100, int(default_mix.get(t, 0)), step=5, key=f"mix_{t}")
+                     for t, col in zip(ROUTE_TYPES, cols)}
+        if sum(route_mix.values()) == 0:
+            st.warning("⚠️ The route mix is empty; using the default mix.")
+            route_mix = DEFAULT_ROUTE_MIX
+        rank_by = st.radio("Rank trucks by", list(RANKINGS), index=1, horizontal=True,
+                           format_func={"utilisation": "Utilisation", "cost": "Cost per part",
+                                        "co2": "CO₂ per part"}.get)
+
+    with st.expander("🛡 Transit damage risk"):
+        st.caption("Monte Carlo over road shocks on this lane and route mix: parts hitting their insert cell "
+                   "walls, peak shocks beyond the part's fragility, and boxes crushed by the stack above.")
+        col1, col2 = st.columns(2)
+        cell_clearance = col1.number_input("Insert cell clearance (mm)", min_value=0, max_value=50, value=2)
+        samples = col2.select_slider("Samples", [100_000, 200_000, 500_000, 1_000_000], value=200_000)
+    # Constrained results carry the tallest packed column; uniform ones stack to the truck height
+    crush_limit = normalise_item(dict(outer_box, type=recommendation.get("box", {}).get("type", ""),
+                                      **box_constraints(product)))["crush_limit"]
+    risks = damage_risk(
+        [{"truck": r["truck_name"], "stack_height": r.get("stack_height", r["orientation"][2]),
+          "clearance_mm": cell_clearance,
+          "fragile": bool(product.get("fragile")), "box_weight": r["box_weight"], "crush_limit": crush_limit}
+         for r in results],
+        route_mix, distance, samples,
+    )
+
+    # ✅ Pick best truck by the chosen ranking
+    results = [dict(r, damage_percent=risk["damage_percent"]) for r, risk in zip(results, risks)]
+    results = rank_trucks(with_costs(results, distance, route_mix, per_box, round_trip), rank_by)
+    best_truck = results[0]
 
     # -----------------------------
     # 🚀 Show Recommendation
@@ -135,7 +154,16 @@ if st.button("🔵 Optimise Truck Loading", use_container_width=True):
     ✅ Best utilisation: <span style="color:green; font-weight:bold;">{best_truck['utilisation_percent']}%</span>  
     ✅ Boxes per truck: {best_truck['boxes_per_truck']}  
     ✅ Orientation: {best_truck['orientation'][0]} × {best_truck['orientation'][1]} × {best_truck['orientation'][2]}  
+    💰 Cost per part: ₹{best_truck['cost_per_part']} · 🌱 CO₂ per part: {best_truck['co2_per_part']} kg  
+    🛡 Damage risk: {best_truck['damage_percent']}% of parts per trip  
     """, unsafe_allow_html=True)
+    st.dataframe(
+        [{"Truck": r["truck_name"], "Utilisation (%)": r["utilisation_percent"], "Boxes": r["boxes_per_truck"],
+          "Load factor": r["load_factor"], "Trip cost (₹)": r["trip_cost"], "Trip CO₂ (kg)": r["trip_co2_kg"],
+          "Cost per part (₹)": r["cost_per_part"], "CO₂ per part (kg)": r["co2_per_part"],
+          "Damage risk (%)": r["damage_percent"]} for r in results],
+        use_container_width=True, hide_index=True,
+    )
 
     st.divider()
 
@@ -150,21 +178,30 @@ if st.button("🔵 Optimise Truck Loading", use_container_width=True):
             *Payload Capacity:* {result['payload']} kg  
 
             *Box Type:* {result['box_name']}  
-            *Box Dimensions:* {result['box_dimensions'][0]} × {result['box_dimensions'][1]} × {result['box_dimensions'][2]} mm  
+            *Box Dimensions:* {result['box_dims_used'][0]} × {result['box_dims_used'][1]} × {result['box_dims_used'][2]} mm  
             *Box Volume:* {result['box_volume']} m³  
             *Box Weight:* {result['box_weight']} kg  
 
-            *Boxes by Dimension Limit:* {result['boxes_dim_limit']}  
-            *Boxes by Payload Limit:* {result['boxes_weight_limit']}  
+            *Boxes by Dimension Limit:* {result['boxes_by_space']}  
+            *Boxes by Payload Limit:* {result['max_boxes_by_weight']}  
             *Final Boxes Loaded:* <span style="color:blue; font-weight:bold;">{result['boxes_per_truck']}</span>  
 
             *Truck Space Utilisation:* <span style="color:green; font-weight:bold;">{result['utilisation_percent']}%</span>  
+            *Cost per trip:* ₹{result['trip_cost']:,.0f} ({result['trip_co2_kg']} kg CO₂, load factor {result['load_factor']:.0%})  
+            *Optimality Gap:* {result['gap_percent']}% (no arrangement can exceed {result['utilisation_bound_percent']}%)  
             """, unsafe_allow_html=True)
 
-            # Total trucks needed
-            quantity = product.get("quantity", 500)
-            total_trucks_needed = -(-quantity // result['boxes_per_truck'])
-            st.write(f"*Total trucks needed:* {total_trucks_needed}")
+            if result.get("constrained") and result["boxes_per_truck"] < result["unconstrained_boxes"]:
+                st.warning(
+                    f"Fragility, stacking and orientation limits reduce the load from "
+                    f"{result['unconstrained_boxes']} to {result['boxes_per_truck']} boxes."
+                )
+
+            # Trucks for the annual demand entered on Step 1 (parts, not boxes)
+            quantity = product.get("quantity", 0)
+            total_trucks_needed = trucks_needed(quantity, per_box, result['boxes_per_truck'])
+            st.write(f"*Total trucks needed:* {total_trucks_needed} for {quantity} parts "
+                     f"({per_box} parts per box)")
 
             # Orientation & placement
             fit_len, fit_wid, fit_hei = result["orientation"]
@@ -192,12 +229,47 @@ if st.button("🔵 Optimise Truck Loading", use_container_width=True):
                 unsafe_allow_html=True
             )
 
+
+# -----------------------------
+# 🎚 What-if: box size sliders
+# -----------------------------
+st.divider()
+with st.expander("🎚 What-if: change the outer box size"):
+    st.caption("Boxes per truck for a resized box, read from the precomputed capacity tables "
+               "(run `python capacity.py build` once to create them).")
+    base_l, base_w, base_h = outer_box["dimensions"]
+    col1, col2, col3 = st.columns(3)
+    what_if_dims = (
+        col1.slider("Length (mm)", 50, 1500, int(min(1500, max(50, base_l // 5 * 5))), step=5),
+        col2.slider("Width (mm)", 50, 1500, int(min(1500, max(50, base_w // 5 * 5))), step=5),
+        col3.slider("Height (mm)", 50, 1500, int(min(1500, max(50, base_h // 5 * 5))), step=5),
+    )
+    for truck in TRUCKS:
+        what_if = calculate_optimisation(truck, dict(outer_box, dimensions=what_if_dims))
+        if what_if is None:
+            st.write(f"🚛 {truck['name']}: box does not fit")
+            continue
+        st.write(f"🚛 {truck['name']}: {what_if['boxes_per_truck']} boxes "
+                 f"({what_if['utilisation_percent']}% filled)")
+
+if st.button("📅 Plan a year of demand", use_container_width=True):
+    st.switch_page("pages/Planning.py")
+
 # ==============================
 # Truck Optimisation Page
 # ==============================
 
 import streamlit as st
-import itertools
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import prefetch
+from pipeline import box_constraints, iter_truck_scores, session_key, truck_box
+from packing import TRUCKS, calculate_optimisation
+from planning import parts_per_box, trucks_needed
+from lane_cost import DEFAULT_ROUTE_MIX, RANKINGS, ROUTE_TYPES, lane_km, rank_trucks, with_costs
+from damage import simulate_damage
+from packer import normalise_item
+from results_store import get_results_store
 
 # -----------------------------
 # Page config
@@ -214,111 +286,121 @@ if "product" not in st.session_state:
 if "recommendation" not in st.session_state:
     st.session_state["recommendation"] = {}
 
-if "user_box" not in st.session_state:
-    st.session_state["user_box"] = {}
-
 # -----------------------------
 # Read user inputs safely
 # -----------------------------
 product = st.session_state.get("product", {})
 recommendation = st.session_state.get("recommendation", {})
-outer_box_raw = st.session_state.get("user_box", {})
+box = st.session_state.get("box")
 
-if not outer_box_raw:
+if box is None:
     st.warning("⚠ Please generate a recommendation on the Input page first.")
     st.stop()
 
 st.markdown(f"""
 **Recommended type:** {recommendation.get('box', {}).get('type', 'N/A')}  
-**Internal (L×W×H):** {recommendation.get('box', {}).get('internal', 'N/A')} mm
+**Internal (L×W×H):** {box.internal} mm
 """)
 
-outer_box = {
-    "name": outer_box_raw.get("name", "Outer Box"),
-    "dimensions": outer_box_raw.get("dimensions", (1100, 900, 580)),
-    "weight": outer_box_raw.get("weight", 18)
-}
-
-# -----------------------------
-# Define trucks
-# -----------------------------
-trucks = [
-    {"name": "32 ft. single axle", "dimensions": (9754, 2440, 2440), "payload": 16000},
-    {"name": "32 ft. multi axle", "dimensions": (9750, 2440, 2440), "payload": 21000},
-    {"name": "22 ft. truck", "dimensions": (7300, 2440, 2440), "payload": 10000},
-]
-
-# -----------------------------
-# Truck optimisation function
-# -----------------------------
-def calculate_optimisation(truck, box):
-    truck_len, truck_wid, truck_hei = truck["dimensions"]
-    box_len, box_wid, box_hei = box["dimensions"]
-
-    best_result = None
-
-    # Try all 6 orientations
-    for dims in set(itertools.permutations([box_len, box_wid, box_hei], 3)):
-        b_len, b_wid, b_hei = dims
+outer_box = truck_box(box)
+per_box = parts_per_box(st.session_state["part"], box) if "part" in st.session_state else 1
 
-        fit_len = truck_len // b_len
-        fit_wid = truck_wid // b_wid
-        fit_hei = truck_hei // b_hei
-        total_boxes_dim = int(fit_len * fit_wid * fit_hei)   # by dimensions
 
-        if total_boxes_dim == 0:
-            continue
-
-        # Weight constraint
-        max_boxes_by_weight = truck["payload"] // box["weight"]
-
-        # Apply restriction: whichever is smaller
-        total_boxes = min(total_boxes_dim, max_boxes_by_weight)
-
-        truck_volume = (truck_len * truck_wid * truck_hei) / 1e9  # m³
-        box_volume = (b_len * b_wid * b_hei) / 1e9  # m³
-        utilised_volume = total_boxes * box_volume
-        utilisation_percent = (utilised_volume / truck_volume) * 100 if truck_volume > 0 else 0
-
-        result = {
-            "truck_name": truck["name"],
-            "truck_dimensions": truck["dimensions"],
-            "truck_volume": round(truck_volume, 2),
-            "payload": truck["payload"],
-            "box_name": box["name"],
-            "box_dimensions": (b_len, b_wid, b_hei),
-            "box_volume": round(box_volume, 3),
-            "box_weight": box["weight"],
-            "boxes_dim_limit": total_boxes_dim,
-            "boxes_weight_limit": max_boxes_by_weight,
-            "boxes_per_truck": total_boxes,
-            "utilisation_percent": round(utilisation_percent, 1),
-            "orientation": (fit_len, fit_wid, fit_hei)
-        }
-
-        if best_result is None or result["utilisation_percent"] > best_result["utilisation_percent"]:
-            best_result = result
-
-    return best_result
+@st.cache_data(show_spinner=False, max_entries=64)
+def damage_risk(designs, route_mix, distance, samples):
+    return simulate_damage(designs, route_mix, distance, samples)
 
 # -----------------------------
 # UI: Optimisation button
 # -----------------------------
+def stream_truck_scores(run_key):
+    """Shows the best plan so far while trucks are refined; any click stops it."""
+    st.button("⏹ Stop refining")  # the rerun it triggers ends this run; the best plan is kept
+    status = st.empty()
+    results = []
+    for update in iter_truck_scores(outer_box, constraints=box_constraints(product)):
+        results = update["results"]
+        st.session_state["truck_scores"] = {"key": run_key, "results": results, "final": update["final"]}
+        if results:
+            best = max(results, key=lambda r: r["utilisation_percent"])
+            status.info(f"⏱ {update['elapsed_s'] * 1000:.0f} ms — best so far: {best['truck_name']}, "
+                        f"{best['boxes_per_truck']} boxes, {best['utilisation_percent']}% "
+                        + ("(final)" if update["final"] else "(refining…)"))
+    status.empty()
+    return results
+
+
+run_key = session_key(st.session_state)
+saved = get_results_store().load("truck_plan", run_key)
+results = None
 if st.button("🔵 Optimise Truck Loading", use_container_width=True):
+    # Prefetched on Step 1 when the inputs have not changed since
+    results = prefetch.result(st.session_state, "truck_scores", run_key)
+    if results is None:
+        results = stream_truck_scores(run_key)
+    st.session_state["truck_scores"] = {"key": run_key, "results": results, "final": True}
+    if results:
+        get_results_store().save_truck_plan(run_key, product, box, results, per_box)
+elif st.session_state.get("truck_scores", {}).get("key") == run_key:
+    # Kept across reruns, including the one a Stop click triggers
+    results = st.session_state["truck_scores"]["results"]
+    if not st.session_state["truck_scores"]["final"]:
+        st.caption("⏹ Stopped early: showing the best plan found so far.")
+elif saved and st.button(f"📂 Load the saved truck plan from {saved['created']:%d %b %Y, %H:%M}",
+                         use_container_width=True):
+    results = saved["payload"]
+    st.session_state["truck_scores"] = {"key": run_key, "results": results, "final": True}
+
+if results is not None:
     st.subheader(f"📦 Analysing for outer box: *{outer_box['name']}*")
 
-    results = []
-    for truck in trucks:
-        result = calculate_optimisation(truck, outer_box)
-        if result:
-            results.append(result)
-
     if not results:
         st.error("No valid truck arrangement found for this box.")
         st.stop()
 
-    # ✅ Pick best truck based on utilisation
-    best_truck = max(results, key=lambda r: r["utilisation_percent"])
+    # -----------------------------
+    # 💰 Lane cost & CO₂
+    # -----------------------------
+    # Route mix from the truck load page when it was filled in
+    default_mix = st.session_state.get("route_info", {}).get("Route Distribution", DEFAULT_ROUTE_MIX)
+    with st.expander("💰 Lane cost and CO₂", expanded=True):
+        known_km = lane_km(product.get("source"), product.get("destination"))
+        col1, col2 = st.columns(2)
+        distance = col1.number_input("Lane distance (km, one way)", min_value=1, value=int(known_km or 500), step=10)
+        round_trip = col2.checkbox("Empty boxes ride back (round trip)", value=True)
+        if not known_km:
+            col1.caption("Lane not in the lane table: enter the road distance.")
+        cols = st.columns(len(ROUTE_TYPES))
+        route_mix = {t: col.number_input(f"{t} (%)", 0, 100, int(default_mix.get(t, 0)), step=5, key=f"mix_{t}")
+                     for t, col in zip(ROUTE_TYPES, cols)}
+        if sum(route_mix.values()) == 0:
+            st.warning("⚠️ The route mix is empty; using the default mix.")
+            route_mix = DEFAULT_ROUTE_MIX
+        rank_by = st.radio("Rank trucks by", list(RANKINGS), index=1, horizontal=True,
+                           format_func={"utilisation": "Utilisation", "cost": "Cost per part",
+                                        "co2": "CO₂ per part"}.get)
+
+    with st.expander("🛡 Transit damage risk"):
+        st.caption("Monte Carlo over road shocks on this lane and route mix: parts hitting their insert cell "
+                   "walls, peak shocks beyond the part's fragility, and boxes crushed by the stack above.")
+        col1, col2 = st.columns(2)
+        cell_clearance = col1.number_input("Insert cell clearance (mm)", min_value=0, max_value=50, value=2)
+        samples = col2.select_slider("Samples", [100_000, 200_000, 500_000, 1_000_000], value=200_000)
+    # Constrained results carry the tallest packed column; uniform ones stack to the truck height
+    crush_limit = normalise_item(dict(outer_box, type=recommendation.get("box", {}).get("type", ""),
+                                      **box_constraints(product)))["crush_limit"]
+    risks = damage_risk(
+        [{"truck": r["truck_name"], "stack_height": r.get("stack_height", r["orientation"][2]),
+          "clearance_mm": cell_clearance,
+          "fragile": bool(product.get("fragile")), "box_weight": r["box_weight"], "crush_limit": crush_limit}
+         for r in results],
+        route_mix, distance, samples,
+    )
+
+    # ✅ Pick best truck by the chosen ranking
+    results = [dict(r, damage_percent=risk["damage_percent"]) for r, risk in zip(results, risks)]
+    results = rank_trucks(with_costs(results, distance, route_mix, per_box, round_trip), rank_by)
+    best_truck = results[0]
 
     # -----------------------------
     # 🚀 Show Recommendation
@@ -328,7 +410,16 @@ if st.button("🔵 Optimise Truck Loading", use_container_width=True):
     ✅ Best utilisation: <span style="color:green; font-weight:bold;">{best_truck['utilisation_percent']}%</span>  
     ✅ Boxes per truck: {best_truck['boxes_per_truck']}  
     ✅ Orientation: {best_truck['orientation'][0]} × {best_truck['orientation'][1]} × {best_truck['orientation'][2]}  
+    💰 Cost per part: ₹{best_truck['cost_per_part']} · 🌱 CO₂ per part: {best_truck['co2_per_part']} kg  
+    🛡 Damage risk: {best_truck['damage_percent']}% of parts per trip  
     """, unsafe_allow_html=True)
+    st.dataframe(
+        [{"Truck": r["truck_name"], "Utilisation (%)": r["utilisation_percent"], "Boxes": r["boxes_per_truck"],
+          "Load factor": r["load_factor"], "Trip cost (₹)": r["trip_cost"], "Trip CO₂ (kg)": r["trip_co2_kg"],
+          "Cost per part (₹)": r["cost_per_part"], "CO₂ per part (kg)": r["co2_per_part"],
+          "Damage risk (%)": r["damage_percent"]} for r in results],
+        use_container_width=True, hide_index=True,
+    )
 
     st.divider()
 
@@ -343,21 +434,30 @@ if st.button("🔵 Optimise Truck Loading", use_container_width=True):
             *Payload Capacity:* {result['payload']} kg  
 
             *Box Type:* {result['box_name']}  
-            *Box Dimensions:* {result['box_dimensions'][0]} × {result['box_dimensions'][1]} × {result['box_dimensions'][2]} mm  
+            *Box Dimensions:* {result['box_dims_used'][0]} × {result['box_dims_used'][1]} × {result['box_dims_used'][2]} mm  
             *Box Volume:* {result['box_volume']} m³  
             *Box Weight:* {result['box_weight']} kg  
 
-            *Boxes by Dimension Limit:* {result['boxes_dim_limit']}  
-            *Boxes by Payload Limit:* {result['boxes_weight_limit']}  
+            *Boxes by Dimension Limit:* {result['boxes_by_space']}  
+            *Boxes by Payload Limit:* {result['max_boxes_by_weight']}  
             *Final Boxes Loaded:* <span style="color:blue; font-weight:bold;">{result['boxes_per_truck']}</span>  
 
             *Truck Space Utilisation:* <span style="color:green; font-weight:bold;">{result['utilisation_percent']}%</span>  
+            *Cost per trip:* ₹{result['trip_cost']:,.0f} ({result['trip_co2_kg']} kg CO₂, load factor {result['load_factor']:.0%})  
+            *Optimality Gap:* {result['gap_percent']}% (no arrangement can exceed {result['utilisation_bound_percent']}%)  
             """, unsafe_allow_html=True)
 
-            # Total trucks needed
-            quantity = product.get("quantity", 500)
-            total_trucks_needed = -(-quantity // result['boxes_per_truck'])
-            st.write(f"*Total trucks needed:* {total_trucks_needed}")
+            if result.get("constrained") and result["boxes_per_truck"] < result["unconstrained_boxes"]:
+                st.warning(
+                    f"Fragility, stacking and orientation limits reduce the load from "
+                    f"{result['unconstrained_boxes']} to {result['boxes_per_truck']} boxes."
+                )
+
+            # Trucks for the annual demand entered on Step 1 (parts, not boxes)
+            quantity = product.get("quantity", 0)
+            total_trucks_needed = trucks_needed(quantity, per_box, result['boxes_per_truck'])
+            st.write(f"*Total trucks needed:* {total_trucks_needed} for {quantity} parts "
+                     f"({per_box} parts per box)")
 
             # Orientation & placement
             fit_len, fit_wid, fit_hei = result["orientation"]
@@ -385,3 +485,29 @@ if st.button("🔵 Optimise Truck Loading", use_container_width=True):
                 unsafe_allow_html=True
             )
 
+
+# -----------------------------
+# 🎚 What-if: box size sliders
+# -----------------------------
+st.divider()
+with st.expander("🎚 What-if: change the outer box size"):
+    st.caption("Boxes per truck for a resized box, read from the precomputed capacity tables "
+               "(run `python capacity.py build` once to create them).")
+    base_l, base_w, base_h = outer_box["dimensions"]
+    col1, col2, col3 = st.columns(3)
+    what_if_dims = (
+        col1.slider("Length (mm)", 50, 1500, int(min(1500, max(50, base_l // 5 * 5))), step=5),
+        col2.slider("Width (mm)", 50, 1500, int(min(1500, max(50, base_w // 5 * 5))), step=5),
+        col3.slider("Height (mm)", 50, 1500, int(min(1500, max(50, base_h // 5 * 5))), step=5),
+    )
+    for truck in TRUCKS:
+        what_if = calculate_optimisation(truck, dict(outer_box, dimensions=what_if_dims))
+        if what_if is None:
+            st.write(f"🚛 {truck['name']}: box does not fit")
+            continue
+        st.write(f"🚛 {truck['name']}: {what_if['boxes_per_truck']} boxes "
+                 f"({what_if['utilisation_percent']}% filled)")
+
+if st.button("📅 Plan a year of demand", use_container_width=True):
+    st.switch_page("pages/Planning.py")
+
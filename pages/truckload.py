@@ -18,16 +18,33 @@ for i in range(box_count):
     width = st.number_input("External Width (mm)", min_value=100, key=f"wid_{i}")
     height = st.number_input("External Height (mm)", min_value=100, key=f"hei_{i}")
     payload = st.number_input("Max Payload (kg)", min_value=100, key=f"pay_{i}")
+    c1, c2, c3 = st.columns(3)
+    fragile = c1.checkbox("Fragile", key=f"frag_{i}")
+    stacking = c2.checkbox("Stackable", value=True, key=f"stack_{i}")
+    upright = c3.checkbox("Keep upright", key=f"up_{i}")
+    crush_limit = st.number_input("Max load on top (kg, 0 = box type default)", min_value=0, value=0, key=f"crush_{i}")
+    stop = st.number_input("Drop stop (1 = first drop)", min_value=1, max_value=5, value=1, key=f"stop_{i}")
 
     box_data.append({
         "type": box_type,
         "quantity": quantity,
         "dimensions": (length, width, height),
-        "payload": payload
+        "payload": payload,
+        "fragile": fragile,
+        "stacking": stacking,
+        "upright": upright,
+        "crush_limit": crush_limit,
+        "stop": stop
     })
 
 source = st.selectbox("Source City", ["Mumbai", "Delhi", "Chennai", "Hyderabad"])
 destination = st.selectbox("Destination City", ["Bangalore", "Kolkata", "Pune", "Ahmedabad"])
+# Milk runs: drops before the final destination, in delivery order
+drops = st.multiselect("Drops before the destination (in delivery order)",
+                       [c for c in ["Mumbai", "Delhi", "Chennai", "Hyderabad", "Bangalore", "Kolkata", "Pune", "Ahmedabad"]
+                        if c not in (source, destination)], max_selections=4)
+stops = drops + [destination]
+st.caption("  →  ".join(f"{n}. {city}" for n, city in enumerate(stops, 1)))
 
 route_types = {
     "Highway": st.slider("Highway (%)", 0, 100, 50),
@@ -42,14 +59,21 @@ if total != 100:
 # -------------------------------
 # Save & Redirect
 # -------------------------------
+too_late = sorted({b["stop"] for b in box_data if b["stop"] > len(stops)})
+if too_late:
+    st.warning(f"⚠️ Boxes are assigned to drop stop(s) {too_late}, but the route has only {len(stops)} stop(s).")
+
 if st.button("Save"):
-    if total == 100:
+    if too_late:
+        st.error("❌ Please add the missing drops or change the boxes' drop stops.")
+    elif total == 100:
         st.success("✅ Route details saved successfully.")
 
         st.session_state["box_data"] = box_data
         st.session_state["route_info"] = {
             "Source": source,
             "Destination": destination,
+            "Stops": stops,
             "Route Distribution": route_types,
         }
 
@@ -78,16 +102,33 @@ for i in range(box_count):
     width = st.number_input("External Width (mm)", min_value=100, key=f"wid_{i}")
     height = st.number_input("External Height (mm)", min_value=100, key=f"hei_{i}")
     payload = st.number_input("Max Payload (kg)", min_value=100, key=f"pay_{i}")
+    c1, c2, c3 = st.columns(3)
+    fragile = c1.checkbox("Fragile", key=f"frag_{i}")
+    stacking = c2.checkbox("Stackable", value=True, key=f"stack_{i}")
+    upright = c3.checkbox("Keep upright", key=f"up_{i}")
+    crush_limit = st.number_input("Max load on top (kg, 0 = box type default)", min_value=0, value=0, key=f"crush_{i}")
+    stop = st.number_input("Drop stop (1 = first drop)", min_value=1, max_value=5, value=1, key=f"stop_{i}")
 
     box_data.append({
         "type": box_type,
         "quantity": quantity,
         "dimensions": (length, width, height),
-        "payload": payload
+        "payload": payload,
+        "fragile": fragile,
+        "stacking": stacking,
+        "upright": upright,
+        "crush_limit": crush_limit,
+        "stop": stop
     })
 
 source = st.selectbox("Source City", ["Mumbai", "Delhi", "Chennai", "Hyderabad"])
 destination = st.selectbox("Destination City", ["Bangalore", "Kolkata", "Pune", "Ahmedabad"])
+# Milk runs: drops before the final destination, in delivery order
+drops = st.multiselect("Drops before the destination (in delivery order)",
+                       [c for c in ["Mumbai", "Delhi", "Chennai", "Hyderabad", "Bangalore", "Kolkata", "Pune", "Ahmedabad"]
+                        if c not in (source, destination)], max_selections=4)
+stops = drops + [destination]
+st.caption("  →  ".join(f"{n}. {city}" for n, city in enumerate(stops, 1)))
 
 route_types = {
     "Highway": st.slider("Highway (%)", 0, 100, 50),
@@ -102,14 +143,21 @@ if total != 100:
 # -------------------------------
 # Save & Redirect
 # -------------------------------
+too_late = sorted({b["stop"] for b in box_data if b["stop"] > len(stops)})
+if too_late:
+    st.warning(f"⚠️ Boxes are assigned to drop stop(s) {too_late}, but the route has only {len(stops)} stop(s).")
+
 if st.button("Save"):
-    if total == 100:
+    if too_late:
+        st.error("❌ Please add the missing drops or change the boxes' drop stops.")
+    elif total == 100:
         st.success("✅ Route details saved successfully.")
 
         st.session_state["box_data"] = box_data
         st.session_state["route_info"] = {
             "Source": source,
             "Destination": destination,
+            "Stops": stops,
             "Route Distribution": route_types,
         }
 
@@ -0,0 +1,16 @@
+# paths.py
+
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Local state shared by every Streamlit worker process (caches, job queue, results)
+CACHE_DIR = os.getenv("PACKAGING_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+
+
+def cache_path(*parts):
+    """Path under CACHE_DIR, creating the parent directory."""
+    path = os.path.join(CACHE_DIR, *parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
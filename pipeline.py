@@ -0,0 +1,149 @@
+# pipeline.py
+
+import time
+
+from fleet import evaluate, iter_fleet, score_fleet
+from geometry import DEFAULT_BOX
+from packer import normalise_item
+from packing import STANDING_AXIS, TRUCKS
+import prefetch
+
+
+def session_key(state):
+    """Fingerprint of everything the Insert Design / Visualisation / truck pages read."""
+    return prefetch.fingerprint(
+        state.get("product", {}),
+        state.get("box", DEFAULT_BOX),
+    )
+
+
+def allowed_orientation(orientation_analysis):
+    """First orientation the analysis marked as feasible."""
+    return next(
+        (k for k, v in orientation_analysis["orientations"].items() if v == "✅"),
+        "length-standing"
+    )
+
+
+def feasible_orientations(orientation_analysis):
+    """Every orientation the analysis marked as feasible, for mixed insert layers."""
+    return [k for k, v in orientation_analysis["orientations"].items() if v == "✅"]
+
+
+def truck_box(box):
+    """Outer box dict in the shape calculate_optimisation expects."""
+    return (box or DEFAULT_BOX).as_item()
+
+
+def box_constraints(product):
+    """Packing constraints the Step 1 part details impose on its outer box."""
+    return {
+        "fragile": bool(product.get("fragile", False)),
+        "stacking": bool(product.get("stacking", True)),
+        # Any orientation restriction on the part means the box must stay upright
+        "upright": bool(product.get("orientation")),
+    }
+
+
+def score_trucks(box, trucks=None, apply_payload=True, constraints=None):
+    """Truck results in catalog order, skipping trucks with no valid arrangement."""
+    shared = {"box": box, "apply_payload": apply_payload}
+    if constraints:
+        shared["constraints"] = constraints
+    results, _ = score_fleet(shared, trucks, evaluator="constrained" if constraints else "uniform")
+    return [r for r in results if r]
+
+
+def uniform_is_final(result, box, constraints):
+    """True when a uniform grid already meets its bound and breaks none of the box's constraints."""
+    if result is None or result["boxes_per_truck"] < result["boxes_bound"]:
+        return False
+    item = normalise_item(dict(box, **(constraints or {})))
+    if item["upright"] and result["box_dims_used"][2] != item["dimensions"][2]:
+        return False
+    # The bottom box of each stack carries every box above it
+    return (result["orientation"][2] - 1) * item["weight"] <= item["crush_limit"]
+
+
+def iter_truck_scores(box, trucks=None, apply_payload=True, constraints=None):
+    """Anytime truck scoring: yields {"results", "elapsed_s", "final"} snapshots.
+
+    The first snapshot is the uniform grid for every truck (microseconds, from
+    the result cache or the capacity tables where possible); constraint-aware results replace them
+    truck by truck as the fleet pool finishes them. Trucks whose grid already
+    meets its bound within the constraints are final straight away.
+    """
+    start = time.monotonic()
+    trucks = list(trucks or TRUCKS)
+    results = [evaluate("uniform", t, {"box": box, "apply_payload": apply_payload}) for t in trucks]
+    if not constraints:
+        yield {"results": [r for r in results if r], "elapsed_s": time.monotonic() - start, "final": True}
+        return
+    yield {"results": [r for r in results if r], "elapsed_s": time.monotonic() - start, "final": False}
+
+    # Trucks whose uniform grid is provably optimal and feasible need no refinement
+    refine = [i for i, r in enumerate(results) if r and not uniform_is_final(r, box, constraints)]
+    for i, r in enumerate(results):
+        if r and i not in refine:
+            r.update(constrained=True, unconstrained_boxes=r["boxes_per_truck"])
+    if not refine:
+        yield {"results": [r for r in results if r], "elapsed_s": time.monotonic() - start, "final": True}
+        return
+
+    shared = {"box": box, "apply_payload": apply_payload, "constraints": constraints}
+    pending = len(refine)
+    for j, result, _ in iter_fleet(shared, [trucks[i] for i in refine], evaluator="constrained"):
+        results[refine[j]] = result
+        pending -= 1
+        yield {"results": [r for r in results if r], "elapsed_s": time.monotonic() - start,
+               "final": pending == 0}
+
+
+def downstream_stages(llm, product, box):
+    """Stages the next pages would otherwise compute on arrival."""
+    box_l, box_w, box_h = box.internal
+
+    def orientation(_):
+        return llm.analyze_orientations(product["L"], product["W"], product["H"], product["weight"])
+
+    def insert_design(deps):
+        return llm.recommend_insert_matrix(
+            part_length=product["L"],
+            part_width=product["W"],
+            part_height=product["H"],
+            weight=product["weight"],
+            orientation=allowed_orientation(deps["orientation"]),
+            outer_box_length=box_l,
+            outer_box_width=box_w,
+            outer_box_height=box_h,
+            allowed_orientations=feasible_orientations(deps["orientation"])
+        )
+
+    def insert_matrix(_):
+        return llm.recommend_insert_matrix(
+            part_length=product["L"],
+            part_width=product["W"],
+            part_height=product["H"],
+            weight=product["weight"],
+            orientation=product["orientation"][0] if product.get("orientation") else "length-standing",
+            outer_box_length=box_l,
+            outer_box_width=box_w,
+            outer_box_height=box_h,
+            allowed_orientations=product.get("orientation") or list(STANDING_AXIS)
+        )
+
+    def truck_scores(_):
+        return score_trucks(truck_box(box), constraints=box_constraints(product))
+
+    return [
+        ("orientation", orientation, []),
+        ("insert_design", insert_design, ["orientation"]),
+        ("insert_matrix", insert_matrix, []),
+        ("truck_scores", truck_scores, []),
+    ]
+
+
+def start_prefetch(state, llm):
+    """Kicks off downstream stages for the current Step 1 result."""
+    stages = downstream_stages(llm, state["product"], state.get("box", DEFAULT_BOX))
+    return prefetch.start(state, session_key(state), stages)
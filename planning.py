@@ -0,0 +1,192 @@
+# planning.py
+
+import os
+import math
+import itertools
+
+import numpy as np
+
+from layers import plan_layers
+from packing import TRUCKS
+
+PERIODS_PER_YEAR = {"weekly": 52, "monthly": 12}
+DAYS_PER_PERIOD = {"weekly": 7, "monthly": 365 / 12}
+# Days a returnable box is away from the source: outbound, unloading, empty return
+DEFAULT_CYCLE_DAYS = float(os.getenv("PLANNING_CYCLE_DAYS", 14))
+# Extra boxes on top of the peak number in circulation
+SAFETY_STOCK = float(os.getenv("PLANNING_SAFETY_STOCK", 0.10))
+
+
+# -----------------------------
+# Demand series
+# -----------------------------
+def demand_profile(annual_quantity, granularity="monthly", seasonality=0.0, peak_period=0):
+    """Whole-part demand per period summing to `annual_quantity`.
+
+    `seasonality` is the cosine swing around the mean (0.3 = ±30 %), highest
+    in `peak_period`; rounding remainders go to the largest periods.
+    """
+    periods = PERIODS_PER_YEAR[granularity]
+    t = np.arange(periods)
+    weights = 1 + seasonality * np.cos(2 * np.pi * (t - peak_period) / periods)
+    exact = annual_quantity * weights / weights.sum()
+    series = np.floor(exact).astype(np.int64)
+    short = int(annual_quantity - series.sum())
+    if short:
+        series[np.argsort(exact - series)[::-1][:short]] += 1
+    return series
+
+
+def demand_matrix(rows, granularity="monthly"):
+    """(parts, lanes, matrix) from rows of {"part", "lane", "period", "quantity"}.
+
+    Periods are 1-based; one matrix row per (part, lane) pair in first-seen
+    order, so the same part may run on several lanes.
+    """
+    periods = PERIODS_PER_YEAR[granularity]
+    keys, lanes = {}, {}
+    for row in rows:
+        key = (str(row["part"]), str(row["lane"]))
+        keys.setdefault(key, len(keys))
+        lanes.setdefault(key[1], len(lanes))
+
+    matrix = np.zeros((len(keys), periods))
+    index = np.fromiter((keys[(str(r["part"]), str(r["lane"]))] for r in rows), dtype=np.int64, count=len(rows))
+    period = np.fromiter((int(r["period"]) - 1 for r in rows), dtype=np.int64, count=len(rows))
+    quantity = np.fromiter((float(r["quantity"]) for r in rows), dtype=float, count=len(rows))
+    if len(rows) and (period.min() < 0 or period.max() >= periods):
+        raise ValueError(f"❌ Periods must run from 1 to {periods} for {granularity} demand")
+    np.add.at(matrix, (index, period), quantity)
+
+    parts = [{"part": part, "lane": lane, "lane_index": lanes[lane]} for part, lane in keys]
+    return parts, list(lanes), matrix
+
+
+def parts_per_box(part, box):
+    """Parts one outer box carries with its insert layers (geometry.Part, geometry.Box)."""
+    return plan_layers(part.dims, box.internal, part.orientation)["parts_per_box"]
+
+
+# -----------------------------
+# Vectorised year plan
+# -----------------------------
+def _boxes_per_truck(box_dims, box_weight, trucks, apply_payload):
+    """(trucks, parts) best uniform-grid loads, every orientation of every box at once."""
+    truck_dims = np.array([t["dimensions"] for t in trucks], dtype=float)
+    rotations = box_dims[:, list(itertools.permutations(range(3)))]  # (parts, 6, 3)
+    fits = np.floor(truck_dims[:, None, None, :] / rotations[None]).prod(axis=-1).max(axis=-1)
+    if apply_payload:
+        payload = np.array([t["payload"] for t in trucks], dtype=float)
+        with np.errstate(divide="ignore"):
+            by_weight = np.where(box_weight > 0, np.floor(payload[:, None] / box_weight[None]), np.inf)
+        fits = np.minimum(fits, by_weight)
+    return fits
+
+
+def _by_lane(values, order, starts):
+    """Sums (..., parts, periods) values over the parts of each lane."""
+    return np.add.reduceat(values[..., order, :], starts, axis=-2)
+
+
+def _rolling(values, window):
+    """Sum over the last `window[p]` periods for every row; the year repeats."""
+    periods = values.shape[1]
+    reach = int(min(window.max(), periods))
+    wrapped = np.concatenate([values[:, periods - reach:], values], axis=1)
+    cum = np.concatenate([np.zeros((len(values), 1)), np.cumsum(wrapped, axis=1)], axis=1)
+    end = np.arange(periods) + reach + 1
+    start = end[None, :] - np.minimum(window, periods)[:, None]
+    return cum[:, end] - np.take_along_axis(cum, start, axis=1)
+
+
+def plan_year(demand, parts_per_box, box_dims, box_weight, lane_index, trucks=None, granularity="monthly",
+              cycle_days=DEFAULT_CYCLE_DAYS, safety_stock=SAFETY_STOCK, apply_payload=True):
+    """Trucks per lane and period, returnable box pool and utilisation for a year.
+
+    `demand` is parts per period (parts × periods); the other arrays are per
+    part row. Every lane gets the truck type needing the fewest trucks over
+    the year (the smaller truck on ties), with box types sharing trucks by
+    their share of a full load. `cycle_days` (scalar or per lane) is how long
+    a box is away before it can be refilled. Parts with no parts per box
+    (the part does not fit its box) ship nothing and are listed in "no_box".
+    """
+    trucks = list(trucks or TRUCKS)
+    demand = np.asarray(demand, dtype=float)
+    ppb = np.asarray(parts_per_box, dtype=float)
+    no_box = ~(ppb >= 1)  # 0 or NaN
+    ppb = np.where(no_box, 1.0, ppb)
+    box_dims = np.asarray(box_dims, dtype=float).reshape(-1, 3)
+    box_weight = np.asarray(box_weight, dtype=float)
+    lane_index = np.asarray(lane_index, dtype=np.int64)
+
+    boxes = np.where(no_box[:, None], 0.0, np.ceil(demand / ppb[:, None]))
+    per_truck = _boxes_per_truck(box_dims, box_weight, trucks, apply_payload)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Share of a full truck; infinite where the box does not fit that truck type
+        share = np.where(boxes[None] > 0, boxes[None] / per_truck[:, :, None], 0.0)
+    # Parts no truck can carry are reported and left out of the lane totals
+    unplannable = np.flatnonzero((per_truck == 0).all(axis=0) & (boxes.sum(axis=1) > 0))
+    share[:, unplannable] = 0
+
+    # Lanes as contiguous runs of parts
+    order = np.argsort(lane_index, kind="stable")
+    lanes, starts = np.unique(lane_index[order], return_index=True)
+    trucks_by_type = np.ceil(_by_lane(share, order, starts) - 1e-9)  # (types, lanes, periods)
+
+    annual = trucks_by_type.sum(axis=2)
+    truck_volume = np.array([np.prod(t["dimensions"]) for t in trucks], dtype=float) / 1e9
+    choice = np.lexsort((np.broadcast_to(truck_volume[:, None], annual.shape), annual), axis=0)[0]
+    lane_trucks = trucks_by_type[choice, np.arange(len(lanes))]
+    lane_trucks[~np.isfinite(lane_trucks)] = 0
+
+    box_volume = box_dims.prod(axis=1) / 1e9
+    lane_volume = _by_lane(boxes * box_volume[:, None], order, starts)
+    lane_weight = _by_lane(boxes * box_weight[:, None], order, starts)
+    capacity = lane_trucks * truck_volume[choice][:, None]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        utilisation = np.where(capacity > 0, lane_volume / capacity * 100, 0.0)
+        period_utilisation = np.where(capacity.sum(axis=0) > 0,
+                                      lane_volume.sum(axis=0) / capacity.sum(axis=0) * 100, 0.0)
+
+    # Boxes in circulation: everything shipped within the last cycle
+    cycle = np.asarray(cycle_days, dtype=float)
+    cycle = np.full(len(lane_index), float(cycle)) if cycle.ndim == 0 else cycle[lane_index]
+    window = np.maximum(1, np.ceil(cycle / DAYS_PER_PERIOD[granularity])).astype(np.int64)
+    in_use = _rolling(boxes, window)
+    pool = np.ceil(in_use.max(axis=1) * (1 + safety_stock)).astype(np.int64)
+
+    total_capacity = capacity.sum()
+    return {
+        "granularity": granularity,
+        "boxes": boxes,
+        "pool": pool,
+        "in_use": in_use,
+        "lanes": lanes,
+        "lane_truck": [trucks[k]["name"] for k in choice],
+        "lane_trucks": lane_trucks,
+        "lane_utilisation": utilisation,
+        "lane_payload_kg": lane_weight,
+        "period_trucks": lane_trucks.sum(axis=0),
+        "period_utilisation": period_utilisation,
+        "unplannable": unplannable,
+        "no_box": np.flatnonzero(no_box & (demand.sum(axis=1) > 0)),
+        "annual_trucks": int(lane_trucks.sum()),
+        "annual_boxes": int(boxes.sum()),
+        "pool_size": int(pool.sum()),
+        "utilisation_percent": round(float(lane_volume.sum() / total_capacity * 100), 1) if total_capacity else 0.0,
+    }
+
+
+def plan_part(part, box, annual_quantity, granularity="monthly", seasonality=0.0, peak_period=0,
+              trucks=None, cycle_days=DEFAULT_CYCLE_DAYS, apply_payload=True):
+    """Year plan for the Step 1 part and its outer box on a single lane."""
+    demand = demand_profile(annual_quantity, granularity, seasonality, peak_period)[None, :]
+    return plan_year(demand, [parts_per_box(part, box)], [box.external], [box.weight], [0], trucks,
+                     granularity, cycle_days, apply_payload=apply_payload)
+
+
+def trucks_needed(quantity, parts_per_box, boxes_per_truck):
+    """Trucks for a one-off shipment of `quantity` parts."""
+    if not boxes_per_truck:
+        return 0
+    return math.ceil(math.ceil(quantity / max(1, parts_per_box)) / boxes_per_truck)
@@ -0,0 +1,107 @@
+# prefetch.py
+
+import os
+import json
+import hashlib
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    """Shared worker threads, kept alive across reruns and sessions."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=int(os.getenv("PREFETCH_WORKERS", 4)),
+                thread_name_prefix="prefetch",
+            )
+        return _executor
+
+
+def fingerprint(*inputs):
+    """Stable key for the inputs a prefetched stage was computed from."""
+    raw = json.dumps(inputs, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def cancel(store):
+    """Cancels any in-flight prefetch recorded in the session store."""
+    entry = store.get("prefetch")
+    if not entry:
+        return
+    entry["cancel"].set()
+    for future in entry["futures"].values():
+        future.cancel()
+
+
+def start(store, key, stages):
+    """Starts background stages for `key`, replacing work for older inputs.
+
+    `stages` is a list of (name, fn, deps): fn receives a dict with the results
+    of the named deps and is submitted once they have all finished.
+    """
+    entry = store.get("prefetch")
+    if entry and entry["key"] == key:
+        return entry
+    cancel(store)
+
+    cancel_event = threading.Event()
+    futures = {name: Future() for name, _, _ in stages}
+    entry = {"key": key, "futures": futures, "cancel": cancel_event}
+    store["prefetch"] = entry
+    executor = _get_executor()
+    submitted = set()
+    submit_lock = threading.Lock()
+
+    def run(name, fn, deps):
+        future = futures[name]
+        if cancel_event.is_set() or not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn({d: futures[d].result() for d in deps}))
+        except Exception as e:
+            future.set_exception(e)
+
+    def schedule(name, fn, deps):
+        pending = [futures[d] for d in deps]
+        if any(f.cancelled() or (f.done() and f.exception()) for f in pending):
+            futures[name].cancel()
+            return
+        if all(f.done() for f in pending):
+            with submit_lock:
+                if name in submitted:
+                    return
+                submitted.add(name)
+            executor.submit(run, name, fn, deps)
+
+    for name, fn, deps in stages:
+        if not deps:
+            executor.submit(run, name, fn, deps)
+        else:
+            # Re-check readiness each time one of the deps completes
+            for d in deps:
+                futures[d].add_done_callback(lambda _f, n=name, fn=fn, deps=deps: schedule(n, fn, deps))
+
+    return entry
+
+
+def result(store, name, key, timeout=None):
+    """Prefetched result for `name` if it was computed for `key`, else None.
+
+    A stage that is still running is awaited (up to `timeout`), which is never
+    slower than starting it again.
+    """
+    entry = store.get("prefetch")
+    if not entry or entry["key"] != key:
+        return None
+    future = entry["futures"].get(name)
+    if future is None or future.cancelled():
+        return None
+    try:
+        return future.result(timeout=timeout)
+    except Exception:
+        return None
@@ -0,0 +1,184 @@
+# results_cache.py
+
+import os
+import copy
+import json
+import time
+import pickle
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+from packer import normalise_item
+from paths import cache_path
+
+# Bump whenever calculate_optimisation or the packer can return a different result
+SOLVER_VERSION = "2026.10-2"
+
+MEMORY_ENTRIES = int(os.getenv("RESULT_CACHE_ENTRIES", 4096))
+DISK_ENTRIES = int(os.getenv("RESULT_CACHE_DISK_ENTRIES", 200_000))
+DB_PATH = os.getenv("RESULT_CACHE_DB_PATH") or cache_path("results.sqlite")
+# Disk eviction runs once per this many writes
+EVICT_EVERY = 256
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed);
+"""
+
+
+# -----------------------------
+# Canonical key
+# -----------------------------
+def canonical_key(kind, truck, box, apply_payload=True, constraints=None):
+    """Key shared by every rotation of the same box on the same truck geometry.
+
+    Uniform results only depend on the box size and weight; constrained results
+    also on the upright / stacking / fragility flags and the crush limit.
+    """
+    item = normalise_item(dict(box, **(constraints or {})))
+    l, w, h = (int(d) for d in item["dimensions"])
+    if kind != "uniform" and item["upright"]:
+        # Height stays vertical, so only the footprint may be reordered
+        dims, orientations = sorted((l, w), reverse=True) + [h], "upright"
+    else:
+        dims, orientations = sorted((l, w, h), reverse=True), "any"
+    key = {
+        "kind": kind,
+        "box": dims,
+        "orientations": orientations,
+        "weight": item["weight"],
+        "truck": [int(d) for d in truck["dimensions"]],
+        "payload": float(truck["payload"]),
+        "apply_payload": bool(apply_payload),
+        "solver": SOLVER_VERSION,
+    }
+    if kind != "uniform":
+        key.update(fragile=item["fragile"], stacking=item["stacking"], crush_limit=item["crush_limit"])
+    return hashlib.sha1(json.dumps(key, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+# -----------------------------
+# Two-tier cache
+# -----------------------------
+class ResultCache:
+    """In-process LRU in front of an SQLite table shared by every worker process."""
+
+    def __init__(self, path=None, memory_entries=MEMORY_ENTRIES, disk_entries=DISK_ENTRIES):
+        self.path = path or DB_PATH
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._conn = None
+        self._writes = 0
+        self._stats = {"lookups": 0, "memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+    def _db(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+        return self._conn
+
+    def _remember(self, key, value):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        """Cached value (a private copy) or None."""
+        with self._lock:
+            self._stats["lookups"] += 1
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return copy.deepcopy(self._memory[key])
+            try:
+                db = self._db()
+                row = db.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    db.execute("UPDATE results SET accessed = ? WHERE key = ?", (time.time(), key))
+            except sqlite3.Error:
+                row = None
+            if row is None:
+                self._stats["misses"] += 1
+                return None
+            value = pickle.loads(row[0])
+            self._remember(key, value)
+            self._stats["disk_hits"] += 1
+            return copy.deepcopy(value)
+
+    def put(self, key, value):
+        with self._lock:
+            value = copy.deepcopy(value)
+            self._remember(key, value)
+            try:
+                db = self._db()
+                db.execute(
+                    "INSERT OR REPLACE INTO results (key, value, accessed) VALUES (?, ?, ?)",
+                    (key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), time.time()),
+                )
+                self._writes += 1
+                if self._writes % EVICT_EVERY == 0:
+                    self._evict(db)
+            except sqlite3.Error:
+                # A busy or read-only disk tier only costs a re-solve later
+                pass
+
+    def _evict(self, db):
+        """Drops the least recently used rows beyond disk_entries."""
+        (count,) = db.execute("SELECT COUNT(*) FROM results").fetchone()
+        if count > self.disk_entries:
+            db.execute(
+                "DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY accessed LIMIT ?)",
+                (count - self.disk_entries,),
+            )
+
+    def metrics(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+        hits = stats["memory_hits"] + stats["disk_hits"]
+        stats["hit_rate"] = round(hits / stats["lookups"], 3) if stats["lookups"] else 0.0
+        return stats
+
+
+_shared_cache = None
+_shared_lock = threading.Lock()
+
+
+def get_result_cache():
+    """Process-wide result cache."""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = ResultCache()
+        return _shared_cache
+
+
+# -----------------------------
+# Truck results
+# -----------------------------
+def lookup(kind, truck, box, apply_payload=True, constraints=None):
+    """Cached truck result relabelled for this truck and box, or None."""
+    result = get_result_cache().get(canonical_key(kind, truck, box, apply_payload, constraints))
+    if result is None:
+        return None
+    result["truck_name"] = truck["name"]
+    result["truck_dimensions"] = truck["dimensions"]
+    result["box_name"] = box.get("name", box.get("type", "Outer Box"))
+    result["cached"] = True
+    return result
+
+
+def store(kind, truck, box, apply_payload, constraints, result):
+    if result is not None:
+        get_result_cache().put(canonical_key(kind, truck, box, apply_payload, constraints), result)
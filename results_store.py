@@ -0,0 +1,253 @@
+# results_store.py
+
+import os
+import re
+import sys
+import glob
+import json
+import uuid
+import datetime
+import threading
+
+from aggregates import box_family, get_aggregates
+from paths import cache_path
+
+# Parquet files under date=YYYY-MM-DD/lane=<route>/ (hive partitions)
+STORE_DIR = os.getenv("RESULTS_STORE_DIR") or cache_path("results")
+KINDS = ("recommendation", "insert_design", "truck_plan")
+
+_COLUMNS = [
+    ("record_id", "string"), ("kind", "string"), ("created", "timestamp"), ("key", "string"),
+    ("position", "int64"), ("route", "string"),
+    ("part_length", "float64"), ("part_width", "float64"), ("part_height", "float64"),
+    ("part_weight", "float64"), ("fragile", "bool"), ("stacking", "bool"), ("quantity", "int64"),
+    ("box_type", "string"), ("box_id", "string"), ("parts_per_box", "int64"), ("parts_per_truck", "int64"),
+    ("truck", "string"), ("boxes_per_truck", "int64"), ("utilisation_percent", "float64"),
+    ("payload", "string"),
+]
+
+
+def _schema():
+    import pyarrow as pa
+
+    types = {"string": pa.string(), "timestamp": pa.timestamp("ms"), "int64": pa.int64(),
+             "float64": pa.float64(), "bool": pa.bool_()}
+    return pa.schema([(name, types[t]) for name, t in _COLUMNS])
+
+
+def _json_default(value):
+    # numpy scalars and arrays from the solvers
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    return str(value)
+
+
+def route_of(product):
+    return f"{product.get('source', 'Source')} → {product.get('destination', 'Destination')}"
+
+
+def lane_slug(route):
+    """Partition directory name for a route ("Mumbai → Chennai" -> "mumbai-chennai")."""
+    return re.sub(r"[^0-9a-z]+", "-", route.lower()).strip("-") or "unknown"
+
+
+# -----------------------------
+# Store
+# -----------------------------
+class ResultsStore:
+    """Append-only Parquet dataset of past results, queried through an embedded DuckDB view.
+
+    Every save writes one small file; `compact` folds the files of past days
+    into one per partition so queries keep scanning few files.
+    """
+
+    def __init__(self, root=None):
+        self.root = root or STORE_DIR
+        self._lock = threading.Lock()
+        self._conn = None
+        # True once the view reads the Parquet files (empty placeholder until the first save)
+        self._ready = False
+
+    # ---- writes ----
+    def _write(self, kind, key, product, rows):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if kind not in KINDS:
+            raise ValueError(f"❌ Unknown result kind: {kind}")
+        now = datetime.datetime.now()
+        route = route_of(product)
+        record_id = uuid.uuid4().hex[:16]
+        base = {
+            "record_id": record_id, "kind": kind, "created": now, "key": key, "route": route,
+            "part_length": product.get("L"), "part_width": product.get("W"), "part_height": product.get("H"),
+            "part_weight": product.get("weight"), "fragile": bool(product.get("fragile")),
+            "stacking": bool(product.get("stacking")), "quantity": product.get("quantity"),
+        }
+        table = pa.Table.from_pylist(
+            [dict(base, position=i, **{k: v for k, v in row.items() if k != "payload"},
+                  payload=json.dumps(row["payload"], default=_json_default))
+             for i, row in enumerate(rows)],
+            schema=_schema(),
+        )
+        directory = os.path.join(self.root, f"date={now:%Y-%m-%d}", f"lane={lane_slug(route)}")
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{now:%H%M%S}-{record_id}.parquet")
+        # Readers glob *.parquet, so they never see a half-written file
+        pq.write_table(table, f"{path}.tmp")
+        os.replace(f"{path}.tmp", path)
+        return record_id
+
+    def save_recommendation(self, key, product, recommendation, gross_weight=None):
+        box = recommendation.get("box", {})
+        return self._write("recommendation", key, product, [{
+            "box_type": box.get("type"),
+            "box_id": box.get("library_id"),
+            "parts_per_box": recommendation.get("parts_per_box"),
+            "parts_per_truck": recommendation.get("parts_per_truck"),
+            "payload": {"recommendation": recommendation, "gross_weight": gross_weight},
+        }])
+
+    def save_insert_design(self, key, product, box, insert_design):
+        return self._write("insert_design", key, product, [{
+            "box_type": box.name,
+            "parts_per_box": insert_design["insert"].get("parts_per_box"),
+            "payload": insert_design,
+        }])
+
+    def save_truck_plan(self, key, product, box, results, parts_per_box=None):
+        """One row per truck, so per-truck statistics need no JSON parsing; also feeds the dashboard."""
+        record_id = self._write("truck_plan", key, product, [{
+            "box_type": box.name,
+            "parts_per_box": parts_per_box,
+            "truck": r["truck_name"],
+            "boxes_per_truck": r["boxes_per_truck"],
+            "parts_per_truck": r["boxes_per_truck"] * parts_per_box if parts_per_box else None,
+            "utilisation_percent": r["utilisation_percent"],
+            "payload": r,
+        } for r in results])
+        get_aggregates().record_loads(
+            f"plan:{record_id}",
+            [{
+                "truck": r["truck_name"],
+                "boxes_by_space": r.get("boxes_by_space", r["boxes_per_truck"]),
+                "boxes_by_weight": r.get("max_boxes_by_weight") or r.get("boxes_by_space", r["boxes_per_truck"]),
+                "boxes_per_truck": r["boxes_per_truck"],
+                "utilisation_percent": r["utilisation_percent"],
+            } for r in results],
+            box_family(box.library_id or box.name),
+            route_of(product),
+            parts_per_box,
+            product.get("quantity"),
+        )
+        return record_id
+
+    # ---- reads ----
+    def _db(self):
+        import duckdb
+
+        if self._conn is None:
+            self._conn = duckdb.connect()
+            # Keeps Parquet footers in memory between queries
+            self._conn.execute("SET enable_object_cache = true")
+        if not self._ready:
+            self._ready = bool(glob.glob(os.path.join(self.root, "date=*", "lane=*", "*.parquet")))
+            if self._ready:
+                pattern = os.path.join(self.root, "**", "*.parquet").replace("'", "''")
+                self._conn.execute(
+                    f"CREATE OR REPLACE VIEW results AS SELECT * FROM read_parquet('{pattern}', "
+                    "hive_partitioning = true, union_by_name = true)"
+                )
+            else:
+                import pyarrow as pa
+
+                empty = _schema().empty_table().append_column("date", pa.array([], pa.date32())) \
+                    .append_column("lane", pa.array([], pa.string()))
+                self._conn.register("empty_results", empty)
+                self._conn.execute("CREATE OR REPLACE VIEW results AS SELECT * FROM empty_results")
+        return self._conn
+
+    def query(self, sql, params=None):
+        """DataFrame from SQL over the `results` view (columns above plus `date` and `lane`)."""
+        with self._lock:
+            return self._db().execute(sql, params or []).df()
+
+    def load(self, kind, key):
+        """Latest saved result for these inputs: {"created", "payload"} (a list for truck plans) or None."""
+        rows = self.query(
+            "SELECT created, payload FROM results WHERE kind = ? AND key = ? "
+            "QUALIFY record_id = FIRST_VALUE(record_id) OVER (ORDER BY created DESC) ORDER BY position",
+            [kind, key],
+        )
+        if rows.empty:
+            return None
+        payloads = [json.loads(p) for p in rows["payload"]]
+        return {
+            "created": rows["created"].iloc[0].to_pydatetime(),
+            "payload": payloads if kind == "truck_plan" else payloads[0],
+        }
+
+    def utilisation_by_truck(self, start=None, end=None, fragile=None):
+        """Average and best utilisation per truck type over saved truck plans."""
+        where, params = ["kind = 'truck_plan'"], []
+        if start is not None:
+            where.append("date >= ?")
+            params.append(start)
+        if end is not None:
+            where.append("date <= ?")
+            params.append(end)
+        if fragile is not None:
+            where.append("fragile = ?")
+            params.append(bool(fragile))
+        return self.query(
+            "SELECT truck, COUNT(*) AS plans, ROUND(AVG(utilisation_percent), 1) AS avg_utilisation_percent, "
+            "MAX(utilisation_percent) AS best_utilisation_percent, ROUND(AVG(boxes_per_truck), 1) AS avg_boxes "
+            f"FROM results WHERE {' AND '.join(where)} GROUP BY truck ORDER BY avg_utilisation_percent DESC",
+            params,
+        )
+
+    # ---- maintenance ----
+    def compact(self, before=None):
+        """Rewrites every partition dated before `before` (default today) as one file; returns the count."""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        before = before or datetime.date.today()
+        compacted = 0
+        for directory in sorted(glob.glob(os.path.join(self.root, "date=*", "lane=*"))):
+            day = datetime.date.fromisoformat(os.path.basename(os.path.dirname(directory))[len("date="):])
+            files = sorted(glob.glob(os.path.join(directory, "*.parquet")))
+            if day >= before or len(files) < 2:
+                continue
+            table = pa.concat_tables([pq.read_table(f, schema=_schema()) for f in files])
+            path = os.path.join(directory, f"compact-{uuid.uuid4().hex[:16]}.parquet")
+            pq.write_table(table, f"{path}.tmp")
+            # Readers may briefly see rows twice, never miss them
+            os.replace(f"{path}.tmp", path)
+            for f in files:
+                os.remove(f)
+            compacted += 1
+        return compacted
+
+
+_shared_store = None
+_shared_lock = threading.Lock()
+
+
+def get_results_store():
+    """Process-wide results store."""
+    global _shared_store
+    with _shared_lock:
+        if _shared_store is None:
+            _shared_store = ResultsStore()
+        return _shared_store
+
+
+if __name__ == "__main__":
+    store = get_results_store()
+    if len(sys.argv) > 1 and sys.argv[1] == "compact":
+        print(f"Compacted {store.compact()} partitions")
+    elif len(sys.argv) > 2 and sys.argv[1] == "query":
+        print(store.query(sys.argv[2]).to_string())
+    else:
+        print('usage: python results_store.py compact | query "SELECT ... FROM results"')
@@ -0,0 +1,161 @@
+# similarity_cache.py
+
+import os
+import json
+import copy
+import threading
+
+from kdtree import KDTree
+from paths import CACHE_DIR
+
+# Flags are scaled far beyond the tolerance so a fragile part never matches a non-fragile one
+_FLAG_SCALE = 1e6
+# Each fragility level keeps its own key; unknown labels only match themselves at the top level
+_FRAGILITY_LEVELS = {"": 0, "none": 0, "low": 0, "false": 0, "0": 0, "medium": 1, "high": 2, "true": 2, "1": 2}
+
+
+def _fragility(fragile):
+    return _FRAGILITY_LEVELS.get(str(fragile).strip().lower(), 2)
+
+
+def _features(length, width, height, weight, fragile, stacking, tolerance_mm, tolerance_kg):
+    """Feature vector where a distance <= 1 (L-infinity) means 'within tolerance'."""
+    dims = sorted((float(length), float(width), float(height)), reverse=True)
+    return [
+        dims[0] / tolerance_mm,
+        dims[1] / tolerance_mm,
+        dims[2] / tolerance_mm,
+        float(weight or 0) / tolerance_kg,
+        _FLAG_SCALE * _fragility(fragile),
+        _FLAG_SCALE if stacking else 0.0,
+    ]
+
+
+def _fits(part_dims, internal_dims):
+    """Free-rotation fit check: sorted part dims must not exceed sorted box internals."""
+    if len(internal_dims) != 3:
+        return False
+    return all(p <= b for p, b in zip(sorted(part_dims), sorted(internal_dims)))
+
+
+class SimilarityCache:
+    """Nearest-neighbour cache of accepted outer box recommendations."""
+
+    def __init__(self, path=None, tolerance_mm=None, tolerance_kg=None):
+        self.path = path or os.path.join(CACHE_DIR, "recommendations.jsonl")
+        self.tolerance_mm = float(tolerance_mm or os.getenv("SIMILARITY_TOLERANCE_MM", 5))
+        self.tolerance_kg = float(tolerance_kg or os.getenv("SIMILARITY_TOLERANCE_KG", 0.25))
+
+        self._lock = threading.Lock()
+        self._entries = []
+        self._tree = KDTree([])
+        self._pending = []  # entries added since the last tree rebuild
+        self._stats = {"lookups": 0, "hits": 0, "misses": 0, "fit_rejections": 0}
+        self._load()
+
+    # ----------------------------------------------------
+    # Persistence
+    # ----------------------------------------------------
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    try:
+                        self._entries.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        continue
+        self._rebuild()
+
+    def _append(self, entry):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+
+    def _rebuild(self):
+        self._tree = KDTree([self._vector(e) for e in self._entries])
+        self._pending = []
+
+    def _vector(self, entry):
+        part = entry["part"]
+        return _features(part["length"], part["width"], part["height"], part["weight"],
+                         part["fragile"], part["stacking"], self.tolerance_mm, self.tolerance_kg)
+
+    # ----------------------------------------------------
+    # Lookup / insert
+    # ----------------------------------------------------
+    def lookup(self, length, width, height, weight, fragile, stacking):
+        """Returns a stored recommendation for a near-identical part, or None."""
+        q = _features(length, width, height, weight, fragile, stacking, self.tolerance_mm, self.tolerance_kg)
+
+        with self._lock:
+            self._stats["lookups"] += 1
+            # Every indexed entry within tolerance, not just the nearest: it may not fit
+            candidates = []
+            for idx in self._tree.query_range([v - 1.0 for v in q], [v + 1.0 for v in q]):
+                candidates.append((max(abs(a - b) for a, b in zip(self._vector(self._entries[idx]), q)), idx))
+            # Recent entries are scanned linearly until the next rebuild
+            offset = self._tree.size
+            for j, entry in enumerate(self._pending):
+                d = max(abs(a - b) for a, b in zip(self._vector(entry), q))
+                candidates.append((d, offset + j))
+
+            candidates = sorted(c for c in candidates if c[0] <= 1.0)
+            if not candidates:
+                self._stats["misses"] += 1
+                return None
+
+            # Nearest first; the first whose box still holds this part wins
+            for dist, idx in candidates:
+                entry = self._entries[idx]
+                if _fits((length, width, height), entry["internal_dims"]):
+                    break
+                self._stats["fit_rejections"] += 1
+            else:
+                self._stats["misses"] += 1
+                return None
+
+            self._stats["hits"] += 1
+            result = copy.deepcopy(entry["recommendation"])
+            result["cached"] = {"source": "similarity", "distance": round(dist, 3), "matched_part": entry["part"]}
+            return result
+
+    def add(self, length, width, height, weight, fragile, stacking, recommendation, internal_dims):
+        """Stores an accepted recommendation together with its parsed internal dimensions."""
+        entry = {
+            "part": {
+                "length": float(length), "width": float(width), "height": float(height),
+                "weight": float(weight or 0), "fragile": str(fragile), "stacking": bool(stacking),
+            },
+            "internal_dims": [float(d) for d in internal_dims],
+            "recommendation": recommendation,
+        }
+        with self._lock:
+            self._entries.append(entry)
+            self._pending.append(entry)
+            # Rebuild once the linear tail gets long relative to the indexed set
+            if len(self._pending) > max(16, int(len(self._entries) ** 0.5)):
+                self._rebuild()
+            self._append(entry)
+
+    def metrics(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        stats["hit_rate"] = round(stats["hits"] / stats["lookups"], 3) if stats["lookups"] else 0.0
+        return stats
+
+
+_shared_cache = None
+_shared_lock = threading.Lock()
+
+
+def get_similarity_cache():
+    """Process-wide cache shared by every LLMRecommender instance."""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = SimilarityCache()
+        return _shared_cache